@@ -1,20 +1,27 @@
 from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import io
 import asyncio
 
-from app.db.database import get_db
+from app.db.database import get_db, get_async_db
 from app.db.schemas import (
     CampaignCreate, CampaignUpdate, 
-    CampaignListResponse, CampaignDetail
+    CampaignListResponse, CampaignDetail,
+    ImsiSightingLookup
 )
 from app.service.campaign_service import (
     list_campaigns, create_campaign,
     get_campaign_detail
 )
 from app.service.export_service import generate_pdf, generate_excel
+from app.service.rollup_service import get_imsi_trend
+from app.service.locate_service import locate_imsi
+from app.service.area_service import query_area
+from app.service.sighting_service import lookup_sightings
+from app.config.utils import AREA_DEFAULT_LIMIT
 
 router = APIRouter()
 
@@ -34,7 +41,7 @@ def list_campaign(mode: Optional[str] = None, db: Session = Depends(get_db)):
 
 
 @router.post("/campaign/start", tags=["Campaign"])
-async def campaign_start(req: CampaignCreate, db: Session = Depends(get_db)):
+async def campaign_start(req: CampaignCreate, db: AsyncSession = Depends(get_async_db)):
     result = await create_campaign(db, req.name, req.imsi, req.provider, req.mode, req.duration)
     
     if result["status"] == "success":
@@ -66,8 +73,90 @@ def get_campaign(campaign_id: int, db: Session = Depends(get_db)):
     raise HTTPException(status_code=404, detail=result["message"])
 
 
+@router.get("/campaign/{campaign_id}/imsi/{imsi}/trend", tags=["Campaign"])
+def get_imsi_signal_trend(
+    campaign_id: int,
+    imsi: str,
+    resolution: int = Query(10, description="Ukuran bucket (detik): 1, 10 atau 60"),
+    minutes: int = Query(15, ge=1, le=24 * 60),
+    ip: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Trend RSRP / ulRssi (min, max, mean, jumlah sampel) per bucket untuk
+    satu IMSI, dipisah per device (ip).
+    """
+    result = get_imsi_trend(db, campaign_id, imsi, resolution=resolution, minutes=minutes, ip=ip)
+
+    if result["status"] == "success":
+        return result
+
+    raise HTTPException(status_code=400, detail=result["message"])
+
+
+@router.get("/campaign/{campaign_id}/imsi/{imsi}/locate", tags=["Campaign"])
+def locate_campaign_imsi(
+    campaign_id: int,
+    imsi: str,
+    minutes: int = Query(10, ge=1, le=24 * 60, description="Jendela observasi (menit terakhir)"),
+    db: Session = Depends(get_db)
+):
+    """
+    Estimasi posisi target (lat, lon, radius keyakinan dalam meter) dari
+    history observasi ulRssi + posisi GPS device.
+    """
+    result = locate_imsi(db, campaign_id, imsi, minutes=minutes)
+
+    if result["status"] == "success":
+        return result
+
+    raise HTTPException(status_code=404, detail=result["message"])
+
+
+@router.get("/crawling/area", tags=["Campaign"])
+def crawling_area(
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    radius_m: Optional[float] = Query(None, description="Radius (meter) dari lat, lon"),
+    bbox: Optional[str] = Query(None, description="min_lat,min_lon,max_lat,max_lon"),
+    campaign_id: Optional[int] = None,
+    limit: int = Query(AREA_DEFAULT_LIMIT, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    """
+    IMSI yang terlihat di dalam radius atau bounding box beserta jumlah
+    laporan, campaign dan waktu terakhir terlihat.
+    """
+    box = None
+    if bbox:
+        try:
+            box = [float(v) for v in bbox.split(",")]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bbox harus min_lat,min_lon,max_lat,max_lon")
+    result = query_area(db, lat=lat, lon=lon, radius_m=radius_m, bbox=box, campaign_id=campaign_id, limit=limit)
+
+    if result["status"] == "success":
+        return result
+
+    raise HTTPException(status_code=400, detail=result["message"])
+
+
+@router.post("/imsi/sightings", tags=["Campaign"])
+def imsi_sightings(req: ImsiSightingLookup, db: Session = Depends(get_db)):
+    """
+    Apakah IMSI pernah terlihat, di campaign mana dan kapan (first / last
+    seen, total laporan, IMEI / MSISDN terakhir), untuk banyak IMSI sekaligus.
+    """
+    result = lookup_sightings(db, req.imsis)
+
+    if result["status"] == "success":
+        return result
+
+    raise HTTPException(status_code=400, detail=result["message"])
+
+
 @router.put("/campaign/{campaign_id}/stop", tags=["Campaign"])
-async def campaign_stop(campaign_id: int, db: Session = Depends(get_db)):
+async def campaign_stop(campaign_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Stop campaign: update status to 'stopped', stop timer, and stop all BBU cells
     """
@@ -1,9 +1,9 @@
 
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import time
 import re
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.schemas import CommandResponse, CommandResult
 from app.service.utils_service import get_all_ips_db, get_send_command_instance
 from app.utils.logger import setup_logger
@@ -15,13 +15,13 @@ logger = setup_logger("command_api")
 @router.post("/cell/start", response_model=CommandResponse, tags=["Cell"])
 async def start_cell_by_ip(
     ip: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         if not re.fullmatch(r"(\d{1,3}\.){3}\d{1,3}", ip):
             raise HTTPException(status_code=400, detail="Format IP tidak valid.")
         
-        all_ips = get_all_ips_db(db)
+        all_ips = await db.run_sync(get_all_ips_db)
         if ip not in all_ips:
             raise HTTPException(status_code=404, detail=f"IP {ip} tidak ditemukan.")
         
@@ -57,13 +57,13 @@ async def start_cell_by_ip(
 @router.post("/cell/stop", response_model=CommandResponse, tags=["Cell"])
 async def stop_cell_by_ip(
     ip: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         if not re.fullmatch(r"(\d{1,3}\.){3}\d{1,3}", ip):
             raise HTTPException(status_code=400, detail="Format IP tidak valid.")
         
-        all_ips = get_all_ips_db(db)
+        all_ips = await db.run_sync(get_all_ips_db)
         if ip not in all_ips:
             raise HTTPException(status_code=404, detail=f"IP {ip} tidak ditemukan.")
         
@@ -98,7 +98,7 @@ async def stop_cell_by_ip(
 @router.post("/cell/reboot", response_model=CommandResponse, tags=["Cell"])
 async def reboot_cell_by_ip(
     ip: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         # Validate IP format
@@ -106,7 +106,7 @@ async def reboot_cell_by_ip(
             raise HTTPException(status_code=400, detail="Format IP tidak valid.")
         
         # Check if IP exists in database
-        all_ips = get_all_ips_db(db)
+        all_ips = await db.run_sync(get_all_ips_db)
         if ip not in all_ips:
             raise HTTPException(status_code=404, detail=f"IP {ip} tidak ditemukan.")
         
@@ -140,9 +140,9 @@ async def reboot_cell_by_ip(
         )
 
 @router.post("/sniffer/start", response_model=CommandResponse, tags=["Sniffer"])
-async def start_sniffer(db: Session = Depends(get_db)):
+async def start_sniffer(db: AsyncSession = Depends(get_async_db)):
     try:
-        ip_list = get_all_ips_db(db)
+        ip_list = await db.run_sync(get_all_ips_db)
         
         if not ip_list:
             raise HTTPException(status_code=404, detail="Tidak ada device aktif yang ditemukan.")
@@ -161,7 +161,7 @@ async def start_sniffer(db: Session = Depends(get_db)):
                 logger.error(f"[StartSniffer] Error on {target_ip}: {e}")
                 results.append(CommandResult(ip=target_ip, status="error", error=str(e)))
         
-        add_log(db, f"Sniffer Started", "info", "User")
+        await db.run_sync(add_log, f"Sniffer Started", "info", "User")
         return CommandResponse(
             status="success",
             last_checked=time.strftime("%Y-%m-%d %H:%M:%S"),
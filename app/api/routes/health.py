@@ -5,6 +5,12 @@ from datetime import datetime
 import time
 from app.db.database import get_db
 from app.service.log_service import list_logs
+from app.config.utils import PortUDPServer
+from app.controller.udp_receiver import read_udp_drops
+from app.db.pool import pool_metrics_snapshot
+from app.controller.ingest_uow import ingest_uow
+from app.service.observation_service import observation_store
+from app.service.rollup_service import signal_rollup
 
 router = APIRouter()
 
@@ -28,5 +34,14 @@ def health_check(db: Session = Depends(get_db)):
         "status": "ok",
         "timestamp": datetime.utcnow().isoformat(),
         "database": db_status,
+        # Counter kernel socket UDP ingest (rx_queue / drops dari /proc/net/udp)
+        "udp_ingest": read_udp_drops(PortUDPServer),
+        # Connection pool per jalur (proses ini): in_use, wait checkout, timeout
+        "db_pools": pool_metrics_snapshot(),
+        # Commit ingest per window (0 di worker API yang tidak menerima UDP)
+        "ingest_commits": ingest_uow.stats(),
+        # Writer history observasi crawling (queued / written / dropped)
+        "observations": observation_store.stats(),
+        "signal_rollup": signal_rollup.stats(),
         "service": "IMSI CATCHER BACKEND"
     }
@@ -2,11 +2,15 @@
 Target endpoints - Target management (List, Create, Update, Import)
 Tags: Target
 """
+import json
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.database import get_db
+from app.db.database import SessionLocal, get_db, get_async_db
 from app.db.schemas import (
     TargetCreate, TargetUpdate,
     TargetListResponse, TargetResponse,
@@ -14,7 +18,7 @@ from app.db.schemas import (
 )
 from app.service.target_service import (
     list_targets, create_target,
-    update_target, import_targets_from_xlsx,
+    update_target, import_targets_from_file, iter_import_targets,
     delete_target
 )
 
@@ -36,7 +40,7 @@ def get_target_list(target_status: Optional[str] = None, db: Session = Depends(g
 
 
 @router.post("/target/create", response_model=TargetSingleResponse, tags=["Target"])
-async def add_target(req: TargetCreate, db: Session = Depends(get_db)):
+async def add_target(req: TargetCreate, db: AsyncSession = Depends(get_async_db)):
     result = await create_target(
         db,
         name=req.name,
@@ -57,8 +61,8 @@ async def add_target(req: TargetCreate, db: Session = Depends(get_db)):
 
 
 @router.put("/target/{target_id}/update", response_model=TargetSingleResponse, tags=["Target"])
-def update_target_endpoint(target_id: int, req: TargetUpdate, db: Session = Depends(get_db)):
-    result = update_target(
+async def update_target_endpoint(target_id: int, req: TargetUpdate, db: AsyncSession = Depends(get_async_db)):
+    result = await update_target(
         db,
         target_id=target_id,
         name=req.name,
@@ -78,8 +82,8 @@ def update_target_endpoint(target_id: int, req: TargetUpdate, db: Session = Depe
 
 
 @router.delete("/target/{target_id}/delete", response_model=TargetSingleResponse, tags=["Target"])
-def delete_target_endpoint(target_id: int, db: Session = Depends(get_db)):
-    result = delete_target(db, target_id)
+async def delete_target_endpoint(target_id: int, db: AsyncSession = Depends(get_async_db)):
+    result = await delete_target(db, target_id)
     
     if result["status"] == "success":
         return TargetSingleResponse(
@@ -92,16 +96,39 @@ def delete_target_endpoint(target_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/target/import", response_model=TargetImportResponse, tags=["Target"])
-async def import_targets(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    if not file.filename.endswith(('.xlsx', '.xls')):
+async def import_targets(
+    file: UploadFile = File(...),
+    progress: bool = Query(False, description="Stream progress sebagai NDJSON, baris terakhir hasil import")
+):
+    if not file.filename.lower().endswith(('.xlsx', '.csv')):
         raise HTTPException(
             status_code=400,
-            detail="File must be an Excel file (.xlsx or .xls)"
+            detail="File must be an Excel (.xlsx) or CSV (.csv) file"
         )
-    
+
+    if progress:
+        def stream():
+            # Session sendiri: generator dijalankan di threadpool setelah handler selesai
+            sync_db = SessionLocal()
+            try:
+                for item in iter_import_targets(sync_db, file.file, file.filename):
+                    yield json.dumps(item) + "\n"
+            finally:
+                sync_db.close()
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    def run_import():
+        # Session sendiri di threadpool, import besar tidak memblok event loop
+        sync_db = SessionLocal()
+        try:
+            return import_targets_from_file(sync_db, file.file, file.filename)
+        finally:
+            sync_db.close()
+
     try:
-        file_content = await file.read()
-        result = import_targets_from_xlsx(db, file_content)
+        # file.file dibaca streaming, upload besar tidak dimuat ke memory
+        result = await run_in_threadpool(run_import)
         
         if result["status"] == "success":
             return TargetImportResponse(
@@ -1,29 +1,46 @@
+import asyncio
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-import time
-from app.db.database import get_db
-from app.service.sniffer_service import (
-    get_sniffing_progress,
-    get_heartbeat_sniff_status
-)
 from app.ws.manager import ws_manager, sniffing_manager
 from app.ws.events import event_bus
+from app.ws.sniffing_state import sniffing_state_broadcaster
+from app.ws.heartbeat_coalescer import heartbeat_coalescer
+from app.ws.crawling_replay import crawling_replay
+from app.ws.codec import Frame, resolve_encoding, send_frame
+from app.ws.filters import CrawlingFilter
 
 router = APIRouter()
+
+
+async def _accept_encoding(websocket: WebSocket, encoding: str | None):
+    """Validasi ?encoding=json|msgpack, tutup koneksi jika tidak didukung"""
+    try:
+        return resolve_encoding(encoding)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return None
+
+
 @router.websocket("/ws/heartbeat")
-async def ws_device(websocket: WebSocket):
+async def ws_device(websocket: WebSocket, encoding: str = None):
+    encoding = await _accept_encoding(websocket, encoding)
+    if encoding is None:
+        return
     await ws_manager.connect(websocket)
     sub_id = None
 
     try:
         # Create callback untuk receive data dari event bus
-        async def on_heartbeat_data(data: dict):
+        async def on_heartbeat_data(frame: Frame):
             try:
-                await websocket.send_json(data)
+                await send_frame(websocket, frame, encoding)
             except Exception as e:
                 import traceback
                 print(f"[ERROR] ws_device send error: {e}")
                 print(f"[ERROR] Traceback: {traceback.format_exc()}")
         
+        # Full snapshot dari memory, setelah itu hanya delta per device
+        await send_frame(websocket, heartbeat_coalescer.snapshot_frame(), encoding)
+
         # Subscribe ke heartbeat events
         sub_id = event_bus.subscribe_heartbeat(on_heartbeat_data)
 
@@ -44,25 +61,71 @@ async def ws_device(websocket: WebSocket):
 
 
 @router.websocket("/ws/data_imsi")
-async def ws_data_imsi(websocket: WebSocket, campaign_id: int = None):
+async def ws_data_imsi(
+    websocket: WebSocket,
+    campaign_id: int = None,
+    provider: str = None,
+    ip: str = None,
+    ch: str = None,
+    imsi_prefix: str = None,
+    alert_only: bool = False,
+    min_rsrp: float = None,
+    since: int = None,
+    boot: str = None,
+    encoding: str = None
+):
+    encoding = await _accept_encoding(websocket, encoding)
+    if encoding is None:
+        return
     await ws_manager.connect(websocket)
+    # Filter di-routing oleh event bus, callback hanya menerima event yang cocok
+    crawling_filter = CrawlingFilter(
+        campaign_id=campaign_id,
+        provider=provider,
+        ip=ip,
+        ch=ch,
+        imsi_prefix=imsi_prefix,
+        alert_only=alert_only,
+        min_rsrp=min_rsrp
+    )
     sub_id = None
+    # Event live ditahan selama replay supaya urutan seq tetap terjaga
+    pending = [] if since is not None else None
 
     try:
         # Create callback untuk receive data dari event bus
-        async def on_crawling_data(data: dict):
+        async def on_crawling_data(frame: Frame):
             try:
-                # Filter berdasarkan campaign_id jika di-specify
-                if campaign_id is not None and data.get("campaign_id") != campaign_id:
+                if pending is not None:
+                    pending.append(frame)
                     return
-                await websocket.send_json(data)
+                await send_frame(websocket, frame, encoding)
             except Exception as e:
                 import traceback
                 print(f"[ERROR] ws_data_imsi send error: {e}")
                 print(f"[ERROR] Traceback: {traceback.format_exc()}")
         
         # Subscribe ke crawling events
-        sub_id = event_bus.subscribe_crawling(on_crawling_data)
+        sub_id = event_bus.subscribe_crawling(on_crawling_data, crawling_filter)
+
+        if since is not None:
+            # Reconnect: kirim event yang terlewat dari ring buffer,
+            # atau snapshot jika gap melebihi buffer / server sudah restart
+            last_seq = crawling_replay.last_seq
+            boot_id = crawling_replay.boot_id
+            missed = crawling_replay.since(since, campaign_id, boot)
+            if missed is None:
+                snapshot = await asyncio.to_thread(crawling_replay.build_snapshot, campaign_id, last_seq)
+                missed = [Frame(snapshot)]
+            else:
+                missed = [frame for frame in missed if crawling_filter.matches(frame.data)]
+            for frame in missed:
+                await send_frame(websocket, frame, encoding)
+            while pending:
+                frame = pending.pop(0)
+                if frame.data.get("boot") != boot_id or frame.data.get("seq", 0) > last_seq:
+                    await send_frame(websocket, frame, encoding)
+            pending = None
 
         # Keep connection alive
         while True:
@@ -80,15 +143,18 @@ async def ws_data_imsi(websocket: WebSocket, campaign_id: int = None):
         await ws_manager.disconnect(websocket)
 
 @router.websocket("/ws/sniffing")
-async def ws_sniffing(websocket: WebSocket):
+async def ws_sniffing(websocket: WebSocket, encoding: str = None):
+    encoding = await _accept_encoding(websocket, encoding)
+    if encoding is None:
+        return
     await sniffing_manager.connect(websocket)
     sub_id = None
 
     try:
         # Create callback untuk receive data dari event bus
-        async def on_sniffing_data(data: dict):
+        async def on_sniffing_data(frame: Frame):
             try:
-                await websocket.send_json(data)
+                await send_frame(websocket, frame, encoding)
             except Exception as e:
                 import traceback
                 print(f"[ERROR] ws_sniffing send error: {e}")
@@ -114,43 +180,17 @@ async def ws_sniffing(websocket: WebSocket):
 
 
 @router.websocket("/ws/sniffing/state")
-async def ws_sniffing_state(websocket: WebSocket):
+async def ws_sniffing_state(websocket: WebSocket, encoding: str = None):
+    encoding = await _accept_encoding(websocket, encoding)
+    if encoding is None:
+        return
     await ws_manager.connect(websocket)
     sub_id = None
 
-    db_gen = get_db()
-    db = next(db_gen)
-
     try:
-        # Send initial state
-        progress = get_sniffing_progress(db)
-        heartbeat_status = get_heartbeat_sniff_status(db)
-        await websocket.send_json({
-            "type": "sniffing_state",
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "progress": progress,
-            "heartbeat_status": heartbeat_status
-        })
-
-        # Create callback untuk update saat ada sniffing data baru
-        async def on_sniffing_update(data: dict):
-            try:
-                # Refresh data dari DB
-                progress = get_sniffing_progress(db)
-                heartbeat_status = get_heartbeat_sniff_status(db)
-                await websocket.send_json({
-                    "type": "sniffing_state",
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "progress": progress,
-                    "heartbeat_status": heartbeat_status
-                })
-            except Exception as e:
-                import traceback
-                print(f"[ERROR] ws_sniffing_state send error: {e}")
-                print(f"[ERROR] Traceback: {traceback.format_exc()}")
-        
-        # Subscribe ke sniffing events untuk real-time updates
-        sub_id = event_bus.subscribe_sniffing(on_sniffing_update)
+        # Snapshot dihitung oleh satu producer bersama (debounced) dan
+        # frame yang sama dikirim ke semua koneksi, tanpa DB session per koneksi
+        sub_id = await sniffing_state_broadcaster.subscribe(websocket, encoding)
 
         # Keep connection alive
         while True:
@@ -164,6 +204,5 @@ async def ws_sniffing_state(websocket: WebSocket):
             
     finally:
         if sub_id is not None:
-            event_bus.unsubscribe_sniffing(sub_id)
-        db.close()
+            sniffing_state_broadcaster.unsubscribe(sub_id)
         await ws_manager.disconnect(websocket)
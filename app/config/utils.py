@@ -1,7 +1,22 @@
+import os
+
 HOST = '0.0.0.0'
 HOSTDESKTOP = '127.0.0.1'
 BufferSize = 955350
 
+# Socket UDP ingest: ukuran buffer kernel dan batch receive
+UDP_RCVBUF = int(os.getenv("UDP_RCVBUF", 8 * 1024 * 1024))
+UDP_SNDBUF = int(os.getenv("UDP_SNDBUF", 1024 * 1024))
+UDP_RECV_BATCH = int(os.getenv("UDP_RECV_BATCH", 64))
+UDP_SLOT_SIZE = 65535  # datagram UDP maksimal
+
+# Commit DB ingest dikelompokkan per window (detik) atau per jumlah pesan
+INGEST_COMMIT_INTERVAL = float(os.getenv("INGEST_COMMIT_INTERVAL", 0.2))
+INGEST_COMMIT_MAX = int(os.getenv("INGEST_COMMIT_MAX", 500))
+
+# Batas tunggu response XML (GetCellParaRsp / GetAppCfgExtRsp) setelah command dikirim
+XML_RESPONSE_TIMEOUT = 3
+
 # Max RTO
 MAX_RETRIES = 10
 PortUDPServer = 9001
@@ -37,6 +52,51 @@ TIMESENDHEARTBEAT = 5000
 TIMESENDIMSI = 2000
 TIMESENDSNIFF = 2000
 
+# Max push sniffing_state ke websocket per detik
+MAX_SNIFF_STATE_PUSH_PER_SEC = 4
+
+# Interval full snapshot heartbeat ke websocket (detik)
+HEARTBEAT_SNAPSHOT_INTERVAL = 30
+
+# Ring buffer replay event crawling untuk reconnect /ws/data_imsi
+CRAWLING_REPLAY_BUFFER = 2000  # event per campaign
+CRAWLING_REPLAY_CAMPAIGNS = 5
+
+# Buffer hasil SnifferRsltIndi sebelum bulk insert ke nmmcfg
+SNIFF_FLUSH_BATCH = 200
+SNIFF_FLUSH_INTERVAL = 1.0  # detik
+
+# History observasi crawling (app/service/observation_service.py)
+OBSERVATION_RETENTION_DAYS = int(os.getenv("OBSERVATION_RETENTION_DAYS", 30))
+OBSERVATION_FLUSH_BATCH = 2000
+OBSERVATION_FLUSH_INTERVAL = 1.0  # detik
+OBSERVATION_QUEUE_MAX = 100000  # row tertahan maksimal, row tertua dibuang jika DB tertinggal
+OBSERVATION_PARTITIONS_AHEAD = 2  # partisi harian Postgres yang disiapkan di depan
+OBSERVATION_DIR = os.getenv("OBSERVATION_DIR")  # folder segmen SQLite, default app/observations
+
+# Rollup RSRP / ulRssi per IMSI (app/service/rollup_service.py)
+ROLLUP_RESOLUTIONS = (1, 10, 60)  # detik
+ROLLUP_GRACE = 2.0  # detik setelah bucket berakhir sebelum di-flush (sampel telat)
+ROLLUP_FLUSH_INTERVAL = 1.0  # detik
+ROLLUP_RETENTION = {1: 1, 10: 7, 60: 30}  # hari per resolusi
+
+# Estimasi posisi target DF (app/service/locate_service.py), model path loss log-distance
+LOCATE_UE_TX_POWER = 23.0  # dBm, daya pancar UE (LTE kelas 3)
+LOCATE_PL_REF = 38.5  # dB path loss pada 1 m (~2 GHz)
+LOCATE_PL_EXPONENT = 2.7  # eksponen path loss (suburban / urban ringan)
+LOCATE_WINDOW_MINUTES = 10
+LOCATE_RECENCY_TAU = 120.0  # detik, bobot observasi turun eksponensial dengan umur
+LOCATE_MIN_SPREAD = 25.0  # meter, sebaran posisi sensor minimal untuk trilaterasi
+LOCATE_MAX_OBSERVATIONS = 20000
+
+# Area query crawling (app/service/area_service.py)
+AREA_MAX_CELLS = 16  # jumlah prefix geohash maksimal per query (SQLite)
+AREA_MAX_RADIUS = 50000  # meter
+AREA_DEFAULT_LIMIT = 500
+
+# Import target XLSX / CSV: baris per query cek IMSI + bulk insert + commit
+TARGET_IMPORT_CHUNK = 1000
+
 # Max send imsi
 MAX_IMSI = 20
 
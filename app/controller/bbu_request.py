@@ -0,0 +1,180 @@
+"""
+Request/response untuk command Get* ke BBU.
+
+request() mendaftarkan future dengan key (ip, tipe response), mengirim
+command, lalu menunggu RespUdp menerima response yang cocok. Response dari
+proses lain (shard ingest / proses ingest saat multi worker) diteruskan lewat
+channel "bbu_response" di relay, lihat publish_ingest_event dan dispatch_event.
+Supaya tidak setiap datagram diteruskan, proses yang menunggu mengumumkan
+(ip, tipe response) ke proses penerima lewat kontrol "bbu_expect"; hanya
+response yang sedang ditunggu yang di-resolve / diteruskan.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, List, Tuple, Union
+
+from app.config.utils import GetCellParaRsp, GetAppCfgExtRsp, XML_RESPONSE_TIMEOUT
+from app.service.xml_config_service import XmlConfigEntry, xml_config_store
+from app.ws import runtime
+
+# Tipe response XML -> xml_type di xml_config_store
+XML_RESPONSE_TYPES = {
+    GetCellParaRsp: "cell_para",
+    GetAppCfgExtRsp: "app_cfg_ext",
+}
+
+
+class BbuRequestRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        # Response yang ditunggu proses lain: key -> deadline (monotonic)
+        self._expected: Dict[Tuple[str, str], float] = {}
+
+    def expect(self, ip: str, response_type: str, timeout: float = XML_RESPONSE_TIMEOUT):
+        """
+        Catat bahwa proses lain menunggu response (ip, response_type) dan,
+        di proses ingest utama, teruskan ke shard yang mungkin menerimanya.
+        """
+        from app.ws.relay import forward_to_shards
+
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, deadline in self._expected.items() if deadline <= now]:
+                del self._expected[key]
+            key = (ip, response_type)
+            self._expected[key] = max(self._expected.get(key, 0), now + timeout)
+        forward_to_shards("bbu_expect", ip=ip, response_type=response_type, timeout=timeout)
+
+    def awaited(self, ip: str, response_type: str) -> bool:
+        """True jika ada request (lokal atau proses lain) yang menunggu response ini"""
+        key = (ip, response_type)
+        if key in self._pending:
+            return True
+        deadline = self._expected.get(key)
+        return deadline is not None and deadline > time.monotonic()
+
+    def take_expected(self, key: Tuple[str, str]) -> bool:
+        """Hapus catatan response yang ditunggu proses lain, True jika masih berlaku"""
+        with self._lock:
+            deadline = self._expected.pop(key, None)
+        return deadline is not None and deadline > time.monotonic()
+
+    def resolve(self, ip: str, response_type: str, payload=None) -> int:
+        """
+        Dipanggil saat response diterima. payload: XmlConfigEntry untuk
+        response XML, str message untuk response teks, None jika diterima
+        proses lain. Return jumlah request yang di-resolve.
+        """
+        with self._lock:
+            waiters = self._pending.pop((ip, response_type), [])
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future, payload)
+        return len(waiters)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(len(waiters) for waiters in self._pending.values())
+
+    async def request(self, ip: str, command: str, expect: str, timeout: float = XML_RESPONSE_TIMEOUT):
+        """
+        Kirim command ke satu IP dan tunggu response bertipe expect.
+        Return XmlConfigEntry (response XML) / str message (response teks),
+        None jika timeout.
+        """
+        from app.service.utils_service import get_send_command_instance
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        xml_type = XML_RESPONSE_TYPES.get(expect)
+        version = xml_config_store.version(xml_type, ip) if xml_type else 0
+
+        key = (ip, expect)
+        future = loop.create_future()
+        with self._lock:
+            self._pending.setdefault(key, []).append((loop, future))
+
+        payload = None
+        try:
+            self._announce(ip, expect, timeout)
+            get_send_command_instance().command(ip, command)
+            payload = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._discard(key, loop, future)
+
+        if xml_type is None or isinstance(payload, XmlConfigEntry):
+            return payload
+
+        # Response XML diterima proses lain: entry dibaca dari store (file bersama)
+        return await xml_config_store.wait_for(xml_type, ip, version, max(deadline - loop.time(), 0))
+
+    async def request_all(self, ip_list: List[str], command: str, expect: str, timeout: float = XML_RESPONSE_TIMEOUT) -> Dict[str, Union[object, Exception, None]]:
+        """
+        request() ke semua IP secara bersamaan, return {ip: response}.
+        Response None = timeout, Exception = command gagal dikirim.
+        """
+        responses = await asyncio.gather(
+            *[self.request(ip, command, expect, timeout) for ip in ip_list],
+            return_exceptions=True
+        )
+        results = {}
+        for ip, response in zip(ip_list, responses):
+            if isinstance(response, Exception):
+                print(f"[BBU REQUEST] {command} ke {ip} gagal: {response}")
+            results[ip] = response
+        return results
+
+    @staticmethod
+    def _announce(ip: str, response_type: str, timeout: float):
+        """Beri tahu proses penerima UDP bahwa response ini ditunggu"""
+        from app.ws.relay import forward_to_ingest, forward_to_shards
+
+        # Worker API -> proses ingest (yang meneruskan ke shard), atau langsung ke shard
+        if not forward_to_ingest("bbu_expect", ip=ip, response_type=response_type, timeout=timeout):
+            forward_to_shards("bbu_expect", ip=ip, response_type=response_type, timeout=timeout)
+
+    def _discard(self, key: Tuple[str, str], loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+        with self._lock:
+            waiters = self._pending.get(key)
+            if waiters and (loop, future) in waiters:
+                waiters.remove((loop, future))
+                if not waiters:
+                    del self._pending[key]
+
+
+def _resolve(future: asyncio.Future, payload):
+    if not future.done():
+        future.set_result(payload)
+
+
+def response_received(ip: str, response_type: str, payload=None):
+    """
+    Dipanggil RespUdp setelah response diproses: resolve request lokal dan,
+    di mode multi proses, teruskan ke proses lain yang menunggu. Response
+    yang tidak ditunggu siapa pun langsung diabaikan.
+    """
+    if not bbu_requests.awaited(ip, response_type):
+        return
+    bbu_requests.resolve(ip, response_type, payload)
+
+    if runtime.process_role == runtime.ROLE_SINGLE and runtime.ingest_shards <= 1:
+        return
+    if not bbu_requests.take_expected((ip, response_type)):
+        return
+
+    from app.controller.handle_message_receiver_bbu import schedule_async_task
+    from app.ws.relay import publish_ingest_event
+
+    data = {
+        "ip": ip,
+        "response_type": response_type,
+        # Isi XML tidak dikirim lewat relay, penerima membaca xml_config_store
+        "message": payload if isinstance(payload, str) else None
+    }
+    schedule_async_task(publish_ingest_event("bbu_response", data))
+
+
+bbu_requests = BbuRequestRegistry()
@@ -1,17 +1,27 @@
 from app.config.utils import HeartBeat, GetCellParaRsp, GetAppCfgExtRsp, OneUeInfoIndi, GPSInfoIndi
 import time
 import re
-import os
 import asyncio
-from app.db.database import SessionLocal, engine
+from functools import partial
+from app.db.database import engine
 from app.db import models
-from app.service.heartbeat_service import get_heartbeat_by_ip
+from app.service.heartbeat_service import get_heartbeat_by_ip, upsert_heartbeat, update_status_ip_sniffer, update_heartbeat
 from app.service.utils_service import get_frequency, provider_mapping
-from app.service.sniffer_service import insert_sniffer_nmmcfg, reset_nmmcfg
+from app.service.sniffer_service import insert_sniffer_nmmcfg, reset_nmmcfg, flush_sniffer_results, stage_sniffer_results
 from app.service.wb_status_service import get_wb_status
-from app.ws.events import event_bus
+from app.service.target_service import target_cache
+from app.service.xml_config_service import xml_config_store
+from app.service.observation_service import observation_store
+from app.service.rollup_service import signal_rollup
+from app.controller.bbu_request import response_received
+from app.controller.ingest_uow import ingest_uow
+from app.ws.relay import publish_ingest_event
 from app.ws import runtime
 
+# Token tipe pesan selalu ada di header, sebelum payload XML
+MESSAGE_PEEK_BYTES = 256
+XML_MARKER = b"<?xml"
+
 def schedule_async_task(coro):
     """Schedule an async task safely from synchronous context using main event loop"""
     if runtime.main_loop is not None:
@@ -19,30 +29,64 @@ def schedule_async_task(coro):
     else:
         print("[WARNING] Main event loop not available, skipping async task")
 
+def publish_after_commit(channel, data):
+    """Publish event websocket setelah window ingest yang memuat datanya commit"""
+    ingest_uow.after_commit(lambda: schedule_async_task(publish_ingest_event(channel, data)))
+
 models.Base.metadata.create_all(bind=engine)
 
-def save_xml_file(message, source_ip, folder_name, log_message):
+def save_xml_file(db, message, source_ip, xml_type, log_message):
+    """
+    message: bytes/memoryview datagram mentah. XML di-parse sekali ke
+    xml_config_store (file di app/xml_file ditulis di background).
+    """
     print(log_message)
-    xml_pattern = r"<\?xml[\s\S]*"
-    xml_match = re.search(xml_pattern, message)
-
-    if xml_match:
-        xml_string = xml_match.group(0)
-
-        base_path = os.path.join(os.path.dirname(__file__), '../xml_file')
-        os.makedirs(base_path, exist_ok=True)
-
-        full_folder_path = os.path.join(base_path, folder_name)
-        os.makedirs(full_folder_path, exist_ok=True)
+    view = memoryview(message)
+    xml_start = find_xml_start(view)
 
-        file_path = os.path.join(full_folder_path, f"{folder_name}_{source_ip}.xml")
-        with open(file_path, "w") as file:
-            file.write(xml_string)
-
-        print("File XML telah dibuat di:", os.path.abspath(file_path))
-    else:
+    if xml_start < 0:
         print("Tidak ditemukan XML dalam string yang diberikan.")
-        
+        return None
+
+    entry = xml_config_store.update(xml_type, source_ip, view[xml_start:])
+    if entry is not None and xml_type == "cell_para":
+        update_heartbeat(db, source_ip, entry)
+    return entry
+
+
+def find_xml_start(view):
+    """Offset awal '<?xml' di datagram, cek header dulu sebelum scan penuh"""
+    offset = bytes(view[:MESSAGE_PEEK_BYTES]).find(XML_MARKER)
+    if offset < 0 and len(view) > MESSAGE_PEEK_BYTES:
+        offset = bytes(view).find(XML_MARKER)
+    return offset
+
+
+def peek_message_type(view):
+    """
+    Ambil token tipe pesan dari header datagram (sebelum payload XML)
+    tanpa decode seluruh datagram. Return None jika tidak dikenal.
+    """
+    header = bytes(view[:MESSAGE_PEEK_BYTES])
+    xml_start = header.find(XML_MARKER)
+    if xml_start >= 0:
+        header = header[:xml_start]
+    for token in MESSAGE_TYPES:
+        if token in header:
+            return token
+    if xml_start < 0 and len(view) > MESSAGE_PEEK_BYTES:
+        # Header panjang tanpa XML: fallback scan penuh
+        data = bytes(view)
+        for token in MESSAGE_TYPES:
+            if token in data:
+                return token
+    return None
+
+
+def _field(message, name):
+    """Nilai di antara 'name[' dan ']' pertama setelahnya"""
+    start = message.index(name + "[") + len(name) + 1
+    return message[start:message.index("]", start)]
 
 def calculate_imei_check_digit(imei_14):
     if len(imei_14) != 14 or not imei_14.isdigit():
@@ -60,235 +104,321 @@ def calculate_imei_check_digit(imei_14):
     check_digit = (10 - (total % 10)) % 10
     return str(check_digit)
 
-def RespUdp(message, addr):
-    print(f"Message : {message}")
-    source_ip = addr[0]
-    print("Source IP:", source_ip, "Received message:", message)
-
-    date_now = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
 
-    from app.service.utils_service import get_provider_data
-    from app.service.heartbeat_service import upsert_heartbeat, update_status_ip_sniffer
+def _handle_heartbeat(db, message, source_ip, date_now):
+    STATE = _field(message, "STATE")
+    TEMP = _field(message, "TEMP")
+    MODE = _field(message, "MODE")
+    BAND = _field(message, "BAND")
+    CH = message.split(" ")[3]
+
+    wb_status = get_wb_status(db)
+    if wb_status is not None:
+        if STATE == "CLOSED":
+            if wb_status == 0:
+                STATE = "ONLINE"
+            elif wb_status == 1:
+                STATE = "STATE_CELL_RF_OPEN"
+
+
+    upsert_heartbeat(
+        db=db,
+        source_ip=source_ip,
+        state=STATE,
+        temp=TEMP,
+        mode=MODE,
+        ch=CH,
+        timestamp=date_now,
+        band=BAND
+    )
+    # Commit dikelompokkan per window oleh ingest_uow, flush supaya row baru terbaca
+    db.flush()
+
+    heartbeat_data = get_heartbeat_by_ip(db, source_ip)
+    mcc_str = heartbeat_data.mcc
+    mnc_str = heartbeat_data.mnc
+    final_provider = "Other"
+
+    if mcc_str and mnc_str:
+        try:
+            mcc_list = [x.strip() for x in mcc_str.split(',')]
+            mnc_list = [x.strip() for x in mnc_str.split(',')]
+
+            providers = []
+            seen = set()
+            for c_mcc, c_mnc in zip(mcc_list, mnc_list):
+                plmn = c_mcc + c_mnc
+                p = provider_mapping(plmn)
+                if p not in seen:
+                    providers.append(p)
+                    seen.add(p)
+
+            if providers:
+                final_provider = ", ".join(providers)
+
+        except Exception as e:
+            print(f"[Error] Failed to parse MCC/MNC for Heartbeat: {e}")
+
+    heartbeat_data = {
+        "type": "heartbeat",
+        "ip": source_ip,
+        "state": STATE,
+        "temp": TEMP,
+        "mode": MODE,
+        "ch": CH,
+        "band": BAND or heartbeat_data.band,
+        "provider": final_provider,
+        "mcc": heartbeat_data.mcc,
+        "mnc": heartbeat_data.mnc,
+        "arfcn": heartbeat_data.arfcn,
+        "ul": heartbeat_data.ul_freq,
+        "dl": heartbeat_data.dl_freq,
+        "timestamp": date_now
+    }
+    # Hanya dikirim ke websocket jika state device berubah
+    publish_after_commit("heartbeat", heartbeat_data)
+
+
+def _handle_ue_info(db, message, source_ip, date_now):
     from app.service.crawling_service import upsert_crawling
-    from app.service.gps_service import upsert_gps, get_gps_data
+    from app.service.campaign_service import get_latest_campaign_id
+    from app.service.sighting_service import record_sighting
+
+    rsrp = _field(message, "rsrp")
+    taType = _field(message, "taType")
+    ulCqi = _field(message, "ulCqi")
+    ulRssi = str(int(_field(message, "ulRssi")) - 130)
+    imsi = _field(message, "imsi")
+    ch_match = re.search(r"CH-(\S+)", message)
+    ch = ch_match.group(1) if ch_match else None
+
+    result_imei = None
+    if "imei[" in message and "]" in message:
+        imei = _field(message, "imei")
+        imei14 = imei[:14]
+        if imei14.isdigit() and len(imei14) == 14:
+            if imei14[0] != "0" and imei14[-1] != "0":
+                result_imei = imei14 + calculate_imei_check_digit(imei14)
+
+    freq = get_frequency(db, source_ip)
+
+    campaign_id = get_latest_campaign_id(db)
+    if campaign_id is not None:
+        crawling = upsert_crawling(
+            db=db,
+            timestamp=date_now,
+            rsrp=rsrp,
+            taType=taType,
+            ulCqi=ulCqi,
+            ulRssi=ulRssi,
+            imsi=imsi,
+            ip=source_ip,
+            ch="CH-" + ch if ch else None,
+            provider=provider_mapping(imsi),
+            campaign_id=campaign_id,
+            imei=result_imei
+        )
+        record_sighting(db, imsi, campaign_id, source_ip, crawling.ts, imei=result_imei)
+        db.flush()
+
+        # Setiap pengukuran dicatat di history (bulk insert di thread writer),
+        # baru setelah window commit supaya tidak ada history untuk row yang di-rollback
+        ingest_uow.after_commit(partial(
+            observation_store.record,
+            imsi=imsi,
+            ip=source_ip,
+            campaign_id=campaign_id,
+            ch="CH-" + ch if ch else None,
+            rsrp=rsrp,
+            ulRssi=ulRssi,
+            ulCqi=ulCqi,
+            taType=taType,
+            lat=crawling.lat,
+            long=crawling.long,
+            ts=crawling.ts
+        ))
+        ingest_uow.after_commit(partial(
+            signal_rollup.record, campaign_id, imsi, source_ip, rsrp, ulRssi, at=crawling.ts.timestamp()
+        ))
+
+        target = target_cache.get(db, imsi)
+        crawling_data = {
+            "type": "crawling",
+            "provider": provider_mapping(imsi),
+            "imsi": imsi,
+            "timestamp": date_now,
+            "rsrp": rsrp,
+            "taType": taType,
+            "ulCqi": ulCqi,
+            "ulRssi": ulRssi,
+            "ip": source_ip,
+            "ch": "CH-" + ch if ch else None,
+            "arfcn": freq["arfcn"] if freq else None,
+            "ul_freq": freq["ul_freq"] if freq else None,
+            "dl_freq": freq["dl_freq"] if freq else None,
+            "mode": freq["mode"] if freq else None,
+            "campaign_id": campaign_id,
+            "alert_status": target["alert_status"] if target else None,
+            "alert_name": target["name"] if target else None
+        }
+        publish_after_commit("crawling", crawling_data)
+
+
+def _handle_gps(db, message, source_ip, date_now):
+    from app.service.gps_service import upsert_gps
+
+    latitude = _field(message, "latitude")
+    longitude = _field(message, "longitude")
+    print("GPS Info - Latitude:", latitude, "Longitude:", longitude, "Date:", date_now)
+    upsert_gps(db, latitude, longitude, date_now)
+
+
+def _handle_sniffer_result(db, message, source_ip, date_now):
+    from app.service.utils_service import get_provider_data
 
-    db = SessionLocal()
-    try:
-        if HeartBeat in message:
-            STATE = message.split("STATE[")[1].split("]")[0]
-            TEMP = message.split("TEMP[")[1].split("]")[0]
-            MODE = message.split("MODE[")[1].split("]")[0]
-            BAND = message.split("BAND[")[1].split("]")[0]
-            CH = message.split(" ")[3]
-            
-            wb_status = get_wb_status(db)
-            if wb_status is not None:
-                if STATE == "CLOSED":
-                    if wb_status == 0:
-                        STATE = "ONLINE"
-                    elif wb_status == 1:
-                        STATE = "STATE_CELL_RF_OPEN"
-
-
-            upsert_heartbeat(
-                db=db,
-                source_ip=source_ip,
-                state=STATE,
-                temp=TEMP,
-                mode=MODE,
-                ch=CH,
-                timestamp=date_now,
-                band=BAND
-            )
-            db.commit()
-
-            heartbeat_data = get_heartbeat_by_ip(db, source_ip)
-            mcc_str = heartbeat_data.mcc
-            mnc_str = heartbeat_data.mnc
-            final_provider = "Other"
-
-            if mcc_str and mnc_str:
-                try:
-                    mcc_list = [x.strip() for x in mcc_str.split(',')]
-                    mnc_list = [x.strip() for x in mnc_str.split(',')]
-                    
-                    providers = []
-                    seen = set()
-                    for c_mcc, c_mnc in zip(mcc_list, mnc_list):
-                        plmn = c_mcc + c_mnc
-                        p = provider_mapping(plmn)
-                        if p not in seen:
-                            providers.append(p)
-                            seen.add(p)
-                    
-                    if providers:
-                        final_provider = ", ".join(providers)
-                
-                except Exception as e:
-                    print(f"[Error] Failed to parse MCC/MNC for Heartbeat: {e}")
-
-            heartbeat_data = {
-                "type": "heartbeat",
+    if "[-1]" not in message:
+        pattern = r'erfcn\[(\d+)\],pci\[(\d+)\],rsrp\[(-?\d+)\]'
+        match = re.search(pattern, message)
+
+        if match:
+            earfcn_value = int(match.group(1))
+            pci_value = match.group(2)
+            rsrp_value = match.group(3)
+            ch_match = re.search(r"CH-(\S+)", message)
+            ch = ch_match.group(1) if ch_match else None
+
+            prov = get_provider_data(db, earfcn_value)
+
+            sniffing_data = {
+                "type": "sniffing",
                 "ip": source_ip,
-                "state": STATE,
-                "temp": TEMP,
-                "mode": MODE,
-                "ch": CH,
-                "band": BAND or heartbeat_data.band,
-                "provider": final_provider,
-                "mcc": heartbeat_data.mcc,
-                "mnc": heartbeat_data.mnc,
-                "arfcn": heartbeat_data.arfcn,
-                "ul": heartbeat_data.ul_freq,
-                "dl": heartbeat_data.dl_freq,
-                "timestamp": date_now
+                "arfcn": earfcn_value,
+                "operator": prov["operator"],
+                "band": prov["band"],
+                "dl_freq": prov["dl_freq"],
+                "ul_freq": prov["ul_freq"],
+                "pci": str(pci_value) if pci_value else None,
+                "rsrp": str(rsrp_value) if rsrp_value else None,
+                "timestamp": date_now,
+                "ch": "CH-" + ch if ch else None
             }
-            schedule_async_task(event_bus.send_heartbeat(heartbeat_data))
+            insert_sniffer_nmmcfg(
+                db=db,
+                ip=source_ip,
+                arfcn=earfcn_value,
+                operator=prov["operator"],
+                band=prov["band"],
+                dl_freq=prov["dl_freq"],
+                ul_freq=prov["ul_freq"],
+                pci=str(pci_value) if pci_value else None,
+                rsrp=str(rsrp_value) if rsrp_value else None,
+                ch="CH-" + ch if ch else None,
+                # Row masih di buffer, event dikirim setelah row-nya di-commit
+                on_flushed=lambda: publish_after_commit("sniffing", sniffing_data)
+            )
 
-        elif GetCellParaRsp in message:
-            save_xml_file(message, source_ip, 'cellpara', "(CellParaRsp)")
+            update_status_ip_sniffer(source_ip, 'scan', 1, db)
 
-        elif GetAppCfgExtRsp in message:
-            save_xml_file(message, source_ip, 'appcfgext', "(AppCfgExtRsp)")
+    else:
+        # Scan selesai, persist sisa hasil di buffer sebelum update status
+        flush_sniffer_results(db)
+        update_status_ip_sniffer(source_ip, 'scan', -1, db)
+
+        sniffing_complete = {
+            "type": "sniffing_complete",
+            "ip": source_ip,
+            "timestamp": date_now
+        }
+        publish_after_commit("sniffing", sniffing_complete)
+
+
+def _handle_start_sniffer(db, message, source_ip, date_now):
+    RESULT = _field(message, "RESULT")
+    reset_nmmcfg(db)
+    update_status_ip_sniffer(source_ip, 'scan', 1, db)
+
+    if RESULT == "PARA_ERROR":
+        # PARA_ERROR menandakan modul sniffer tidak ada
+        update_status_ip_sniffer(source_ip, 'status', 0, db)
+
+
+# Pesan XML (config dump besar): diteruskan sebagai bytes, tanpa decode
+RAW_HANDLERS = {
+    GetCellParaRsp.encode(): lambda db, view, source_ip: save_xml_file(db, view, source_ip, "cell_para", "(CellParaRsp)"),
+    GetAppCfgExtRsp.encode(): lambda db, view, source_ip: save_xml_file(db, view, source_ip, "app_cfg_ext", "(AppCfgExtRsp)"),
+}
+
+# Pesan teks pendek: di-decode lalu diproses dengan sesi DB
+TEXT_HANDLERS = {
+    HeartBeat.encode(): _handle_heartbeat,
+    OneUeInfoIndi.encode(): _handle_ue_info,
+    GPSInfoIndi.encode(): _handle_gps,
+    b"SnifferRsltIndi": _handle_sniffer_result,
+    b"StartSniffer": _handle_start_sniffer,
+}
+
+# Pesan frekuensi tinggi yang tidak commit sendiri: di-commit per window oleh
+# ingest_uow. Handler lain (sniffer, XML) memanggil helper yang commit sendiri.
+BATCHED_TYPES = {
+    HeartBeat.encode(),
+    OneUeInfoIndi.encode(),
+    GPSInfoIndi.encode(),
+}
+
+# Hasil sniff yang tertahan di buffer ikut masuk transaksi window saat commit
+ingest_uow.add_pre_commit(stage_sniffer_results)
+
+# Urutan pencocokan token sama dengan urutan elif lama
+MESSAGE_TYPES = (
+    HeartBeat.encode(),
+    GetCellParaRsp.encode(),
+    GetAppCfgExtRsp.encode(),
+    OneUeInfoIndi.encode(),
+    GPSInfoIndi.encode(),
+    b"SnifferRsltIndi",
+    b"StartSniffer",
+)
 
-        elif OneUeInfoIndi in message:
-            rsrp = message.split("rsrp[")[1].split("]")[0]
-            taType = message.split("taType[")[1].split("]")[0]
-            ulCqi = message.split("ulCqi[")[1].split("]")[0]
-            ulRssi_raw = message.split("ulRssi[")[1].split("]")[0]
-            ulRssi = str(int(ulRssi_raw) - 130)
-            imsi = message.split("imsi[")[1].split("]")[0]
-            ch_match = re.search(r"CH-(\S+)", message)
-            ch = ch_match.group(1) if ch_match else None
-            
-            result_imei = None
-            if "imei[" in message and "]" in message:
-                imei = message.split("imei[")[1].split("]")[0]
-                imei14 = imei[:14]
-                if imei14.isdigit() and len(imei14) == 14:
-                    if imei14[0] != "0" and imei14[-1] != "0":
-                        result_imei = imei14 + calculate_imei_check_digit(imei14)
-            
-            freq = get_frequency(source_ip) 
-
-            from app.service.campaign_service import get_latest_campaign_id
-            campaign_id = get_latest_campaign_id(db)
-            if campaign_id is not None:
-                upsert_crawling(
-                    db=db,
-                    timestamp=date_now,
-                    rsrp=rsrp,
-                    taType=taType,
-                    ulCqi=ulCqi,
-                    ulRssi=ulRssi,
-                    imsi=imsi,
-                    ip=source_ip,
-                    ch="CH-" + ch if ch else None,
-                    provider=provider_mapping(imsi),
-                    campaign_id=campaign_id,
-                    imei=result_imei
-                )
-                db.commit()
-                
-                crawling_data = {
-                    "type": "crawling",
-                    "provider": provider_mapping(imsi),
-                    "imsi": imsi,
-                    "timestamp": date_now,
-                    "rsrp": rsrp,
-                    "taType": taType,
-                    "ulCqi": ulCqi,
-                    "ulRssi": ulRssi,
-                    "ip": source_ip,
-                    "ch": "CH-" + ch if ch else None,  
-                    "arfcn": freq["arfcn"] if freq else None,
-                    "ul_freq": freq["ul_freq"] if freq else None,
-                    "dl_freq": freq["dl_freq"] if freq else None,
-                    "mode": freq["mode"] if freq else None,
-                    "campaign_id": campaign_id
-                }
-                schedule_async_task(event_bus.send_crawling(crawling_data))
-
-        elif GPSInfoIndi in message:
-            latitude = message.split("latitude[")[1].split("]")[0]
-            longitude = message.split("longitude[")[1].split("]")[0]
-            date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-            print("GPS Info - Latitude:", latitude, "Longitude:", longitude, "Date:", date)
-            upsert_gps(latitude, longitude, date)
-
-        elif "SnifferRsltIndi" in message:
-            if "[-1]" not in message:
-                pattern = r'erfcn\[(\d+)\],pci\[(\d+)\],rsrp\[(-?\d+)\]'
-                match = re.search(pattern, message)
-
-                print("msgggg", message)
-                if match:
-                    earfcn_value = int(match.group(1))
-                    pci_value = match.group(2)
-                    rsrp_value = match.group(3)
-                    ch_match = re.search(r"CH-(\S+)", message)
-                    ch = ch_match.group(1) if ch_match else None
-
-                    prov = get_provider_data(db, earfcn_value)
-
-                    insert_sniffer_nmmcfg(
-                        db=db,
-                        ip=source_ip,
-                        arfcn=earfcn_value,
-                        operator=prov["operator"],
-                        band=prov["band"],
-                        dl_freq=prov["dl_freq"],
-                        ul_freq=prov["ul_freq"],
-                        pci=str(pci_value) if pci_value else None,
-                        rsrp=str(rsrp_value) if rsrp_value else None,
-                        ch="CH-" + ch if ch else None
-                    )
-
-                    update_status_ip_sniffer(source_ip, 'scan', 1, db)
-
-                    sniffing_data = {
-                        "type": "sniffing",
-                        "ip": source_ip,
-                        "arfcn": earfcn_value,
-                        "operator": prov["operator"],
-                        "band": prov["band"],
-                        "dl_freq": prov["dl_freq"],
-                        "ul_freq": prov["ul_freq"],
-                        "pci": str(pci_value) if pci_value else None,
-                        "rsrp": str(rsrp_value) if rsrp_value else None,
-                        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-                        "ch": "CH-" + ch if ch else None
-                    }
-                    schedule_async_task(event_bus.send_sniffing(sniffing_data))
-
-            else:
-                print("masuk -1 nih<<<<<<<", message)
-                time.sleep(1)
-                update_status_ip_sniffer(source_ip, 'scan', -1, db)
-                
-                sniffing_complete = {
-                    "type": "sniffing_complete",
-                    "ip": source_ip,
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-                }
-                schedule_async_task(event_bus.send_sniffing(sniffing_complete))
-
-
-        elif "StartSniffer" in message:
-            RESULT = message.split("RESULT[")[1].split("]")[0]
-            print("RESULT SNIF", RESULT)
-            reset_nmmcfg(db)
-            update_status_ip_sniffer(source_ip, 'scan', 1, db)
 
-            if RESULT == "PARA_ERROR":
-                # PARA_ERROR menandakan modul sniffer tidak ada
-                update_status_ip_sniffer(source_ip, 'status', 0, db)
+def RespUdp(message, addr):
+    """
+    message: datagram mentah (bytes/memoryview dari UdpReceiver) atau str.
+    Tipe pesan dibaca dari header dulu, decode hanya untuk pesan teks.
+    """
+    source_ip = addr[0]
+    view = memoryview(message.encode() if isinstance(message, str) else message)
+    msg_type = peek_message_type(view)
+
+    raw_handler = RAW_HANDLERS.get(msg_type)
+    if raw_handler is not None:
+        print("Source IP:", source_ip, "Received message:", msg_type.decode(), f"({len(view)} bytes)")
+        try:
+            with ingest_uow.message(batched=False) as db:
+                entry = raw_handler(db, view, source_ip)
+        except Exception as e:
+            print("DB error:", str(e))
+            return
+        if entry is not None:
+            response_received(source_ip, msg_type.decode(), entry)
+        return
+
+    try:
+        message = str(view, "utf-8")
+    except UnicodeDecodeError as e:
+        print(f"[UDP] Datagram dari {source_ip} bukan UTF-8: {e}")
+        return
+
+    handler = TEXT_HANDLERS.get(msg_type)
+    date_now = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
 
-        else:
-            print(" ")
+    if handler is None:
+        return
 
+    try:
+        # Session dipakai ulang antar datagram; commit per window, bukan per pesan
+        with ingest_uow.message(batched=msg_type in BATCHED_TYPES) as db:
+            handler(db, message, source_ip, date_now)
     except Exception as e:
-        db.rollback()
         print("DB error:", str(e))
-    finally:
-        db.close()
+        return
+    response_received(source_ip, msg_type.decode(), message)
@@ -0,0 +1,143 @@
+"""
+Shard UDP ingest dengan SO_REUSEPORT (APP_INGEST_WORKERS > 1).
+
+Proses utama dan N-1 proses shard bind PortUDPServer dengan SO_REUSEPORT,
+kernel membagi datagram berdasarkan source address sehingga satu BBU selalu
+diproses proses yang sama. Shard menjalankan RespUdp penuh (DB write ke
+database yang sama), tetapi event websocket dikirim ke proses utama yang
+memegang heartbeat coalescer, seq crawling dan relay ke worker API.
+
+Command UDP tetap dikirim dari socket proses utama. Karena semua socket
+bind port yang sama, balasan BBU boleh diterima shard mana pun dan
+diproses lewat DB/file XML yang dipakai bersama.
+"""
+import asyncio
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+from app.ws import runtime
+
+_processes = []
+
+
+def _apply_shard_control(message):
+    """Proses utama: terapkan perubahan cache dari shard lalu teruskan ke shard lain"""
+    from app.service.heartbeat_service import cache_sniff_state
+    from app.ws.relay import forward_to_shards
+
+    op, payload = message.get("op"), message.get("d") or {}
+    if op != "sniff_state":
+        print(f"[INGEST SHARD] Unknown shard control op: {op}")
+        return
+    try:
+        cache_sniff_state(**payload)
+    except Exception as e:
+        print(f"[INGEST SHARD] control error: {e}")
+        return
+    # Shard pengirim sudah punya state ini
+    forward_to_shards(op, exclude_shard=message.get("shard"), **payload)
+
+
+def _consume_events(event_queue):
+    """Proses utama: teruskan event dari shard ke event loop utama (urut per shard)"""
+    from app.controller.handle_message_receiver_bbu import schedule_async_task
+    from app.ws.relay import publish_ingest_event
+
+    while True:
+        channel, data = event_queue.get()
+        if channel == "control":
+            _apply_shard_control(data)
+            continue
+        schedule_async_task(publish_ingest_event(channel, data))
+
+
+def _consume_controls(control_queue):
+    """Proses shard: terapkan perubahan cache dari proses utama"""
+    from app.controller.bbu_request import bbu_requests
+    from app.service.heartbeat_service import cache_sniff_state
+    from app.service.target_service import target_cache
+
+    handlers = {
+        "target_cache_invalidate": target_cache.invalidate,
+        "bbu_expect": bbu_requests.expect,
+        # Hanya cache lokal, tidak dikirim balik ke proses utama
+        "sniff_state": cache_sniff_state,
+    }
+    while True:
+        op, payload = control_queue.get()
+        handler = handlers.get(op)
+        if handler is None:
+            print(f"[INGEST SHARD] Unknown control op: {op}")
+            continue
+        try:
+            handler(**payload)
+        except Exception as e:
+            print(f"[INGEST SHARD] control error: {e}")
+
+
+def _watch_parent(parent_pid):
+    """Shard ikut berhenti jika proses utama mati (termasuk SIGKILL), supaya port tidak tertahan"""
+    while True:
+        if os.getppid() != parent_pid:
+            print("[INGEST SHARD] Proses utama berhenti, shard keluar")
+            os._exit(0)
+        time.sleep(1)
+
+
+def run_ingest_shard(index, event_queue, control_queue, shards, parent_pid):
+    """Entry point proses shard"""
+    from app.ws import relay
+    from app.controller import udp_client
+
+    threading.Thread(target=_watch_parent, args=(parent_pid,), name="ShardWatchdog", daemon=True).start()
+
+    runtime.process_role = runtime.ROLE_SHARD
+    runtime.ingest_shards = shards
+    relay.shard_link = event_queue
+    relay.shard_index = index
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="ShardLoop", daemon=True).start()
+    runtime.main_loop = loop
+
+    threading.Thread(target=_consume_controls, args=(control_queue,), name="ShardControl", daemon=True).start()
+
+    print(f"[INGEST SHARD] Shard {index} bind UDP dengan SO_REUSEPORT")
+    udp_client.start_receiver(reuse_port=True)
+
+
+def start_ingest_shards(count: int) -> int:
+    """
+    Jalankan count-1 proses shard (proses utama juga menerima datagram).
+    Return jumlah proses ingest yang aktif.
+    """
+    if count <= 1:
+        return 1
+    if not hasattr(socket, "SO_REUSEPORT"):
+        print("[INGEST SHARD] SO_REUSEPORT tidak didukung, ingest tetap 1 proses")
+        return 1
+
+    from app.ws import relay
+
+    runtime.ingest_shards = count
+    ctx = multiprocessing.get_context("spawn")
+    event_queue = ctx.Queue()
+
+    for index in range(1, count):
+        control_queue = ctx.Queue()
+        process = ctx.Process(
+            target=run_ingest_shard,
+            args=(index, event_queue, control_queue, count, os.getpid()),
+            name=f"IngestShard-{index}",
+            daemon=True
+        )
+        process.start()
+        _processes.append(process)
+        relay.shard_controls.append(control_queue)
+
+    threading.Thread(target=_consume_events, args=(event_queue,), name="ShardEvents", daemon=True).start()
+    print(f"[INGEST SHARD] {count} proses ingest pada port UDP (SO_REUSEPORT)")
+    return count
@@ -0,0 +1,187 @@
+"""
+Unit-of-work DB untuk UDP ingest.
+
+Satu session IngestSessionLocal dipakai ulang oleh thread receiver. Pesan
+frekuensi tinggi (heartbeat, UE info, GPS) diproses di dalam SAVEPOINT dan
+di-commit bersama per window (INGEST_COMMIT_INTERVAL detik atau
+INGEST_COMMIT_MAX pesan), bukan commit + checkout koneksi per datagram.
+Pesan yang gagal hanya me-rollback savepoint-nya sendiri.
+
+Pesan jarang yang helper-nya commit sendiri (sniffer, config XML) memakai
+message(batched=False): window yang tertunda di-commit dulu, lalu pesan
+diproses dan di-commit langsung seperti sebelumnya.
+
+Event websocket didaftarkan lewat after_commit() dan baru dijalankan setelah
+window-nya commit, jadi client tidak menerima data yang belum ada di DB (atau
+yang akhirnya di-rollback).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config.utils import INGEST_COMMIT_INTERVAL, INGEST_COMMIT_MAX
+from app.db.database import IngestSessionLocal
+
+
+class IngestUnitOfWork:
+    def __init__(self, session_factory=IngestSessionLocal, commit_interval: float = INGEST_COMMIT_INTERVAL, max_pending: int = INGEST_COMMIT_MAX):
+        self._session_factory = session_factory
+        self.commit_interval = commit_interval
+        self.max_pending = max(1, max_pending)
+        # Session tidak thread-safe: dipakai thread receiver dan thread committer bergantian
+        self._lock = threading.RLock()
+        self._session: Session = None
+        self._pending = 0
+        self._window_started = None
+        self._committer = None
+        self._pre_commit: List[Callable[[Session], None]] = []
+        # Callback after_commit milik window yang tertunda dan pesan yang sedang diproses
+        self._post_commit: List[Callable[[], None]] = []
+        self._message_callbacks: Optional[List[Callable[[], None]]] = None
+
+        self.messages = 0
+        self.commits = 0
+        self.rollbacks = 0
+
+    def add_pre_commit(self, hook: Callable[[Session], None]):
+        """hook(db) dijalankan di transaksi window, tepat sebelum commit"""
+        self._pre_commit.append(hook)
+
+    def after_commit(self, callback: Callable[[], None]):
+        """
+        callback() dijalankan setelah transaksi pesan yang sedang diproses
+        commit, dibuang jika pesan / window di-rollback. Di luar message()
+        langsung dijalankan.
+        """
+        if self._message_callbacks is None:
+            callback()
+            return
+        self._message_callbacks.append(callback)
+
+    @contextmanager
+    def message(self, batched: bool = True):
+        """Session untuk satu datagram"""
+        with self._lock:
+            self._start_committer()
+            db = self._get_session()
+            self.messages += 1
+
+            if not batched:
+                self._commit()
+                callbacks = self._message_callbacks = []
+                try:
+                    yield db
+                    db.commit()
+                except Exception:
+                    self._rollback()
+                    raise
+                finally:
+                    self._message_callbacks = None
+                self._run_callbacks(callbacks)
+                return
+
+            callbacks = self._message_callbacks = []
+            try:
+                with db.begin_nested():
+                    yield db
+            except Exception:
+                self.rollbacks += 1
+                if not db.is_active:
+                    # Transaksi luar ikut rusak (mis. koneksi putus), buang window
+                    self._rollback()
+                raise
+            finally:
+                self._message_callbacks = None
+
+            self._post_commit.extend(callbacks)
+            self._pending += 1
+            if self._window_started is None:
+                self._window_started = time.monotonic()
+            if self._pending >= self.max_pending:
+                self._commit()
+
+    def commit(self):
+        """Commit window yang tertunda (dipanggil saat shutdown / test)"""
+        with self._lock:
+            self._commit()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "messages": self.messages,
+                "commits": self.commits,
+                "rollbacks": self.rollbacks,
+                "pending": self._pending,
+                "commit_interval": self.commit_interval,
+                "max_pending": self.max_pending,
+            }
+
+    def _get_session(self) -> Session:
+        if self._session is None:
+            self._session = self._session_factory()
+        return self._session
+
+    def _commit(self):
+        if self._session is None:
+            return
+        try:
+            # after_commit yang didaftarkan hook ikut window ini
+            previous, hook_callbacks = self._message_callbacks, []
+            self._message_callbacks = hook_callbacks
+            try:
+                for hook in self._pre_commit:
+                    hook(self._session)
+            finally:
+                self._message_callbacks = previous
+            self._post_commit.extend(hook_callbacks)
+            if self._session.in_transaction():
+                self._session.commit()
+            if self._pending:
+                self.commits += 1
+        except Exception as e:
+            print(f"[INGEST UOW] Commit gagal, {self._pending} pesan dibatalkan: {e}")
+            self._rollback()
+            return
+        callbacks, self._post_commit = self._post_commit, []
+        self._pending = 0
+        self._window_started = None
+        self._run_callbacks(callbacks)
+
+    @staticmethod
+    def _run_callbacks(callbacks: List[Callable[[], None]]):
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[INGEST UOW] after_commit error: {e}")
+
+    def _rollback(self):
+        self._pending = 0
+        self._window_started = None
+        self._post_commit = []
+        try:
+            self._session.rollback()
+        except Exception as e:
+            print(f"[INGEST UOW] Rollback gagal: {e}")
+        # Session dibuat ulang supaya state yang rusak tidak terbawa ke window berikutnya
+        self._session.close()
+        self._session = None
+
+    def _start_committer(self):
+        if self._committer is None:
+            self._committer = threading.Thread(target=self._commit_loop, name="IngestCommitter", daemon=True)
+            self._committer.start()
+
+    def _commit_loop(self):
+        # Commit window yang sudah lewat interval walaupun tidak ada datagram baru
+        while True:
+            time.sleep(self.commit_interval)
+            with self._lock:
+                if self._window_started is not None and time.monotonic() - self._window_started >= self.commit_interval:
+                    self._commit()
+
+
+ingest_uow = IngestUnitOfWork()
@@ -1,20 +1,28 @@
 from app.controller import UdpReceiver
 from app.controller import RespUdp
 from app.config.utils import PortUDPServer
+import os
 import threading
+from app.ws.relay import forward_to_ingest
 
 receiver_instance = None
 
+# Jumlah proses UDP ingest yang bind PortUDPServer dengan SO_REUSEPORT
+INGEST_WORKERS = int(os.getenv("APP_INGEST_WORKERS", "1"))
 
-def start_receiver():
+
+def start_receiver(reuse_port=False):
     global receiver_instance
-    receiver_instance = UdpReceiver(host='0.0.0.0', port=PortUDPServer, callback=RespUdp)
+    receiver_instance = UdpReceiver(host='0.0.0.0', port=PortUDPServer, callback=RespUdp, reuse_port=reuse_port)
     print("Receiver berjalan...")
     receiver_instance.run()
 
 
 def client_udp():
-    receiver_thread = threading.Thread(target=start_receiver)
+    from app.controller.ingest_shards import start_ingest_shards
+
+    shards = start_ingest_shards(INGEST_WORKERS)
+    receiver_thread = threading.Thread(target=start_receiver, args=(shards > 1,))
     receiver_thread.start()
 
 
@@ -22,5 +30,8 @@ def send_data(message, address):
     if receiver_instance:
         print(f"Message : {message}")
         receiver_instance.send_message(message, address)
+    elif forward_to_ingest("command", message=message, address=list(address)):
+        # Worker API: dikirim lewat socket UDP milik proses ingest
+        print(f"Message (relay) : {message}")
     else:
         print("Receiver belum berjalan. Tidak dapat mengirim pesan.")
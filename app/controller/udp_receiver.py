@@ -1,23 +1,196 @@
-from app.config.utils import BufferSize, MAX_RETRIES
+from app.config.utils import MAX_RETRIES, UDP_RCVBUF, UDP_SNDBUF, UDP_RECV_BATCH, UDP_SLOT_SIZE
+import ctypes
+import os
 import socket
+import sys
 import time
 
 
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+MSG_WAITFORONE = 0x10000
+SOCKADDR_SIZE = 28  # cukup untuk sockaddr_in / sockaddr_in6
+
+
+class RecvMmsg:
+    """
+    recvmmsg(2) lewat ctypes (Linux): satu syscall membaca banyak datagram
+    langsung ke slot bytearray yang sudah dialokasikan.
+    """
+
+    def __init__(self, sock, slots):
+        self.fd = sock.fileno()
+        self.slots = slots
+        self.views = [memoryview(slot) for slot in slots]
+        size = len(slots)
+
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._libc.recvmmsg.restype = ctypes.c_int
+        self._names = [ctypes.create_string_buffer(SOCKADDR_SIZE) for _ in range(size)]
+        self._iovecs = (_IoVec * size)()
+        self._msgs = (_MMsgHdr * size)()
+
+        for i, slot in enumerate(slots):
+            buf = (ctypes.c_char * len(slot)).from_buffer(slot)
+            self._iovecs[i].iov_base = ctypes.addressof(buf)
+            self._iovecs[i].iov_len = len(slot)
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self._names[i])
+            hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            hdr.msg_iovlen = 1
+
+    @staticmethod
+    def available() -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            return hasattr(ctypes.CDLL(None), "recvmmsg")
+        except OSError:
+            return False
+
+    def receive(self):
+        for i in range(len(self.slots)):
+            self._msgs[i].msg_hdr.msg_namelen = SOCKADDR_SIZE
+
+        while True:
+            count = self._libc.recvmmsg(self.fd, self._msgs, len(self.slots), MSG_WAITFORONE, None)
+            if count >= 0:
+                break
+            errno = ctypes.get_errno()
+            if errno != 4:  # EINTR
+                raise OSError(errno, os.strerror(errno))
+
+        batch = []
+        for i in range(count):
+            name = self._names[i].raw
+            addr = (socket.inet_ntoa(name[4:8]), int.from_bytes(name[2:4], "big"))
+            batch.append((self.views[i][:self._msgs[i].msg_len], addr))
+        return batch
+
+
+def read_udp_drops(port):
+    """
+    Counter kernel untuk socket UDP di port tertentu dari /proc/net/udp
+    (semua socket, termasuk shard SO_REUSEPORT).
+    """
+    stats = {"sockets": 0, "rx_queue": 0, "drops": 0}
+    try:
+        with open("/proc/net/udp") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                local_port = int(fields[1].split(":")[1], 16)
+                if local_port != port:
+                    continue
+                stats["sockets"] += 1
+                stats["rx_queue"] += int(fields[4].split(":")[1], 16)
+                stats["drops"] += int(fields[-1])
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+    return stats
+
+
 class UdpReceiver():
-    def __init__(self, host, port, callback):
+    def __init__(self, host, port, callback, reuse_port=False, rcvbuf=UDP_RCVBUF, sndbuf=UDP_SNDBUF, batch_size=UDP_RECV_BATCH):
         super().__init__()
         self.host = host
         self.port = port
         self.callback = callback
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if reuse_port:
+            # Beberapa proses bind port yang sama, kernel membagi datagram per source address
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self._set_buffer(socket.SO_RCVBUF, rcvbuf)
+        self._set_buffer(socket.SO_SNDBUF, sndbuf)
         self.sock.bind((self.host, self.port))
 
+        # Slot receive dialokasikan sekali, dipakai ulang setiap batch
+        self.batch_size = max(1, batch_size)
+        self._slots = [bytearray(UDP_SLOT_SIZE) for _ in range(self.batch_size)]
+        self._views = [memoryview(slot) for slot in self._slots]
+        self._recvmmsg = RecvMmsg(self.sock, self._slots) if RecvMmsg.available() else None
+
+        self.datagrams = 0
+        self.recv_calls = 0
+        # Call MSG_DONTWAIT yang kembali EAGAIN (akhir setiap drain yang tidak penuh)
+        self.empty_calls = 0
+        self._skip_drain = False
+
+    def _set_buffer(self, option, size):
+        if not size:
+            return
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, option, size)
+        except OSError as e:
+            print(f"[UDP] Gagal set buffer socket {option}={size}: {e}")
+            return
+        actual = self.sock.getsockopt(socket.SOL_SOCKET, option)
+        # Linux menggandakan nilai yang diminta; jika jauh lebih kecil berarti dibatasi net.core.*_max
+        if actual < size:
+            print(f"[UDP] Buffer socket {option} hanya {actual} byte (diminta {size}), cek sysctl net.core.rmem_max/wmem_max")
+
+    def _receive_batch(self):
+        if self._recvmmsg is not None:
+            self.recv_calls += 1
+            return self._recvmmsg.receive()
+
+        # Fallback: blok untuk datagram pertama, lalu kuras antrian tanpa blok
+        nbytes, _, _, addr = self.sock.recvmsg_into([self._views[0]])
+        self.recv_calls += 1
+        batch = [(self._views[0][:nbytes], addr)]
+        if self._skip_drain:
+            # Drain sebelumnya langsung kosong (traffic jarang): batch ini tidak
+            # dikuras, supaya tidak setiap datagram diikuti satu call EAGAIN
+            self._skip_drain = False
+            return batch
+        while len(batch) < self.batch_size:
+            view = self._views[len(batch)]
+            try:
+                nbytes, _, _, addr = self.sock.recvmsg_into([view], 0, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                self.empty_calls += 1
+                self._skip_drain = len(batch) == 1
+                break
+            finally:
+                self.recv_calls += 1
+            batch.append((view[:nbytes], addr))
+        return batch
+
+    def stats(self):
+        return {
+            "datagrams": self.datagrams,
+            "recv_calls": self.recv_calls,
+            "empty_calls": self.empty_calls,
+            "batch_mode": "recvmmsg" if self._recvmmsg is not None else "recvmsg_into",
+            "kernel": read_udp_drops(self.port)
+        }
+
     def run(self):
         while True:
-            data, addr = self.sock.recvfrom(BufferSize)
-            message = data.decode()
-            # self.received_data.emit(message,addr)
-            self.callback(message, addr)
+            for view, addr in self._receive_batch():
+                self.datagrams += 1
+                # Callback menerima memoryview ke slot (belum di-decode) dan
+                # harus selesai memakainya sebelum return, slot dipakai ulang batch berikutnya
+                # self.received_data.emit(message,addr)
+                self.callback(view, addr)
 
     def send_message(self, message, address):
         try_count = 0
@@ -1,8 +1,11 @@
 # app/db/database.py
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from app.db.pool import POOL_API, POOL_API_ASYNC, POOL_BACKGROUND, POOL_INGEST, pool_kwargs
 
 # Load environment variables from .env
 load_dotenv()
@@ -13,16 +16,71 @@ SQLALCHEMY_DATABASE_URL = os.getenv(
     # "sqlite:///./app.db"  # Fallback untuk development lokal
 )
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    # Hapus connect_args check_same_thread karena itu hanya untuk SQLite
-    **({"pool_pre_ping": True} if "postgresql" in SQLALCHEMY_DATABASE_URL else {"connect_args": {"check_same_thread": False}})
-)
+def _engine_kwargs(pool_name: str, is_async: bool = False) -> dict:
+    kwargs = {}
+    if "postgresql" in SQLALCHEMY_DATABASE_URL:
+        kwargs["pool_pre_ping"] = True
+    elif not is_async:
+        # check_same_thread hanya untuk SQLite
+        kwargs["connect_args"] = {"check_same_thread": False}
+
+    # SQLite in-memory memakai SingletonThreadPool, pool tidak dikonfigurasi
+    if make_url(SQLALCHEMY_DATABASE_URL).database not in (None, "", ":memory:"):
+        kwargs.update(pool_kwargs(pool_name, is_async=is_async))
+    return kwargs
+
+
+def _async_database_url(url: str):
+    """URL yang sama dengan driver async (asyncpg untuk Postgres, aiosqlite untuk SQLite)"""
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql":
+        return url.set(drivername="postgresql+asyncpg")
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+# Pool terpisah per jalur supaya burst di satu jalur tidak membuat jalur lain
+# kehabisan koneksi (lihat app/db/pool.py). Engine tidak membuka koneksi
+# sampai dipakai, jadi pool yang tidak dipakai proses ini tidak makan koneksi.
+# - engine / SessionLocal: route API sync (get_db) dan helper umum
+# - ingest_engine / IngestSessionLocal: RespUdp dan helper yang dipanggilnya
+# - background_engine / BackgroundSessionLocal: heartbeat watcher, MSISDN checker, timer
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_kwargs(POOL_API))
+ingest_engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_kwargs(POOL_INGEST))
+background_engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_kwargs(POOL_BACKGROUND))
+
+if make_url(SQLALCHEMY_DATABASE_URL).get_backend_name() == "sqlite":
+    # Ingest memakai SAVEPOINT per pesan di dalam satu transaksi window
+    # (app/controller/ingest_uow.py). pysqlite tidak membuka transaksi sebelum
+    # SAVEPOINT, sehingga RELEASE langsung commit; BEGIN dikirim sendiri.
+    # IMMEDIATE: ambil lock tulis di awal window, hindari SQLITE_BUSY tanpa
+    # menunggu saat upgrade lock read -> write.
+    @event.listens_for(ingest_engine, "connect")
+    def _ingest_sqlite_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(ingest_engine, "begin")
+    def _ingest_sqlite_begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+IngestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=ingest_engine)
+BackgroundSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=background_engine)
 Base = declarative_base()
 
 
+# Engine async untuk route/service async, supaya query DB tidak memblok
+# event loop yang juga melayani websocket dan timer. Ingest UDP dan thread
+# background tetap memakai engine sync di atas.
+async_engine = create_async_engine(
+    _async_database_url(SQLALCHEMY_DATABASE_URL),
+    **_engine_kwargs(POOL_API_ASYNC, is_async=True)
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -30,3 +88,7 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,357 @@
+"""
+Migrasi skema ringan, dijalankan init_db setelah create_all.
+
+create_all hanya membuat tabel yang belum ada, kolom/index baru di tabel
+lama ditambahkan di sini. Setiap langkah idempotent (cek dulu yang sudah ada).
+
+Kolom ts (DateTime timezone-aware) mendampingi kolom timestamp string di
+heartbeat, crawling, gps dan nmmcfg. String tetap ditulis untuk format API
+dan websocket, ts dipakai query range dan heartbeat_checker. Data lama
+di-backfill bertahap di thread background.
+
+Crawling juga punya lat_deg / lon_deg (Float) dan geohash (index b-tree)
+dari kolom lat / long string, untuk area query. Di Postgres ditambah index
+GiST point(lon_deg, lat_deg).
+
+target.imsi mendapat unique index. Jika masih ada IMSI ganda, index tidak
+dibuat dan daftar IMSI + id-nya dicatat (stdout dan tabel logs) untuk
+dibereskan manual; data target tidak pernah dihapus otomatis.
+
+campaign_target (snapshot target per campaign) diisi dari JSON
+Campaign.target_info + Campaign.imsi untuk campaign lama yang belum punya row,
+langsung saat startup karena timer campaign yang di-recover membacanya.
+
+imsi_sighting (ringkasan IMSI lintas campaign) diisi sekali dari crawling
+jika masih kosong. crawling hanya menyimpan laporan terakhir per
+(campaign, imsi), jadi first_seen hasil backfill = laporan terakhir di
+campaign paling awal.
+"""
+import threading
+import time
+
+from sqlalchemy import bindparam, func, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.db.models import Campaign, CampaignTarget, Crawling, GPS, Heartbeat, ImsiSighting, Logs, NmmCfg, Target
+from app.utils import geohash as geohash_util
+from app.utils.timestamps import as_local, parse_local
+
+# (model, kolom string sumber) untuk kolom ts
+TIMESTAMP_COLUMNS = (
+    (Heartbeat, "timestamp"),
+    (Crawling, "timestamp"),
+    (GPS, "timestamp"),
+    (NmmCfg, "time"),
+)
+
+# Kolom posisi Crawling (index geohash ikut dibuat)
+POSITION_COLUMNS = ("lat_deg", "lon_deg", "geohash")
+POINT_INDEX = "ix_crawling_point"
+
+BACKFILL_BATCH = 5000
+DUPLICATE_REPORT_LIMIT = 50  # IMSI ganda yang ditulis ke log
+BACKFILL_PAUSE = 0.05  # detik antar batch, beri ruang ke ingest
+
+
+def run_migrations(engine):
+    for model, _ in TIMESTAMP_COLUMNS:
+        table = model.__table__
+        _add_column(engine, table, table.c.ts)
+        _create_indexes(engine, table, "ts")
+
+    table = Crawling.__table__
+    for name in POSITION_COLUMNS:
+        _add_column(engine, table, table.c[name])
+    _create_indexes(engine, table, "geohash")
+    if engine.dialect.name == "postgresql":
+        _create_point_index(engine, table)
+
+    table = Target.__table__
+    existing = {ix["name"] for ix in inspect(engine).get_indexes(table.name)}
+    if "ix_target_imsi" not in existing and not _report_duplicate_targets(engine, table):
+        _create_indexes(engine, table, "imsi")
+
+
+def _add_column(engine, table, column):
+    columns = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    if column.name in columns:
+        return
+    # Kolom nullable tanpa default: di Postgres hanya ubah metadata, tidak rewrite tabel
+    col_type = column.type.compile(dialect=engine.dialect)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}")
+    print(f"[MIGRATION] Kolom {table.name}.{column.name} ditambahkan")
+
+
+def _create_indexes(engine, table, column_name):
+    existing = {ix["name"] for ix in inspect(engine).get_indexes(table.name)}
+    missing = [ix for ix in table.indexes if ix.name not in existing and column_name in ix.columns]
+    if not missing:
+        return
+
+    if engine.dialect.name == "postgresql":
+        # CONCURRENTLY: tabel tetap bisa ditulis ingest selama index dibuat,
+        # harus di luar transaksi
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for ix in missing:
+                columns = ", ".join(c.name for c in ix.columns)
+                unique = "UNIQUE " if ix.unique else ""
+                conn.exec_driver_sql(
+                    f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {ix.name} ON {table.name} ({columns})"
+                )
+                print(f"[MIGRATION] Index {ix.name} dibuat")
+        return
+
+    with engine.begin() as conn:
+        for ix in missing:
+            ix.create(conn, checkfirst=True)
+            print(f"[MIGRATION] Index {ix.name} dibuat")
+
+
+def _report_duplicate_targets(engine, table) -> int:
+    """
+    Cek IMSI ganda sebelum unique index dibuat. Jika ada, catat IMSI dan id
+    target-nya lalu return jumlah IMSI ganda (index tidak dibuat).
+    """
+    duplicated = select(table.c.imsi).group_by(table.c.imsi).having(func.count(table.c.id) > 1)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(table.c.imsi, table.c.id).where(table.c.imsi.in_(duplicated)).order_by(table.c.imsi, table.c.id)
+        ).all()
+    if not rows:
+        return 0
+
+    ids = {}
+    for imsi, target_id in rows:
+        ids.setdefault(imsi, []).append(target_id)
+    details = [f"{imsi} (id {', '.join(map(str, target_ids))})" for imsi, target_ids in ids.items()]
+    shown = "; ".join(details[:DUPLICATE_REPORT_LIMIT])
+    if len(details) > DUPLICATE_REPORT_LIMIT:
+        shown += f"; ... {len(details) - DUPLICATE_REPORT_LIMIT} lainnya"
+    message = (
+        f"Unique index ix_target_imsi tidak dibuat: {len(ids)} IMSI target ganda, "
+        f"hapus / gabungkan manual lalu restart. {shown}"
+    )
+    print(f"[MIGRATION] {message}")
+    with engine.begin() as conn:
+        conn.execute(Logs.__table__.insert().values(description=message, type="warning", user="system"))
+    return len(ids)
+
+
+def _create_point_index(engine, table):
+    existing = {ix["name"] for ix in inspect(engine).get_indexes(table.name)}
+    if POINT_INDEX in existing:
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {POINT_INDEX} "
+            f"ON {table.name} USING gist (point(lon_deg, lat_deg))"
+        )
+    print(f"[MIGRATION] Index {POINT_INDEX} dibuat")
+
+
+def _backfill(session_factory, table, target: str, sources, compute, batch_size: int) -> int:
+    """
+    Isi kolom turunan untuk row lama yang target-nya masih NULL, per batch
+    (urut primary key). compute(*nilai_sumber) -> dict kolom atau None.
+    """
+    pk = table.primary_key.columns.values()[0]
+    source_cols = [table.c[name] for name in sources]
+    pending = table.c[target].is_(None)
+
+    last_pk = None
+    filled = 0
+    stmt = None
+    while True:
+        query = (
+            select(pk, *source_cols)
+            .where(pending, *(c.is_not(None) for c in source_cols))
+            .order_by(pk)
+            .limit(batch_size)
+        )
+        if last_pk is not None:
+            # Row dengan nilai sumber tidak valid tetap NULL, jangan dibaca ulang
+            query = query.where(pk > last_pk)
+
+        db = session_factory()
+        try:
+            rows = db.execute(query).all()
+            if not rows:
+                break
+            params = []
+            for row in rows:
+                values = compute(*row[1:])
+                if values:
+                    params.append({"_pk": row[0], **{f"_{k}": v for k, v in values.items()}})
+            if params:
+                if stmt is None:
+                    stmt = (
+                        update(table)
+                        .where(pk == bindparam("_pk"), pending)
+                        .values({k[1:]: bindparam(k) for k in params[0] if k != "_pk"})
+                    )
+                db.execute(stmt, params)
+                db.commit()
+        finally:
+            db.close()
+
+        last_pk = rows[-1][0]
+        filled += len(params)
+        time.sleep(BACKFILL_PAUSE)
+
+    if filled:
+        print(f"[MIGRATION] Backfill {table.name}.{target}: {filled} row")
+    return filled
+
+
+def _timestamp_values(value):
+    ts = parse_local(value)
+    return {"ts": ts} if ts is not None else None
+
+
+def _position_values(lat, long):
+    lat_deg, lon_deg = geohash_util.to_float(lat), geohash_util.to_float(long)
+    if lat_deg is None or lon_deg is None:
+        return None
+    return {"lat_deg": lat_deg, "lon_deg": lon_deg, "geohash": geohash_util.encode(lat_deg, lon_deg)}
+
+
+def backfill_timestamps(session_factory, batch_size: int = BACKFILL_BATCH) -> dict:
+    """Isi ts dari kolom string untuk row lama"""
+    totals = {}
+    for model, field in TIMESTAMP_COLUMNS:
+        table = model.__table__
+        totals[table.name] = _backfill(session_factory, table, "ts", (field,), _timestamp_values, batch_size)
+    return totals
+
+
+def backfill_positions(session_factory, batch_size: int = BACKFILL_BATCH) -> int:
+    """Isi lat_deg / lon_deg / geohash crawling dari kolom lat / long string"""
+    return _backfill(session_factory, Crawling.__table__, "geohash", ("lat", "long"), _position_values, batch_size)
+
+
+def backfill_sightings(session_factory, batch_size: int = BACKFILL_BATCH) -> int:
+    """Bangun imsi_sighting dari crawling (hanya jika tabel masih kosong)"""
+    db = session_factory()
+    try:
+        if db.query(ImsiSighting.imsi).first() is not None:
+            return 0
+        dialect = db.get_bind().dialect.name
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        # Row yang sudah dibuat ingest selama backfill berjalan dibiarkan
+        stmt = insert(ImsiSighting).on_conflict_do_nothing()
+
+        query = (
+            select(Crawling.imsi, Crawling.campaign_id, Crawling.ip, Crawling.count,
+                   Crawling.ts, Crawling.timestamp, Crawling.imei, Crawling.msisdn)
+            .order_by(Crawling.imsi)
+            .execution_options(yield_per=batch_size)
+        )
+        pending = []
+        current = None
+        written = 0
+        for imsi, campaign_id, ip, count, ts, timestamp, imei, msisdn in db.execute(query):
+            seen_at = as_local(ts) if ts is not None else parse_local(timestamp)
+            if current is None or current["imsi"] != imsi:
+                if current is not None:
+                    pending.append(current)
+                current = {
+                    "imsi": imsi, "first_seen": seen_at, "last_seen": seen_at, "total_count": 0,
+                    "campaign_ids": [], "last_campaign_id": campaign_id, "last_ip": ip,
+                    "last_imei": imei, "last_msisdn": msisdn,
+                }
+            current["total_count"] += count or 0
+            if campaign_id is not None and campaign_id not in current["campaign_ids"]:
+                current["campaign_ids"].append(campaign_id)
+            if seen_at is not None:
+                if current["first_seen"] is None or seen_at < current["first_seen"]:
+                    current["first_seen"] = seen_at
+                if current["last_seen"] is None or seen_at >= current["last_seen"]:
+                    current.update(last_seen=seen_at, last_campaign_id=campaign_id, last_ip=ip)
+                    current["last_imei"] = imei or current["last_imei"]
+                    current["last_msisdn"] = msisdn or current["last_msisdn"]
+            if len(pending) >= batch_size:
+                _insert_sightings(session_factory, stmt, pending)
+                written += len(pending)
+                pending = []
+        if current is not None:
+            pending.append(current)
+        if pending:
+            _insert_sightings(session_factory, stmt, pending)
+            written += len(pending)
+    finally:
+        db.close()
+
+    if written:
+        print(f"[MIGRATION] Backfill imsi_sighting: {written} IMSI")
+    return written
+
+
+def backfill_campaign_targets(session_factory) -> int:
+    """Pindahkan target_info / imsi campaign lama ke campaign_target"""
+    db = session_factory()
+    try:
+        pending = db.query(Campaign).filter(
+            ~select(CampaignTarget.campaign_id).where(CampaignTarget.campaign_id == Campaign.id).exists()
+        ).all()
+        dialect = db.get_bind().dialect.name
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(CampaignTarget).on_conflict_do_nothing()
+
+        written = 0
+        for campaign in pending:
+            rows = {}
+            for t in campaign.target_info or []:
+                if isinstance(t, dict) and t.get("imsi"):
+                    rows[t["imsi"]] = {
+                        "campaign_id": campaign.id, "imsi": t["imsi"], "name": t.get("name"),
+                        "alert_status": t.get("alert_status"), "target_status": t.get("target_status"),
+                        "in_snapshot": True, "active": False,
+                    }
+            for imsi in (campaign.imsi or "").split(","):
+                imsi = imsi.strip()
+                if not imsi:
+                    continue
+                row = rows.setdefault(imsi, {
+                    "campaign_id": campaign.id, "imsi": imsi, "name": None, "alert_status": None,
+                    "target_status": None, "in_snapshot": False, "active": False,
+                })
+                row["active"] = True
+            if rows:
+                db.execute(stmt, list(rows.values()))
+                db.commit()
+                written += len(rows)
+    finally:
+        db.close()
+
+    if written:
+        print(f"[MIGRATION] Backfill campaign_target: {written} row")
+    return written
+
+
+def _insert_sightings(session_factory, stmt, rows):
+    for row in rows:
+        row["campaign_ids"].sort()
+    db = session_factory()
+    try:
+        db.execute(stmt, rows)
+        db.commit()
+    finally:
+        db.close()
+    time.sleep(BACKFILL_PAUSE)
+
+
+def start_backfill(session_factory):
+    def _run():
+        jobs = (
+            ("ts", backfill_timestamps),
+            ("posisi", backfill_positions),
+            ("imsi_sighting", backfill_sightings),
+        )
+        for name, job in jobs:
+            try:
+                job(session_factory)
+            except Exception as e:
+                print(f"[MIGRATION] Backfill {name} gagal: {e}")
+
+    threading.Thread(target=_run, name="MigrationBackfill", daemon=True).start()
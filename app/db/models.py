@@ -1,15 +1,31 @@
 # app/db/models.py
-from sqlalchemy import Boolean, Column, Float, Integer, String, DateTime, ForeignKey, func, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Boolean, Column, Float, Integer, MetaData, String, DateTime, ForeignKey, Index, Table, func, JSON
+from sqlalchemy.orm import relationship, validates
+from app.utils import geohash as geohash_util
+from app.utils.timestamps import parse_local
 from .database import Base
 
 
+def _ts_column():
+    # Versi native dari kolom timestamp string, untuk query range ber-index
+    return Column(DateTime(timezone=True), nullable=True, index=True)
+
+
+def _ts_validator(field: str):
+    """Isi kolom ts setiap kali kolom timestamp string di-set lewat ORM"""
+    @validates(field)
+    def _sync_ts(self, key, value):
+        self.ts = parse_local(value)
+        return value
+    return _sync_ts
+
+
 class Target(Base):
     __tablename__ = "target"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    imsi = Column(String, nullable=False)
+    imsi = Column(String, nullable=False, unique=True, index=True)
     alert_status = Column(String, nullable=True)
     target_status = Column(String, nullable=True)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -37,6 +53,9 @@ class Heartbeat(Base):
     # 1 Nyala (lagi sniff) 
     # 0 (tidak ada modul sniff)
     timestamp = Column(String, nullable=False)
+    ts = _ts_column()
+
+    _sync_ts = _ts_validator("timestamp")
 
 class NmmCfg(Base):
     __tablename__ = "nmmcfg"
@@ -52,6 +71,9 @@ class NmmCfg(Base):
     rsrp = Column(String, nullable=True)
     band = Column(Integer, nullable=True)
     ch = Column(String, nullable=True)
+    ts = _ts_column()
+
+    _sync_ts = _ts_validator("time")
 
 class Operator(Base):
     __tablename__ = "operator"
@@ -99,13 +121,35 @@ class Campaign(Base):
     duration = Column(String, nullable=True)
     start_scan = Column(DateTime(timezone=True), nullable=True)
     stop_scan = Column(DateTime(timezone=True), nullable=True)
+    # Legacy: snapshot target sekarang di tabel campaign_target
     target_info = Column(JSON, nullable=True)
 
     crawlings = relationship("Crawling", back_populates="campaign")
 
 
+class CampaignTarget(Base):
+    """Snapshot target per campaign, lihat app/service/campaign_target_service.py"""
+    __tablename__ = "campaign_target"
+    __table_args__ = (
+        Index("ix_campaign_target_active", "campaign_id", "active"),
+    )
+
+    campaign_id = Column(Integer, ForeignKey("campaign.id", ondelete="CASCADE"), primary_key=True)
+    imsi = Column(String, primary_key=True, index=True)
+    name = Column(String, nullable=True)
+    alert_status = Column(String, nullable=True)
+    target_status = Column(String, nullable=True)
+    # True: IMSI ada di tabel target (snapshot, untuk alert_name / alert_status)
+    in_snapshot = Column(Boolean, nullable=False, default=False)
+    # True: IMSI termasuk daftar campaign (campaign.imsi) yang dikirim ke device
+    active = Column(Boolean, nullable=False, default=False)
+
+
 class Crawling(Base):
     __tablename__ = "crawling"
+    __table_args__ = (
+        Index("ix_crawling_campaign_ts", "campaign_id", "ts"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -130,6 +174,63 @@ class Crawling(Base):
     campaign_id = Column(Integer, ForeignKey("campaign.id"), nullable=True)
     campaign = relationship("Campaign", back_populates="crawlings")
 
+    ts = _ts_column()
+
+    # Versi numerik lat/long + geohash untuk area query (app/service/area_service.py)
+    lat_deg = Column(Float, nullable=True)
+    lon_deg = Column(Float, nullable=True)
+    geohash = Column(String(geohash_util.PRECISION), nullable=True, index=True)
+
+    _sync_ts = _ts_validator("timestamp")
+
+    @validates("lat", "long")
+    def _sync_position(self, key, value):
+        number = geohash_util.to_float(value)
+        if key == "lat":
+            self.lat_deg = number
+        else:
+            self.lon_deg = number
+        if self.lat_deg is not None and self.lon_deg is not None:
+            self.geohash = geohash_util.encode(self.lat_deg, self.lon_deg)
+        else:
+            self.geohash = None
+        return value
+
+class ImsiSighting(Base):
+    """Ringkasan kemunculan IMSI lintas campaign, lihat app/service/sighting_service.py"""
+    __tablename__ = "imsi_sighting"
+
+    imsi = Column(String, primary_key=True)
+    first_seen = Column(DateTime(timezone=True), nullable=True)
+    last_seen = Column(DateTime(timezone=True), nullable=True, index=True)
+    total_count = Column(Integer, nullable=False, default=0)
+    campaign_ids = Column(JSON, nullable=True)  # list id campaign, urut kemunculan
+    last_campaign_id = Column(Integer, nullable=True)
+    last_ip = Column(String, nullable=True)
+    last_imei = Column(String, nullable=True)
+    last_msisdn = Column(String, nullable=True)
+
+class SignalRollup(Base):
+    """Bucket RSRP / ulRssi per (campaign, imsi, ip), lihat app/service/rollup_service.py"""
+    __tablename__ = "signal_rollup"
+    __table_args__ = (
+        Index("ux_signal_rollup_bucket", "campaign_id", "imsi", "resolution", "bucket", "ip", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    campaign_id = Column(Integer, nullable=False)
+    imsi = Column(String, nullable=False)
+    ip = Column(String, nullable=False)
+    resolution = Column(Integer, nullable=False)  # detik: 1, 10, 60
+    bucket = Column(DateTime(timezone=True), nullable=False, index=True)
+    samples = Column(Integer, nullable=False)
+    rsrp_min = Column(Integer, nullable=True)
+    rsrp_max = Column(Integer, nullable=True)
+    rsrp_mean = Column(Float, nullable=True)
+    rssi_min = Column(Integer, nullable=True)
+    rssi_max = Column(Integer, nullable=True)
+    rssi_mean = Column(Float, nullable=True)
+
 class GPS(Base):
     __tablename__ = "gps"
 
@@ -137,6 +238,9 @@ class GPS(Base):
     latitude = Column(String, nullable=False)
     longitude = Column(String, nullable=False)
     timestamp = Column(String, nullable=False)
+    ts = _ts_column()
+
+    _sync_ts = _ts_validator("timestamp")
 
 class License(Base):
     __tablename__ = "license"
@@ -173,4 +277,54 @@ class Logs(Base):
     description = Column(String, nullable=False)
     type = Column(String, nullable=True) # info, error, warning, success
     user = Column(String, nullable=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
\ No newline at end of file
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# History observasi crawling (append-only, satu row per OneUeInfoIndi).
+# Tidak ikut Base.metadata / create_all: di Postgres dibuat sebagai tabel
+# partisi harian, di SQLite sebagai file segmen per hari
+# (lihat app/service/observation_service.py).
+def _observation_columns():
+    return [
+        Column("campaign_id", Integer, nullable=True),
+        Column("imsi", String, nullable=False),
+        Column("ip", String, nullable=False),
+        Column("ch", String, nullable=True),
+        Column("rsrp", Integer, nullable=True),
+        Column("ulRssi", Integer, nullable=True),
+        Column("ulCqi", Integer, nullable=True),
+        Column("taType", Integer, nullable=True),
+        Column("lat", Float, nullable=True),
+        Column("long", Float, nullable=True),
+    ]
+
+
+def _observation_indexes():
+    return [
+        Index("ix_crawling_observation_imsi_ts", "imsi", "ts"),
+        Index("ix_crawling_observation_campaign_ts", "campaign_id", "ts"),
+    ]
+
+
+observation_metadata = MetaData()
+crawling_observation = Table(
+    "crawling_observation",
+    observation_metadata,
+    # Primary key tabel partisi harus memuat kolom partisi
+    Column("id", BigInteger, primary_key=True, autoincrement=True),
+    Column("ts", DateTime(timezone=True), primary_key=True),
+    *_observation_columns(),
+    *_observation_indexes(),
+    postgresql_partition_by="RANGE (ts)",
+)
+
+# Skema file segmen SQLite (rowid implisit, tanpa primary key komposit)
+segment_metadata = MetaData()
+crawling_observation_segment = Table(
+    "crawling_observation",
+    segment_metadata,
+    Column("ts", DateTime(timezone=True), nullable=False),
+    *_observation_columns(),
+    *_observation_indexes(),
+)
+
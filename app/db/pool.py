@@ -0,0 +1,162 @@
+"""
+Konfigurasi dan metrik connection pool SQLAlchemy.
+
+Setiap engine punya pool bernama (api, api_async, ingest, background) supaya
+burst di satu jalur (mis. UDP ingest) tidak menghabiskan koneksi jalur lain.
+Ukuran pool dibaca dari env per nama pool, fallback ke setting global:
+    DB_<NAMA>_POOL_SIZE / DB_POOL_SIZE
+    DB_<NAMA>_MAX_OVERFLOW / DB_MAX_OVERFLOW
+    DB_<NAMA>_POOL_TIMEOUT / DB_POOL_TIMEOUT
+    DB_<NAMA>_POOL_RECYCLE / DB_POOL_RECYCLE
+Setting berlaku per proses (setiap worker uvicorn / shard ingest punya pool sendiri).
+"""
+import os
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+POOL_API = "api"
+POOL_API_ASYNC = "api_async"
+POOL_INGEST = "ingest"
+POOL_BACKGROUND = "background"
+
+POOL_DEFAULTS = {
+    POOL_API: {"POOL_SIZE": 10, "MAX_OVERFLOW": 10},
+    POOL_API_ASYNC: {"POOL_SIZE": 10, "MAX_OVERFLOW": 10},
+    POOL_INGEST: {"POOL_SIZE": 5, "MAX_OVERFLOW": 5},
+    POOL_BACKGROUND: {"POOL_SIZE": 3, "MAX_OVERFLOW": 2},
+}
+COMMON_DEFAULTS = {"POOL_TIMEOUT": 10, "POOL_RECYCLE": 1800}
+
+# Checkout lebih lama dari ini dicatat sebagai slow wait (dan dicetak, maks sekali per interval)
+POOL_WAIT_WARN = float(os.getenv("DB_POOL_WAIT_WARN", "0.5"))
+POOL_WARN_INTERVAL = 10.0
+
+
+def _setting(pool_name: str, key: str) -> int:
+    value = os.getenv(f"DB_{pool_name.upper()}_{key}") or os.getenv(f"DB_{key}")
+    if value is None:
+        value = POOL_DEFAULTS[pool_name].get(key, COMMON_DEFAULTS.get(key))
+    return int(value)
+
+
+def pool_kwargs(pool_name: str, is_async: bool = False) -> Dict:
+    """Argumen create_engine / create_async_engine untuk pool bernama"""
+    return {
+        "poolclass": MeteredAsyncQueuePool if is_async else MeteredQueuePool,
+        "pool_size": _setting(pool_name, "POOL_SIZE"),
+        "max_overflow": _setting(pool_name, "MAX_OVERFLOW"),
+        "pool_timeout": _setting(pool_name, "POOL_TIMEOUT"),
+        "pool_recycle": _setting(pool_name, "POOL_RECYCLE"),
+        # logging_name dipertahankan saat pool di-recreate (dispose), dipakai sebagai key metrik
+        "pool_logging_name": pool_name,
+    }
+
+
+class PoolMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.slow_waits = 0
+        self.timeouts = 0
+        self._last_warn = 0.0
+        self.pool = None
+
+    def record(self, wait: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+            if wait < POOL_WAIT_WARN:
+                return
+            self.slow_waits += 1
+            warn = time.monotonic() - self._last_warn >= POOL_WARN_INTERVAL
+            if warn:
+                self._last_warn = time.monotonic()
+        if warn:
+            print(f"[DB POOL] Pool '{self.name}' checkout menunggu {wait * 1000:.0f} ms ({self._usage()})")
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+        print(f"[DB POOL] Pool '{self.name}' timeout saat checkout ({self._usage()})")
+
+    def _usage(self) -> str:
+        pool = self.pool
+        if pool is None:
+            return "-"
+        return f"in use {pool.checkedout()}/{pool.size() + pool._max_overflow}"
+
+    def snapshot(self) -> Dict:
+        pool = self.pool
+        with self._lock:
+            data = {
+                "checkouts": self.checkouts,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 2),
+                "slow_waits": self.slow_waits,
+                "timeouts": self.timeouts,
+            }
+        if pool is not None:
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            data.update({
+                "pool_size": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "utilization": round(pool.checkedout() / capacity, 2) if capacity else None,
+            })
+        return data
+
+
+_metrics: Dict[str, PoolMetrics] = {}
+_metrics_lock = threading.Lock()
+
+
+def get_pool_metrics(name: str) -> PoolMetrics:
+    with _metrics_lock:
+        if name not in _metrics:
+            _metrics[name] = PoolMetrics(name)
+        return _metrics[name]
+
+
+def pool_metrics_snapshot() -> Dict[str, Dict]:
+    """Metrik semua pool di proses ini (untuk /health)"""
+    with _metrics_lock:
+        metrics = list(_metrics.values())
+    return {m.name: m.snapshot() for m in metrics}
+
+
+class _MeteredPoolMixin:
+    """Ukur lama menunggu koneksi dari pool (termasuk saat pool penuh)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics = get_pool_metrics(self._orig_logging_name or "default")
+        self._metrics.pool = self
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self._metrics.record_timeout()
+            raise
+        self._metrics.record(time.perf_counter() - started)
+        return conn
+
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
@@ -169,6 +169,11 @@ class CampaignListResponse(BaseModel):
     total: int
 
 
+class ImsiSightingLookup(BaseModel):
+    """Lookup ringkasan kemunculan banyak IMSI sekaligus"""
+    imsis: List[str] = Field(..., max_length=50000, description="Daftar IMSI (maks 50000)")
+
+
 # ==========================================
 # Target Models - Untuk endpoint target
 # ==========================================
@@ -18,6 +18,10 @@ from app.api.routes import distance, websocket, campaign, license, target, crawl
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DOCS_PATH = os.path.join(BASE_DIR, "docs", "docs.html")
 
+# Jumlah worker uvicorn. > 1 = UDP ingest di proses utama, HTTP/WS di worker
+# terpisah dengan event di-relay antar proses (app/ws/relay.py)
+APP_WORKERS = int(os.getenv("APP_WORKERS", "1"))
+
 app = FastAPI(
     title="IMSI CATCHER BACKEND",
     description="API untuk IMSI CATCHER BACKEND",
@@ -27,6 +31,13 @@ app = FastAPI(
 @app.on_event("startup")
 async def on_startup():
     runtime.main_loop = asyncio.get_running_loop()
+
+    from app.ws.relay import RELAY_ROLE_ENV, init_relay
+    if os.getenv(RELAY_ROLE_ENV) == runtime.ROLE_API:
+        # Worker API: timer, MSISDN checker dan heartbeat watcher berjalan di proses ingest
+        runtime.process_role = runtime.ROLE_API
+        await init_relay(runtime.ROLE_API).start()
+        return
     
     from app.service.timer_service import get_timer_ops_instance
     from app.db.database import SessionLocal
@@ -73,7 +84,16 @@ class MyApp:
         super().__init__()
 
     def init_db(self):
+        from app.db.database import BackgroundSessionLocal
+        from app.db.migrations import backfill_campaign_targets, run_migrations, start_backfill
+        from app.service.observation_service import observation_store
+
         models.Base.metadata.create_all(bind=engine)        
+        run_migrations(engine)
+        backfill_campaign_targets(BackgroundSessionLocal)
+        start_backfill(BackgroundSessionLocal)
+        # Tabel partisi / folder segmen history observasi + retensi
+        observation_store.run_maintenance()
         db = SessionLocal()
         try:
             seed_all(db)
@@ -84,6 +104,10 @@ class MyApp:
         uvicorn.run(app, host="0.0.0.0", port=8888)
 
     def start_app(self):
+        if APP_WORKERS > 1:
+            self.start_multi_worker()
+            return
+
         self.init_db()
 
         api_thread = threading.Thread(target=self.start_fastapi_server, daemon=True)
@@ -101,3 +125,61 @@ class MyApp:
 
         client_udp()
         print("Server UDP sudah berjalan.........")
+
+    async def start_ingest_tasks(self):
+        """Background task yang hanya boleh berjalan sekali (di proses ingest)"""
+        from app.ws.events import event_bus
+        from app.ws.heartbeat_coalescer import heartbeat_coalescer
+        from app.ws.relay import init_relay
+        from app.controller import send_data
+        from app.controller.bbu_request import bbu_requests
+        from app.service.heartbeat_service import heartbeat_watcher, remember_sniff_state
+        from app.service.target_service import target_cache
+        from app.service.timer_service import get_timer_ops_instance
+        from app.service.msisdn_service import start_background_msisdn_checker
+
+        timer_ops = get_timer_ops_instance()
+        relay = init_relay(runtime.ROLE_INGEST)
+        relay.register_control("command", lambda message, address: send_data(message, tuple(address)))
+        relay.register_control("timer_start", timer_ops.start_timer)
+        relay.register_control("timer_stop", timer_ops.stop_timer)
+        relay.register_control("target_cache_invalidate", target_cache.invalidate)
+        relay.register_control("sniff_state", remember_sniff_state)
+        relay.register_control("bbu_expect", bbu_requests.expect)
+        relay.register_control("heartbeat_snapshot", lambda: event_bus.send_heartbeat(heartbeat_coalescer.snapshot_frame()))
+        await relay.start()
+        event_bus.forwarder = relay.publish
+
+        db = SessionLocal()
+        try:
+            timer_ops.recover_active_campaigns(db)
+        except Exception as e:
+            print(f"Error recovering campaigns: {e}")
+        finally:
+            db.close()
+
+        try:
+            start_background_msisdn_checker(interval_seconds=5)
+        except Exception as e:
+            print(f"Error starting background MSISDN checker: {e}")
+
+        asyncio.create_task(heartbeat_watcher())
+
+    def start_multi_worker(self):
+        from app.ws.relay import RELAY_ROLE_ENV
+
+        self.init_db()
+        runtime.process_role = runtime.ROLE_INGEST
+
+        # Event loop proses ingest (schedule_async_task, timer, relay)
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name="IngestLoop", daemon=True).start()
+        runtime.main_loop = loop
+        asyncio.run_coroutine_threadsafe(self.start_ingest_tasks(), loop).result()
+
+        client_udp()
+        print(f"Server UDP sudah berjalan (ingest), API dengan {APP_WORKERS} worker.........")
+
+        # Worker uvicorn di-spawn dengan environment ini
+        os.environ[RELAY_ROLE_ENV] = runtime.ROLE_API
+        uvicorn.run("app.main:app", host="0.0.0.0", port=8888, workers=APP_WORKERS)
@@ -0,0 +1,129 @@
+"""
+Area query crawling: IMSI yang terlihat di dalam radius / bounding box.
+
+Prefilter memakai index spasial:
+- Postgres: index GiST point(lon_deg, lat_deg) dengan operator <@ box.
+- SQLite: beberapa range scan prefix geohash (index b-tree).
+Lalu difilter bbox lat_deg / lon_deg dan jarak equirectangular (cukup akurat
+untuk radius puluhan km), diagregasi per (imsi, campaign) di database.
+"""
+import math
+import time
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.config.utils import AREA_DEFAULT_LIMIT, AREA_MAX_CELLS, AREA_MAX_RADIUS
+from app.db.models import Crawling
+from app.utils import geohash as geohash_util
+from app.utils.timestamps import TIME_FORMAT, as_local
+
+M_PER_DEG_LAT = 110540.0
+M_PER_DEG_LON = 111320.0
+
+
+def _spatial_prefilter(db: Session, min_lat, min_lon, max_lat, max_lon):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.point(Crawling.lon_deg, Crawling.lat_deg).op("<@")(
+            func.box(func.point(min_lon, min_lat), func.point(max_lon, max_lat))
+        )
+    cells = geohash_util.cover_bbox(min_lat, min_lon, max_lat, max_lon, AREA_MAX_CELLS)
+    return or_(*(
+        and_(Crawling.geohash >= cell, Crawling.geohash < cell + geohash_util.PREFIX_END)
+        for cell in cells
+    ))
+
+
+def query_area(
+        db: Session,
+        lat: float = None,
+        lon: float = None,
+        radius_m: float = None,
+        bbox: Optional[Sequence[float]] = None,
+        campaign_id: int = None,
+        limit: int = AREA_DEFAULT_LIMIT
+    ) -> Dict:
+    """
+    IMSI di dalam lingkaran (lat, lon, radius_m) atau bbox
+    (min_lat, min_lon, max_lat, max_lon), urut jumlah laporan terbanyak.
+    """
+    started = time.perf_counter()
+    if radius_m is not None:
+        if lat is None or lon is None:
+            return {"status": "error", "message": "lat dan lon wajib diisi untuk query radius", "data": None}
+        if not 0 < radius_m <= AREA_MAX_RADIUS:
+            return {"status": "error", "message": f"radius_m harus 0 - {AREA_MAX_RADIUS} meter", "data": None}
+        min_lat, min_lon, max_lat, max_lon = geohash_util.bbox_around(lat, lon, radius_m)
+    elif bbox is not None and len(bbox) == 4:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        if min_lat > max_lat or min_lon > max_lon:
+            return {"status": "error", "message": "bbox harus min_lat,min_lon,max_lat,max_lon", "data": None}
+    else:
+        return {"status": "error", "message": "Isi lat, lon, radius_m atau bbox", "data": None}
+
+    filters = [
+        _spatial_prefilter(db, min_lat, min_lon, max_lat, max_lon),
+        Crawling.lat_deg.between(min_lat, max_lat),
+        Crawling.lon_deg.between(min_lon, max_lon),
+    ]
+    distance_sq = None
+    if radius_m is not None:
+        dx = (Crawling.lon_deg - lon) * (M_PER_DEG_LON * math.cos(math.radians(lat)))
+        dy = (Crawling.lat_deg - lat) * M_PER_DEG_LAT
+        distance_sq = dx * dx + dy * dy
+        filters.append(distance_sq <= radius_m * radius_m)
+    if campaign_id is not None:
+        filters.append(Crawling.campaign_id == campaign_id)
+
+    columns = [
+        Crawling.imsi,
+        Crawling.campaign_id,
+        func.count(Crawling.id),
+        func.sum(func.coalesce(Crawling.count, 1)),
+        func.max(Crawling.ts),
+    ]
+    if distance_sq is not None:
+        columns.append(func.min(distance_sq))
+    rows = db.query(*columns).filter(*filters).group_by(Crawling.imsi, Crawling.campaign_id).all()
+
+    by_imsi: Dict[str, Dict] = {}
+    for row in rows:
+        imsi, row_campaign, records, count, last_ts = row[:5]
+        item = by_imsi.setdefault(imsi, {
+            "imsi": imsi, "count": 0, "records": 0, "campaign_ids": [], "last_seen": None, "distance_m": None
+        })
+        item["count"] += int(count or 0)
+        item["records"] += records
+        if row_campaign is not None:
+            item["campaign_ids"].append(row_campaign)
+        if last_ts is not None:
+            last_ts = as_local(last_ts)
+            if item["last_seen"] is None or last_ts > item["last_seen"]:
+                item["last_seen"] = last_ts
+        if distance_sq is not None and row[5] is not None:
+            distance = math.sqrt(row[5])
+            if item["distance_m"] is None or distance < item["distance_m"]:
+                item["distance_m"] = distance
+
+    items = sorted(by_imsi.values(), key=lambda i: i["count"], reverse=True)
+    total = len(items)
+    for item in items[:limit]:
+        item["campaign_ids"].sort()
+        item["last_seen"] = item["last_seen"].strftime(TIME_FORMAT) if item["last_seen"] else None
+        if item["distance_m"] is not None:
+            item["distance_m"] = round(item["distance_m"], 1)
+        else:
+            del item["distance_m"]
+
+    return {
+        "status": "success",
+        "message": "Area query berhasil",
+        "data": {
+            "bbox": [min_lat, min_lon, max_lat, max_lon],
+            "radius_m": radius_m,
+            "total_imsi": total,
+            "imsis": items[:limit],
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+    }
@@ -1,9 +1,11 @@
 from typing import Dict, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import SessionLocal
 from app.db.models import Crawling, Campaign
 from app.service.crawling_service import start_crawling
+from app.service.campaign_target_service import crawlings_with_targets, snapshot_campaign_targets
 from app.service.wb_status_service import update_wb_status
 from app.utils.logger import setup_logger
 from app.service.log_service import add_log
@@ -49,24 +51,12 @@ def list_campaigns(db: Session, mode: Optional[str] = None) -> Dict:
         "total": len(result)
     }
 
-async def create_campaign(db: Session, name: str, imsi: str, provider: str, mode: str, duration: str = None) -> Dict:
+async def create_campaign(db: AsyncSession, name: str, imsi: str, provider: str, mode: str, duration: str = None) -> Dict:
     from datetime import datetime
     from app.db.schemas import CommandRequest
     
     db_imsi = imsi.strip().replace(' ', ',') if imsi else ""
     
-    # Fetch all targets for initial target_info (Revision: user wants all targets)
-    from app.db.models import Target
-    all_targets = db.query(Target).all()
-    target_info_list = []
-    for target in all_targets:
-        target_info_list.append({
-            "name": target.name,
-            "imsi": target.imsi,
-            "alert_status": target.alert_status,
-            "target_status": target.target_status
-        })
-    
     campaign = Campaign(
         name=name,
         imsi=db_imsi,
@@ -74,14 +64,16 @@ async def create_campaign(db: Session, name: str, imsi: str, provider: str, mode
         mode=mode,
         duration=duration,
         status="started",
-        start_scan=datetime.now(),
-        target_info=target_info_list
+        start_scan=datetime.now()
     )
     
     try:
         db.add(campaign)
-        db.commit()
-        db.refresh(campaign)
+        await db.flush()
+        # Snapshot semua target (Revision: user wants all targets) ke campaign_target
+        await db.run_sync(snapshot_campaign_targets, campaign.id, db_imsi.split(','))
+        await db.commit()
+        await db.refresh(campaign)
         
         crawling_request = CommandRequest(
             mode=mode,
@@ -91,7 +83,7 @@ async def create_campaign(db: Session, name: str, imsi: str, provider: str, mode
             ip=None
         )
         await start_crawling(req=crawling_request, db=db)
-        add_log(db, f"Campaign '{name}' started", "info", "User")
+        await db.run_sync(add_log, f"Campaign '{name}' started", "info", "User")
         return {
             "status": "success",
             "message": "Campaign created and crawling started successfully",
@@ -109,7 +101,7 @@ async def create_campaign(db: Session, name: str, imsi: str, provider: str, mode
             },
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {
             "status": "error",
             "message": f"Failed to create campaign: {str(e)}",
@@ -127,19 +119,8 @@ def get_campaign_detail(db: Session, campaign_id: int) -> Dict:
             "data": None
         }
     
-    crawlings = db.query(Crawling).filter(
-        Crawling.campaign_id == campaign_id
-    ).all()
-    
-    # Build a lookup dict for target_info by IMSI
-    target_info_map = {}
-    if campaign.target_info:
-        for target in campaign.target_info:
-            if isinstance(target, dict) and 'imsi' in target:
-                target_info_map[target['imsi']] = target
-    
     crawling_data = []
-    for c in crawlings:
+    for c, alert_name, alert_status in crawlings_with_targets(db, campaign_id):
         crawling_item = {
             "id": c.id,
             "timestamp": c.timestamp,
@@ -154,11 +135,10 @@ def get_campaign_detail(db: Session, campaign_id: int) -> Dict:
             "count": c.count if c.count is not None else 0,
         }
         
-        # Add alert_status and alert_name if IMSI exists in target_info
-        if c.imsi in target_info_map:
-            target = target_info_map[c.imsi]
-            crawling_item["alert_status"] = target.get("alert_status")
-            crawling_item["alert_name"] = target.get("name")
+        # Add alert_status and alert_name if IMSI exists in campaign target snapshot
+        if alert_name is not None:
+            crawling_item["alert_status"] = alert_status
+            crawling_item["alert_name"] = alert_name
         
         crawling_data.append(crawling_item)
     
@@ -184,13 +164,13 @@ def get_latest_campaign_id(db: Session) -> int:
     campaign = db.query(Campaign).order_by(Campaign.id.desc()).first()
     return campaign.id if campaign else None
 
-async def stop_campaign(db: Session, campaign_id: int) -> Dict:
+async def stop_campaign(db: AsyncSession, campaign_id: int) -> Dict:
     from app.service.timer_service import get_timer_ops_instance
     from app.service.utils_service import get_all_ips_db
     from app.service.command_service import handle_stop_cell
     from datetime import datetime
     
-    campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+    campaign = await db.get(Campaign, campaign_id)
     if not campaign:
         logger.error(f"[StopCampaign] Campaign {campaign_id} not found")
         return {
@@ -201,20 +181,20 @@ async def stop_campaign(db: Session, campaign_id: int) -> Dict:
     try:
         campaign.status = 'completed'
         campaign.stop_scan = datetime.now()
-        db.commit()
+        await db.commit()
         logger.info(f"[StopCampaign] Campaign {campaign_id} marked as completed")
         
         timer_ops = get_timer_ops_instance()
         timer_ops.stop_timer(campaign_id)
         logger.info(f"[StopCampaign] Timer stopped for campaign {campaign_id}")
         
-        all_ips = get_all_ips_db(db)
+        all_ips = await db.run_sync(get_all_ips_db)
         logger.info(f"[StopCampaign] Stopping cells for IPs: {all_ips}")
         
         await handle_stop_cell(all_ips)
-        update_wb_status(db, False)
+        await db.run_sync(update_wb_status, False)
         
-        add_log(db, f"Campaign '{campaign.name}' stopped", "info", "User")
+        await db.run_sync(add_log, f"Campaign '{campaign.name}' stopped", "info", "User")
         return {
             "status": "success",
             "message": f"Campaign {campaign_id} stopped successfully",
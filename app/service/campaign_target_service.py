@@ -0,0 +1,154 @@
+"""
+Snapshot target per campaign (tabel campaign_target), pengganti JSON
+Campaign.target_info dan split Campaign.imsi.
+
+- create_campaign: snapshot semua target + tandai IMSI campaign (active).
+- Perubahan target (create / update / delete / import): hanya row IMSI yang
+  berubah di campaign yang sedang berjalan.
+- StartCell dengan IMSI baru: set_active_imsis.
+Campaign.imsi tetap diisi (string untuk API), dibangun dari row active.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.db.models import Campaign, CampaignTarget, Crawling, Target
+
+CHUNK = 5000  # IMSI per query IN / bulk insert
+
+
+def _upsert(db: Session, set_columns: Iterable[str]):
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(CampaignTarget)
+    return stmt.on_conflict_do_update(
+        index_elements=[CampaignTarget.campaign_id, CampaignTarget.imsi],
+        set_={name: stmt.excluded[name] for name in set_columns}
+    )
+
+
+def _chunks(items: List, size: int = CHUNK):
+    for offset in range(0, len(items), size):
+        yield items[offset:offset + size]
+
+
+def snapshot_campaign_targets(db: Session, campaign_id: int, active_imsis: Iterable[str]) -> int:
+    """Isi campaign_target untuk campaign baru: semua target + IMSI campaign (tanpa commit)"""
+    active = set(active_imsis)
+    rows = []
+    seen = set()
+    for imsi, name, alert_status, target_status in db.query(
+            Target.imsi, Target.name, Target.alert_status, Target.target_status).order_by(Target.id):
+        if imsi in seen:
+            # IMSI ganda (unique index belum bisa dibuat), pakai target paling lama
+            continue
+        seen.add(imsi)
+        rows.append({
+            "campaign_id": campaign_id,
+            "imsi": imsi,
+            "name": name,
+            "alert_status": alert_status,
+            "target_status": target_status,
+            "in_snapshot": True,
+            "active": imsi in active
+        })
+        active.discard(imsi)
+    # IMSI campaign yang bukan target
+    rows.extend({
+        "campaign_id": campaign_id, "imsi": imsi, "name": None, "alert_status": None,
+        "target_status": None, "in_snapshot": False, "active": True
+    } for imsi in sorted(active))
+
+    for chunk in _chunks(rows):
+        db.execute(_upsert(db, ("name", "alert_status", "target_status", "in_snapshot", "active")), chunk)
+    return len(rows)
+
+
+def get_active_imsis(db: Session, campaign_id: int) -> List[str]:
+    return list(db.scalars(
+        select(CampaignTarget.imsi)
+        .where(CampaignTarget.campaign_id == campaign_id, CampaignTarget.active.is_(True))
+        .order_by(CampaignTarget.imsi)
+    ))
+
+
+def set_active_imsis(db: Session, campaign: Campaign, imsis: Iterable[str]) -> List[str]:
+    """Ganti daftar IMSI campaign, hanya row yang berubah yang ditulis (tanpa commit)"""
+    imsis = list(imsis)
+    wanted = set(i for i in imsis if i)
+    current = set(get_active_imsis(db, campaign.id))
+
+    dropped = list(current - wanted)
+    for chunk in _chunks(dropped):
+        db.execute(
+            update(CampaignTarget)
+            .where(CampaignTarget.campaign_id == campaign.id, CampaignTarget.imsi.in_(chunk))
+            .values(active=False)
+        )
+    added = sorted(wanted - current)
+    for chunk in _chunks(added):
+        db.execute(_upsert(db, ("active",)), [
+            {"campaign_id": campaign.id, "imsi": imsi, "in_snapshot": False, "active": True} for imsi in chunk
+        ])
+
+    # Urutan dari pemanggil dipertahankan untuk Campaign.imsi
+    active = list(dict.fromkeys(i for i in imsis if i))
+    campaign.imsi = ",".join(active)
+    return active
+
+
+def get_running_campaign_ids(db: Session) -> List[int]:
+    return list(db.scalars(select(Campaign.id).where(Campaign.status == "started")))
+
+
+def apply_target_changes(
+        db: Session,
+        changed: Iterable[Dict] = (),
+        removed: Iterable[str] = (),
+        campaign_ids: Optional[List[int]] = None
+    ):
+    """
+    Terapkan target yang ditambah / diubah (dict name, imsi, alert_status,
+    target_status) dan IMSI yang dihapus ke snapshot campaign yang sedang
+    berjalan (tanpa commit). Flag active tidak diubah.
+    """
+    changed = list(changed)
+    removed = [imsi for imsi in removed if imsi]
+    if campaign_ids is None:
+        campaign_ids = get_running_campaign_ids(db)
+    if not campaign_ids or not (changed or removed):
+        return
+
+    for campaign_id in campaign_ids:
+        for chunk in _chunks(changed):
+            db.execute(_upsert(db, ("name", "alert_status", "target_status", "in_snapshot")), [{
+                "campaign_id": campaign_id,
+                "imsi": t["imsi"],
+                "name": t.get("name"),
+                "alert_status": t.get("alert_status"),
+                "target_status": t.get("target_status"),
+                "in_snapshot": True,
+                "active": False
+            } for t in chunk])
+
+    for chunk in _chunks(removed):
+        scope = and_(CampaignTarget.campaign_id.in_(campaign_ids), CampaignTarget.imsi.in_(chunk))
+        db.execute(CampaignTarget.__table__.delete().where(scope, CampaignTarget.active.is_(False)))
+        db.execute(
+            update(CampaignTarget).where(scope).values(
+                name=None, alert_status=None, target_status=None, in_snapshot=False
+            )
+        )
+
+
+def crawlings_with_targets(db: Session, campaign_id: int) -> List[Tuple[Crawling, Optional[str], Optional[str]]]:
+    """(crawling, alert_name, alert_status) campaign, join index (campaign_id, imsi)"""
+    return db.query(Crawling, CampaignTarget.name, CampaignTarget.alert_status).outerjoin(
+        CampaignTarget,
+        and_(
+            CampaignTarget.campaign_id == Crawling.campaign_id,
+            CampaignTarget.imsi == Crawling.imsi,
+            CampaignTarget.in_snapshot.is_(True)
+        )
+    ).filter(Crawling.campaign_id == campaign_id).all()
@@ -1,19 +1,19 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 import time
 import xml.etree.ElementTree as ET
-import os
 import asyncio
 
-from app.config.utils import SetAppCfgExt, SetCellPara, StartCell, StopCell
+from app.config.utils import GetAppCfgExtRsp, GetCellParaRsp, SetAppCfgExt, SetCellPara, StartCell, StopCell, XML_RESPONSE_TIMEOUT
+from app.controller.bbu_request import bbu_requests
 from app.db.schemas import CommandResponse, CommandResult
-from app.service.heartbeat_service import update_heartbeat
 from app.service.utils_service import XML_TYPE_MAP, build_xml_path, get_send_command_instance
 from app.utils.logger import setup_logger
 
 logger = setup_logger("COMMAND_HANDLE")
 
-async def handle_start_cell(ip_list: list, db: Session = None, mode: str = None, duration: str = None, imsi: str = None, is_resume: bool = False, current_elapsed: float = 0) -> CommandResponse:
+async def handle_start_cell(ip_list: list, db: AsyncSession = None, mode: str = None, duration: str = None, imsi: str = None, is_resume: bool = False, current_elapsed: float = 0) -> CommandResponse:
     """Handler untuk StartCell command"""
     results = []
     for ip in ip_list:
@@ -41,19 +41,20 @@ async def handle_start_cell(ip_list: list, db: Session = None, mode: str = None,
         from app.db.models import Campaign
         from app.service.timer_service import get_timer_ops_instance
         
-        active_campaign = db.query(Campaign).filter(
-            Campaign.status == 'started'
-        ).order_by(Campaign.id.desc()).first()
+        active_campaign = (await db.execute(
+            select(Campaign).filter(Campaign.status == 'started').order_by(Campaign.id.desc()).limit(1)
+        )).scalars().first()
         
         if active_campaign:
             if not is_resume:
                 active_campaign.start_scan = datetime.now()
             
             if imsi:
+                from app.service.campaign_target_service import set_active_imsis
                 db_imsi = imsi.strip().replace(' ', ',')
-                active_campaign.imsi = db_imsi
+                await db.run_sync(set_active_imsis, active_campaign, db_imsi.split(','))
             
-            db.commit()
+            await db.commit()
             logger.info(f"[StartCell] Updated campaign {active_campaign.id}. Resume: {is_resume}")
             
             if duration:
@@ -190,47 +191,38 @@ async def handle_set_whitelist(ip_list: list, imsi: str) -> CommandResponse:
         details=results
     )
 
-async def handle_get_cellpara(ip_list: list, db: Session) -> CommandResponse:
+async def handle_get_cellpara(ip_list: list, db: AsyncSession = None) -> CommandResponse:
+    """
+    Kirim GetCellPara ke semua IP sekaligus dan tunggu GetCellParaRsp masing-masing.
+    Heartbeat (mcc/mnc/arfcn) di-update oleh receiver saat response diterima.
+    """
+    return await _handle_get_xml(ip_list, "cell_para", GetCellParaRsp)
+
+
+async def handle_get_appcfgext(ip_list: list, db: AsyncSession = None) -> CommandResponse:
+    return await _handle_get_xml(ip_list, "app_cfg_ext", GetAppCfgExtRsp)
+
+
+async def _handle_get_xml(ip_list: list, xml_type: str, expect: str) -> CommandResponse:
+    responses = await bbu_requests.request_all(ip_list, XML_TYPE_MAP[xml_type]["get"], expect, XML_RESPONSE_TIMEOUT)
+
     results = []
-    for ip in ip_list:
-        try:
-            get_send_command_instance().command(ip, XML_TYPE_MAP["cell_para"]["get"])
-            file_path = build_xml_path("cell_para", ip)
-            exists = os.path.exists(file_path)
-            update_heartbeat(db, ip, file_path) if exists else None
-            msg = "File XML telah dibuat berdasarkan IP" if exists else "Perintah dikirim, menunggu file XML"
-            results.append(CommandResult(
-                ip=ip,
-                status="success",
-                file_exists=exists,
-                file_path=file_path,
-                message=msg
-            ))
-        except Exception as e:
-            results.append(CommandResult(ip=ip, status="error", error=str(e)))
-    
+    for ip, entry in responses.items():
+        if isinstance(entry, Exception):
+            results.append(CommandResult(ip=ip, status="error", error=str(entry)))
+            continue
+        received = entry is not None
+        msg = "Config XML diterima dari device" if received else "Perintah dikirim, response XML belum diterima"
+        results.append(CommandResult(
+            ip=ip,
+            status="success",
+            file_exists=received,
+            file_path=build_xml_path(xml_type, ip),
+            message=msg
+        ))
+
     return CommandResponse(
         status="success",
         last_checked=time.strftime("%Y-%m-%d %H:%M:%S"),
         details=results
     )
-    
-def handle_get_appcfgext(ip_list: list, db: Session):
-    try:
-        results = []
-        for ip in ip_list:
-            try:
-                get_send_command_instance().command(ip, XML_TYPE_MAP["app_cfg_ext"]["get"])
-                file_path = build_xml_path("app_cfg_ext", ip)
-                exists = os.path.exists(file_path)
-                msg = "File XML telah dibuat berdasarkan IP" if exists else "Perintah dikirim, menunggu file XML"
-                results.append({"ip": ip, "status": "success", "file_exists": exists, "file_path": file_path, "message": msg})
-            except Exception as e:
-                results.append({"ip": ip, "status": "error", "error": str(e)})
-
-        return {"status": "success", "last_checked": time.strftime("%Y-%m-%d %H:%M:%S"), "details": results}
-    except Exception as e:
-        results.append(CommandResult(ip=ip, status="error", error=str(e)))
-    except Exception as e:
-        return {"status": "error", "last_checked": time.strftime("%Y-%m-%d %H:%M:%S"), "details": [{"error": str(e)}]}
-
@@ -1,13 +1,15 @@
+from datetime import datetime
+from typing import List
 from sqlalchemy.orm import Session
 from app.db.models import Crawling
 from app.service.gps_service import get_gps_data
-from fastapi import HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 import time
 import re
-from app.db.database import get_db
 from app.db.schemas import CommandRequest, CommandResponse, CommandResult
 from app.service.utils_service import get_all_ips_db
+from app.utils.timestamps import as_local
 from app.service.mode_service import (
     execute_whitelist_mode,
     execute_blacklist_mode,
@@ -17,7 +19,7 @@ from app.service.mode_service import (
 
 async def start_crawling(
     req: CommandRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession
 ):
     try:
         valid_modes = ['whitelist', 'blacklist', 'all', 'df']
@@ -31,13 +33,13 @@ async def start_crawling(
             if not re.fullmatch(r"(\d{1,3}\.){3}\d{1,3}", req.ip):
                 raise HTTPException(status_code=400, detail="Format IP tidak valid.")
             
-            all_ips = get_all_ips_db(db)
+            all_ips = await db.run_sync(get_all_ips_db)
             if req.ip not in all_ips:
                 raise HTTPException(status_code=404, detail=f"IP {req.ip} tidak ditemukan.")
             
             ip_list = [req.ip]
         else:
-            ip_list = get_all_ips_db(db)
+            ip_list = await db.run_sync(get_all_ips_db)
             
             if not ip_list:
                 raise HTTPException(status_code=404, detail="Tidak ada device aktif yang ditemukan.")
@@ -125,3 +127,26 @@ def upsert_crawling(
     
     return row
 
+
+def get_crawlings_between(
+        db: Session,
+        start: datetime,
+        end: datetime,
+        campaign_id: int = None,
+        ip: str = None,
+        limit: int = None
+    ) -> List[Crawling]:
+    """
+    Crawling dengan ts di [start, end), urut waktu. Memakai index
+    (campaign_id, ts) jika campaign_id diisi, index ts jika tidak.
+    Datetime naive dianggap waktu lokal server.
+    """
+    query = db.query(Crawling).filter(Crawling.ts >= as_local(start), Crawling.ts < as_local(end))
+    if campaign_id is not None:
+        query = query.filter(Crawling.campaign_id == campaign_id)
+    if ip is not None:
+        query = query.filter(Crawling.ip == ip)
+    query = query.order_by(Crawling.ts)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
@@ -82,21 +82,29 @@ def _to_dict(row: DistanceRadius) -> Dict:
         "updated_at": row.updated_at.isoformat() if row.updated_at else None,
     }
 
-def _apply_radius_to_xml(root: ET.Element, device_mode: str, radius: RadiusRxTx) -> None:
-    tech_key = None
+def tech_for_mode(device_mode: str) -> Optional[str]:
+    """Mode device (FDD-LTE, WCDMA, GSM-WB, ...) -> key teknologi rx/tx (lte, wcdma, gsm)"""
+    if not device_mode:
+        return None
     for key, mode_str in _TECH_TO_MODE.items():
         if device_mode.upper() in (mode_str.upper(), key.upper()):
-            tech_key = key
-            break
-    if tech_key is None:
-        dm = device_mode.upper()
-        if "LTE" in dm:
-            tech_key = "lte"
-        elif "WCDMA" in dm:
-            tech_key = "wcdma"
-        elif "GSM" in dm:
-            tech_key = "gsm"
+            return key
+    dm = device_mode.upper()
+    if "LTE" in dm:
+        return "lte"
+    elif "WCDMA" in dm:
+        return "wcdma"
+    elif "GSM" in dm:
+        return "gsm"
+    return None
+
 
+def default_rx_gain(tech_key: str) -> Optional[int]:
+    return _DEFAULTS.get(f"rx_{tech_key}")
+
+
+def _apply_radius_to_xml(root: ET.Element, device_mode: str, radius: RadiusRxTx) -> None:
+    tech_key = tech_for_mode(device_mode)
     if tech_key is None:
         return
 
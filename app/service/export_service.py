@@ -19,6 +19,7 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 
 from app.service.log_service import add_log
+from app.service.campaign_target_service import crawlings_with_targets
 
 
 def get_campaign_with_crawling(db: Session, campaign_id: int) -> Dict:
@@ -28,14 +29,14 @@ def get_campaign_with_crawling(db: Session, campaign_id: int) -> Dict:
     if not campaign:
         return {"status": "error", "message": "Campaign not found"}
     
-    crawlings = db.query(Crawling).filter(
-        Crawling.campaign_id == campaign_id
-    ).all()
+    rows = crawlings_with_targets(db, campaign_id)
     
     return {
         "status": "success",
         "campaign": campaign,
-        "crawlings": crawlings
+        "crawlings": [row[0] for row in rows],
+        # (alert_name, alert_status) per crawling dari campaign_target
+        "alerts": [(row[1], row[2]) for row in rows]
     }
 
 
@@ -49,12 +50,7 @@ def generate_pdf(db: Session, campaign_id: int) -> bytes:
     add_log(db, f"Exported campaign {data['campaign'].name} data as PDF", "info", "User")
     campaign = data["campaign"]
     crawlings = data["crawlings"]
-    
-    target_map = {}
-    if campaign.target_info:
-        for t in campaign.target_info:
-            if isinstance(t, dict) and 'imsi' in t:
-                target_map[t['imsi']] = t
+    alerts = data["alerts"]
     
     imsi_detected = len(crawlings)
     alert_count = 0
@@ -70,9 +66,9 @@ def generate_pdf(db: Session, campaign_id: int) -> bytes:
         else:
             timestamp_str = "-"
             
-        tgt = target_map.get(crawl.imsi)
-        alert_status = tgt.get('alert_status') if tgt and tgt.get('alert_status') else "-"
-        alert_name = tgt.get('name') if tgt and tgt.get('name') else "-"
+        tgt_name, tgt_status = alerts[idx - 1]
+        alert_status = tgt_status or "-"
+        alert_name = tgt_name or "-"
         
         if alert_status != "-":
             alert_count += 1
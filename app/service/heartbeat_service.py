@@ -1,10 +1,15 @@
 import asyncio
+import threading
 from datetime import datetime, timedelta
+from typing import Dict, Tuple
 from sqlalchemy.orm import Session
-from app.db.database import SessionLocal
+from app.db.database import BackgroundSessionLocal
 from app.db.models import  Heartbeat
-from app.service.utils_service import get_provider_by_mcc_mnc, get_provider_data, get_frequency_by_arfcn, parse_xml, provider_mapping
-from app.ws.events import event_bus
+from app.service.utils_service import get_provider_by_mcc_mnc, get_provider_data, get_frequency_by_arfcn, provider_mapping
+from app.service.xml_config_service import XmlConfigEntry, xml_config_store
+from app.utils.timestamps import TIME_FORMAT, as_local, parse_local
+from app.ws.heartbeat_coalescer import heartbeat_coalescer
+from app.ws.relay import forward_to_ingest, forward_to_main, forward_to_shards
 
 def get_heartbeat_by_ip(
     db: Session,
@@ -14,11 +19,11 @@ def get_heartbeat_by_ip(
         Heartbeat.source_ip == source_ip
     ).first()
 
-# Dipakai untuk update ketika melakukan GetCellPara
+# Dipakai untuk update ketika menerima GetCellParaRsp
 def update_heartbeat(
     db: Session,
     source_ip: str,
-    file_path: str
+    entry: XmlConfigEntry = None
 ) -> Heartbeat | None:
     try:
         row = db.query(Heartbeat).filter(
@@ -28,7 +33,11 @@ def update_heartbeat(
         if not row:
             return None 
 
-        xml_parsing = parse_xml(file_path, row.mode)
+        if entry is None:
+            entry = xml_config_store.get("cell_para", source_ip)
+        xml_parsing = entry.fields(row.mode) if entry else None
+        if not xml_parsing:
+            return None
         
         arfcn_raw = xml_parsing.get("frequency", "")
         
@@ -75,6 +84,42 @@ def upsert_heartbeat(db: Session, source_ip: str, state: str, temp: str, mode: s
     
     return row
 
+# State sniffer (sniff_status, sniff_scan) per IP yang terakhir di-persist.
+# Update yang tidak mengubah state tidak perlu menulis ke DB.
+_sniff_state: Dict[str, Tuple[int, int]] = {}
+_sniff_state_lock = threading.Lock()
+
+def cache_sniff_state(source_ip: str, sniff_status: int, sniff_scan: int):
+    """Update cache lokal saja (dipakai saat menerima perubahan dari proses lain)"""
+    with _sniff_state_lock:
+        _sniff_state[source_ip] = (sniff_status, sniff_scan)
+
+def remember_sniff_state(source_ip: str, sniff_status: int, sniff_scan: int):
+    cache_sniff_state(source_ip, sniff_status, sniff_scan)
+    # Cache yang dipakai update_status_ip_sniffer ada di proses ingest dan
+    # setiap shard: worker API -> ingest, shard -> ingest utama -> shard lain
+    payload = {"source_ip": source_ip, "sniff_status": sniff_status, "sniff_scan": sniff_scan}
+    if forward_to_ingest("sniff_state", **payload) or forward_to_main("sniff_state", **payload):
+        return
+    forward_to_shards("sniff_state", **payload)
+
+def _next_sniff_state(current: Tuple[int, int], update_type: str, value: int) -> Tuple[int, int]:
+    sniff_status, sniff_scan = current
+
+    if update_type == "status":
+        sniff_status = value
+
+        if value == 0:
+            sniff_scan = 0
+
+    elif update_type == "scan":
+        sniff_scan = value
+
+        if value == 1:
+            sniff_status = 1
+
+    return sniff_status, sniff_scan
+
 # Dipakai ketika melakukan update status sniffer BBU
 def update_status_ip_sniffer(
     source_ip: str,
@@ -82,6 +127,17 @@ def update_status_ip_sniffer(
     value: int,
     db: Session
 ):
+    if update_type not in ("status", "scan"):
+        print(f"[ERROR] update_type tidak dikenal: {update_type}")
+        return False
+
+    with _sniff_state_lock:
+        cached = _sniff_state.get(source_ip)
+
+    if cached is not None and _next_sniff_state(cached, update_type, value) == cached:
+        # Tidak ada transisi state, skip write
+        return True
+
     heartbeat = db.query(Heartbeat).filter(
         Heartbeat.source_ip == source_ip
     ).first()
@@ -90,56 +146,67 @@ def update_status_ip_sniffer(
         print(f"[WARN] Heartbeat dengan IP {source_ip} tidak ditemukan")
         return False
 
-    if update_type == "status":
-        heartbeat.sniff_status = value
-
-        if value == 0:
-            heartbeat.sniff_scan = 0
-
-    elif update_type == "scan":
-        heartbeat.sniff_scan = value
-
-        if value == 1:
-            heartbeat.sniff_status = 1
-
-    else:
-        print(f"[ERROR] update_type tidak dikenal: {update_type}")
-        return False
-
+    sniff_status, sniff_scan = _next_sniff_state(
+        (heartbeat.sniff_status, heartbeat.sniff_scan), update_type, value
+    )
+    heartbeat.sniff_status = sniff_status
+    heartbeat.sniff_scan = sniff_scan
     heartbeat.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     db.commit()
-    db.refresh(heartbeat)
+    remember_sniff_state(source_ip, sniff_status, sniff_scan)
 
     print(
         f"[OK] Update sniffer IP {source_ip} | "
-        f"status={heartbeat.sniff_status}, scan={heartbeat.sniff_scan}"
+        f"status={sniff_status}, scan={sniff_scan}"
     )
     return True
 
 
-TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 def parse_timestamp(ts: str) -> datetime | None:
     try:
         return datetime.strptime(ts, TIME_FORMAT)
     except Exception:
         return None
 
+def heartbeat_time(hb: Heartbeat) -> datetime | None:
+    """Waktu heartbeat terakhir (aware), kolom ts atau string untuk row yang belum di-backfill"""
+    if hb.ts is not None:
+        return as_local(hb.ts)
+    return parse_local(hb.timestamp)
+
+def build_heartbeat_ws(hb: Heartbeat) -> Dict:
+    return {
+        "type": "heartbeat",
+        "ip": hb.source_ip,
+        "state": hb.state,
+        "temp": hb.temp,
+        "mode": hb.mode,
+        "ch": hb.ch,
+        "band": hb.band,
+        "provider": get_provider_by_mcc_mnc(hb.mcc, hb.mnc) if hb.mcc and hb.mnc else "Other",
+        "mcc": hb.mcc,
+        "mnc": hb.mnc,
+        "arfcn": hb.arfcn,
+        "ul": hb.ul_freq,
+        "dl": hb.dl_freq,
+        "timestamp": hb.timestamp,
+    }
+
 async def heartbeat_checker(db: Session, check_count: int = 0):
-    now = datetime.now()
+    now = datetime.now().astimezone()
     timeout_limit = now - timedelta(seconds=30)
 
-    # Get ALL devices (including OFFLINE ones) to continuously broadcast status
+    # Get ALL devices (including OFFLINE ones) untuk state awal coalescer
     rows = db.query(Heartbeat).all()
 
     if not rows:
         return
 
     expired: list[Heartbeat] = []
-    offline_devices: list[Heartbeat] = []
 
     for hb in rows:
-        ts = parse_timestamp(hb.timestamp)
+        ts = heartbeat_time(hb)
         if not ts:
             print(f"[WARN] Invalid timestamp for IP {hb.source_ip}: {hb.timestamp}")
             continue
@@ -150,59 +217,26 @@ async def heartbeat_checker(db: Session, check_count: int = 0):
             print(f"[INFO] Device {hb.source_ip} timeout detected ({time_diff:.1f}s) - Setting to OFFLINE")
             hb.state = "OFFLINE"
             expired.append(hb)
-        elif hb.state == "OFFLINE":
-            offline_devices.append(hb)
+        elif not heartbeat_coalescer.knows(hb.source_ip):
+            # Device yang belum pernah kirim heartbeat sejak start (misal OFFLINE)
+            # tetap masuk snapshot tanpa memicu event
+            heartbeat_coalescer.seed(build_heartbeat_ws(hb))
 
     if expired:
         db.commit()
 
+    # Device OFFLINE tidak di-broadcast ulang tiap siklus, cukup lewat
+    # full snapshot periodik dari heartbeat_coalescer
     for hb in expired:
-        heartbeat_ws = {
-            "type": "heartbeat",
-            "ip": hb.source_ip,
-            "state": "OFFLINE",
-            "temp": hb.temp,
-            "mode": hb.mode,
-            "ch": hb.ch,
-            "band": hb.band,
-            "provider": get_provider_by_mcc_mnc(hb.mcc, hb.mnc),
-            "mcc": hb.mcc,
-            "mnc": hb.mnc,
-            "arfcn": hb.arfcn,
-            "timestamp": hb.timestamp,
-            "ul" : hb.ul_freq,
-            "dl" : hb.dl_freq,
-        }
-
-        await event_bus.send_heartbeat(heartbeat_ws)
-        print(f"[OK] Sent OFFLINE status for {hb.source_ip} via WebSocket")
-
-    if check_count % 10 == 0 and offline_devices:
-        for hb in offline_devices:
-            heartbeat_ws = {
-                "type": "heartbeat",
-                "ip": hb.source_ip,
-                "state": "OFFLINE",
-                "temp": hb.temp,
-                "mode": hb.mode,
-                "ch": hb.ch,
-                "band": hb.band,
-                "provider": get_provider_by_mcc_mnc(hb.mcc, hb.mnc),
-                "mcc": hb.mcc,
-                "mnc": hb.mnc,
-                "arfcn": hb.arfcn,
-                "timestamp": hb.timestamp,
-                "ul" : hb.ul_freq,
-                "dl" : hb.dl_freq,
-            }
-
-            await event_bus.send_heartbeat(heartbeat_ws)
+        if await heartbeat_coalescer.publish(build_heartbeat_ws(hb)):
+            print(f"[OK] Sent OFFLINE status for {hb.source_ip} via WebSocket")
 
 async def heartbeat_watcher():
     print("[OK] Heartbeat watcher started (timeout: 30s, check interval: 1s)")
+    heartbeat_coalescer.start()
     check_count = 0
     while True:
-        db = SessionLocal()
+        db = BackgroundSessionLocal()
         try:
             await heartbeat_checker(db, check_count)
             check_count += 1
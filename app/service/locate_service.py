@@ -0,0 +1,166 @@
+"""
+Estimasi posisi target DF dari history observasi (crawling_observation).
+
+Setiap observasi punya posisi sensor (GPS device saat laporan diterima) dan
+ulRssi uplink dari UE target. ulRssi diubah ke estimasi jarak dengan model
+path loss log-distance:
+
+    d = 10 ** ((P_tx_ue - rssi - PL_ref) / (10 * n))
+
+rssi dikoreksi dengan selisih rx gain device (distance_radius) terhadap
+default, karena konstanta model dikalibrasi pada rx gain default.
+
+- Sensor tersebar (>= LOCATE_MIN_SPREAD): weighted least squares
+  (Gauss-Newton) dari weighted centroid, radius = 2x RMS residual jarak.
+- Sensor diam / berdekatan: arah tidak bisa ditentukan, posisi = centroid
+  sensor, radius = rata-rata jarak estimasi.
+
+Bobot = peluruhan umur observasi / jarak^2. Perhitungan batch dengan NumPy.
+"""
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config.utils import (
+    LOCATE_MAX_OBSERVATIONS,
+    LOCATE_MIN_SPREAD,
+    LOCATE_PL_EXPONENT,
+    LOCATE_PL_REF,
+    LOCATE_RECENCY_TAU,
+    LOCATE_UE_TX_POWER,
+    LOCATE_WINDOW_MINUTES,
+)
+from app.db.models import Heartbeat
+from app.service.distance_radius_service import default_rx_gain, get_distance_radius, tech_for_mode
+from app.service.observation_service import observation_store
+from app.utils.timestamps import TIME_FORMAT
+
+M_PER_DEG_LAT = 110540.0
+M_PER_DEG_LON = 111320.0
+WLS_ITERATIONS = 15
+WLS_TOLERANCE = 0.1  # meter
+MIN_RADIUS = 10.0  # meter
+MIN_DISTANCE = 1.0  # meter
+
+
+def path_loss_distance(rssi):
+    """ulRssi (dBm, skalar / array) -> estimasi jarak (meter)"""
+    exponent = (LOCATE_UE_TX_POWER - rssi - LOCATE_PL_REF) / (10.0 * LOCATE_PL_EXPONENT)
+    return np.power(10.0, exponent)
+
+
+def estimate_position(lat, lon, rssi, age) -> Dict:
+    """
+    lat/lon: posisi sensor (derajat), rssi: ulRssi terkoreksi (dBm),
+    age: umur observasi (detik). Semua sequence dengan panjang sama (> 0).
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    rssi = np.asarray(rssi, dtype=float)
+    age = np.asarray(age, dtype=float)
+
+    # Proyeksi lokal (meter) di sekitar rata-rata posisi sensor
+    lat0, lon0 = lat.mean(), lon.mean()
+    cos0 = math.cos(math.radians(lat0))
+    x = (lon - lon0) * M_PER_DEG_LON * cos0
+    y = (lat - lat0) * M_PER_DEG_LAT
+
+    dist = np.maximum(path_loss_distance(rssi), MIN_DISTANCE)
+    w = np.exp(-age / LOCATE_RECENCY_TAU) / dist ** 2
+    w /= w.sum()
+
+    px, py = float(w @ x), float(w @ y)
+    spread = float(np.sqrt(x.var() + y.var()))
+    method = "range"
+    radius = float(w @ dist)
+
+    if spread >= LOCATE_MIN_SPREAD:
+        for _ in range(WLS_ITERATIONS):
+            dx, dy = px - x, py - y
+            r = np.maximum(np.hypot(dx, dy), 1e-3)
+            res = r - dist
+            jx, jy = dx / r, dy / r
+            a11, a12, a22 = float(w @ (jx * jx)), float(w @ (jx * jy)), float(w @ (jy * jy))
+            b1, b2 = float(w @ (jx * res)), float(w @ (jy * res))
+            det = a11 * a22 - a12 * a12
+            if abs(det) < 1e-9:
+                # Sensor segaris: tidak bisa trilaterasi, tetap pakai centroid
+                break
+            step_x = (a22 * b1 - a12 * b2) / det
+            step_y = (a11 * b2 - a12 * b1) / det
+            px -= step_x
+            py -= step_y
+            method = "path_loss_wls"
+            if math.hypot(step_x, step_y) < WLS_TOLERANCE:
+                break
+        if method == "path_loss_wls":
+            res = np.hypot(px - x, py - y) - dist
+            radius = max(2.0 * math.sqrt(float(w @ (res * res))), MIN_RADIUS)
+
+    return _result(lat0, lon0, cos0, px, py, radius, method, spread, float(dist[int(np.argmin(age))]))
+
+
+def _result(lat0, lon0, cos0, px, py, radius, method, spread, latest_distance) -> Dict:
+    return {
+        "lat": round(float(lat0 + py / M_PER_DEG_LAT), 7),
+        "lon": round(float(lon0 + px / (M_PER_DEG_LON * cos0)), 7),
+        "radius_m": round(radius, 1),
+        "method": method,
+        "sensor_spread_m": round(spread, 1),
+        "latest_distance_m": round(latest_distance, 1),
+    }
+
+
+def _rx_offsets(db: Session, ips: List[str]) -> Dict[str, float]:
+    """Selisih rx gain device terhadap default (dB) per IP, dari mode heartbeat"""
+    gains = get_distance_radius(db)["rx"]
+    modes = dict(db.query(Heartbeat.source_ip, Heartbeat.mode).filter(Heartbeat.source_ip.in_(ips)).all())
+    offsets = {}
+    for ip in ips:
+        tech = tech_for_mode(modes.get(ip))
+        gain, default = gains.get(tech), default_rx_gain(tech)
+        offsets[ip] = float(gain - default) if gain is not None and default is not None else 0.0
+    return offsets
+
+
+def locate_imsi(db: Session, campaign_id: int, imsi: str, minutes: int = LOCATE_WINDOW_MINUTES) -> Dict:
+    started = time.perf_counter()
+    end = datetime.now().astimezone()
+    start = end - timedelta(minutes=minutes)
+
+    observations = [
+        o for o in observation_store.query(db, start, end, imsi=imsi, campaign_id=campaign_id)
+        if o["lat"] is not None and o["long"] is not None and o["ulRssi"] is not None
+    ][-LOCATE_MAX_OBSERVATIONS:]
+
+    if not observations:
+        return {
+            "status": "error",
+            "message": f"Tidak ada observasi dengan posisi GPS untuk IMSI {imsi} dalam {minutes} menit terakhir",
+            "data": None
+        }
+
+    ips = sorted({o["ip"] for o in observations})
+    offsets = _rx_offsets(db, ips)
+    now = end.timestamp()
+
+    estimate = estimate_position(
+        [o["lat"] for o in observations],
+        [o["long"] for o in observations],
+        [o["ulRssi"] - offsets[o["ip"]] for o in observations],
+        [max(now - o["ts"].timestamp(), 0.0) for o in observations],
+    )
+    estimate.update({
+        "campaign_id": campaign_id,
+        "imsi": imsi,
+        "observations": len(observations),
+        "devices": ips,
+        "first_seen": observations[0]["ts"].strftime(TIME_FORMAT),
+        "last_seen": observations[-1]["ts"].strftime(TIME_FORMAT),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+    return {"status": "success", "message": "Estimasi posisi berhasil dihitung", "data": estimate}
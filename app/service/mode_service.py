@@ -1,6 +1,6 @@
 import asyncio
 import time
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.schemas import CommandResponse, CommandRequest
 from app.service.utils_service import get_exception_ips
 from app.service.command_service import (
@@ -32,10 +32,10 @@ async def clear_whitelist_blacklist(ip_list: list) -> CommandResponse:
         details=all_results
     )
 
-async def execute_whitelist_mode(ip_list: list, req: CommandRequest, db: Session) -> CommandResponse:
+async def execute_whitelist_mode(ip_list: list, req: CommandRequest, db: AsyncSession) -> CommandResponse:
     logger.info(f"[Whitelist Mode] Starting bundle execution for {len(ip_list)} IPs")
     
-    channels = get_exception_ips(db)
+    channels = await db.run_sync(get_exception_ips)
     exception_ips = channels['exception_ips']
     other_ips = channels['other_ips']
     
@@ -82,10 +82,10 @@ async def execute_whitelist_mode(ip_list: list, req: CommandRequest, db: Session
     )
 
 
-async def execute_blacklist_mode(ip_list: list, req: CommandRequest, db: Session) -> CommandResponse:
+async def execute_blacklist_mode(ip_list: list, req: CommandRequest, db: AsyncSession) -> CommandResponse:
     logger.info(f"[Blacklist Mode] Starting bundle execution for {len(ip_list)} IPs")
     
-    channels = get_exception_ips(db)
+    channels = await db.run_sync(get_exception_ips)
     exception_ips = channels['exception_ips']
     other_ips = channels['other_ips']
     
@@ -132,7 +132,7 @@ async def execute_blacklist_mode(ip_list: list, req: CommandRequest, db: Session
     )
 
 
-async def execute_all_mode(ip_list: list, req: CommandRequest, db: Session) -> CommandResponse:
+async def execute_all_mode(ip_list: list, req: CommandRequest, db: AsyncSession) -> CommandResponse:
     logger.info(f"[All Mode] Starting bundle execution for {len(ip_list)} IPs")
     
     all_results = []
@@ -167,7 +167,7 @@ async def execute_all_mode(ip_list: list, req: CommandRequest, db: Session) -> C
         details=all_results
     )
 
-async def execute_df_mode(ip_list: list, req: CommandRequest, db: Session) -> CommandResponse:
+async def execute_df_mode(ip_list: list, req: CommandRequest, db: AsyncSession) -> CommandResponse:
     """
     Execute DF mode bundle:
     1. SetUlPara
@@ -202,10 +202,10 @@ async def execute_df_mode(ip_list: list, req: CommandRequest, db: Session) -> Co
         all_results.extend(result.details)
     await asyncio.sleep(0.5)
     
+    # Tunggu GetCellParaRsp (cell parameter baru sudah tersimpan) sebelum StartCell
     logger.info("[5/6] GetCellPara")
     result = await handle_get_cellpara(ip_list, db)
     all_results.extend(result.details)
-    await asyncio.sleep(0.5)
     
     logger.info("[6/6] StartCell")
     result = await handle_start_cell(ip_list, db, None, None, req.imsi)
@@ -3,7 +3,8 @@ import time
 import threading
 from sqlalchemy.orm import Session
 from app.db.models import Crawling
-from app.db.database import SessionLocal
+from app.db.database import BackgroundSessionLocal
+from app.service.sighting_service import set_sighting_msisdn
 
 
 def make_post_request(imsi):
@@ -112,7 +113,7 @@ def background_msisdn_checker(interval_seconds: int = 5):
     
     while True:
         try:
-            db = SessionLocal()
+            db = BackgroundSessionLocal()
             
             # Query crawling yang msisdn-nya NULL
             crawlings_to_check = db.query(Crawling).filter(
@@ -128,6 +129,7 @@ def background_msisdn_checker(interval_seconds: int = 5):
                         
                         if msisdn:
                             crawl.msisdn = msisdn
+                            set_sighting_msisdn(db, crawl.imsi, msisdn)
                             db.commit()
                             print(f"[MSISDN Checker] Updated IMSI {crawl.imsi} with MSISDN {msisdn}")
                         else:
@@ -0,0 +1,341 @@
+"""
+History observasi crawling (append-only).
+
+upsert_crawling hanya menyimpan pengukuran terakhir per IMSI. Setiap
+OneUeInfoIndi juga dicatat di sini (rsrp, ulRssi, ulCqi, taType, posisi GPS)
+untuk analisa DF. Row di-buffer di memori dan di-bulk insert oleh thread
+writer dengan koneksi sendiri, di luar transaksi ingest, sehingga upsert
+crawling live tidak ikut melambat.
+
+Penyimpanan:
+- Postgres: tabel crawling_observation dipartisi per hari (RANGE ts).
+  Partisi disiapkan beberapa hari ke depan, partisi yang lewat retensi di-DROP
+  (tanpa DELETE besar / VACUUM).
+- SQLite: satu file segmen per hari di OBSERVATION_DIR, retensi = hapus file.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from app.config.utils import (
+    OBSERVATION_DIR,
+    OBSERVATION_FLUSH_BATCH,
+    OBSERVATION_FLUSH_INTERVAL,
+    OBSERVATION_PARTITIONS_AHEAD,
+    OBSERVATION_QUEUE_MAX,
+    OBSERVATION_RETENTION_DAYS,
+)
+from app.db.database import background_engine
+from app.db.models import crawling_observation, crawling_observation_segment
+from app.utils.timestamps import as_local
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MAINTENANCE_INTERVAL = 3600  # detik, cek partisi / segmen untuk retensi
+PARTITION_PREFIX = "crawling_observation_p"
+DEFAULT_PARTITION = "crawling_observation_default"
+SEGMENT_PATTERN = re.compile(r"^crawling_observation_(\d{8})\.db$")
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _day_start(day: date) -> datetime:
+    """00:00 waktu lokal server (batas partisi / segmen)"""
+    return datetime(day.year, day.month, day.day).astimezone()
+
+
+class ObservationStore:
+    def __init__(
+        self,
+        engine=background_engine,
+        retention_days: int = OBSERVATION_RETENTION_DAYS,
+        batch_size: int = OBSERVATION_FLUSH_BATCH,
+        flush_interval: float = OBSERVATION_FLUSH_INTERVAL,
+        queue_max: int = OBSERVATION_QUEUE_MAX,
+        segment_dir: str = None,
+    ):
+        self.engine = engine
+        self.partitioned = engine.dialect.name == "postgresql"
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_max = queue_max
+        self.segment_dir = segment_dir or OBSERVATION_DIR or os.path.join(BASE_DIR, "observations")
+
+        self._rows = deque()
+        self._cond = threading.Condition()
+        self._writer = None
+        self._schema_ready = False
+        self._last_maintenance = 0.0
+        self._segment_engines = {}
+        self._segment_lock = threading.Lock()
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def record(self, imsi: str, ip: str, campaign_id: int = None, ch: str = None, rsrp=None,
+               ulRssi=None, ulCqi=None, taType=None, lat=None, long=None, ts: datetime = None):
+        """Catat satu observasi (dipanggil ingest, tidak menunggu DB)"""
+        self.add({
+            "ts": as_local(ts) if ts else datetime.now().astimezone(),
+            "campaign_id": campaign_id,
+            "imsi": imsi,
+            "ip": ip,
+            "ch": ch,
+            "rsrp": _to_int(rsrp),
+            "ulRssi": _to_int(ulRssi),
+            "ulCqi": _to_int(ulCqi),
+            "taType": _to_int(taType),
+            "lat": _to_float(lat),
+            "long": _to_float(long),
+        })
+
+    def add(self, row: Dict):
+        with self._cond:
+            if len(self._rows) >= self.queue_max:
+                # DB tertinggal jauh: buang row tertua daripada memori terus naik
+                self._rows.popleft()
+                self.dropped += 1
+            self._rows.append(row)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, name="ObservationWriter", daemon=True)
+                self._writer.start()
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self) -> int:
+        """Tulis row yang masih di buffer sekarang juga (shutdown / test)"""
+        rows = self._drain()
+        if rows:
+            self._write(rows)
+        return len(rows)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            queued = len(self._rows)
+        return {
+            "backend": "postgres_partition" if self.partitioned else "sqlite_segment",
+            "queued": queued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retention_days": self.retention_days,
+        }
+
+    # ---------- schema & retensi ----------
+
+    def ensure_schema(self):
+        if self.partitioned:
+            with self.engine.begin() as conn:
+                crawling_observation.create(conn, checkfirst=True)
+                conn.exec_driver_sql(
+                    f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF crawling_observation DEFAULT"
+                )
+            self._ensure_partitions()
+        else:
+            os.makedirs(self.segment_dir, exist_ok=True)
+        self._schema_ready = True
+
+    def run_maintenance(self):
+        self._last_maintenance = time.monotonic()
+        try:
+            if not self._schema_ready:
+                self.ensure_schema()
+            elif self.partitioned:
+                self._ensure_partitions()
+            self._apply_retention()
+        except Exception as e:
+            print(f"[OBSERVATION] Maintenance gagal: {e}")
+
+    def _ensure_partitions(self):
+        today = date.today()
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for offset in range(-1, OBSERVATION_PARTITIONS_AHEAD + 1):
+                day = today + timedelta(days=offset)
+                name = f"{PARTITION_PREFIX}{day:%Y%m%d}"
+                try:
+                    conn.exec_driver_sql(
+                        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF crawling_observation "
+                        f"FOR VALUES FROM ('{_day_start(day).isoformat()}') "
+                        f"TO ('{_day_start(day + timedelta(days=1)).isoformat()}')"
+                    )
+                except Exception as e:
+                    # Mis. partisi default sudah berisi row di rentang ini
+                    print(f"[OBSERVATION] Gagal membuat partisi {name}: {e}")
+
+    def _apply_retention(self):
+        if self.retention_days <= 0:
+            return
+        cutoff = date.today() - timedelta(days=self.retention_days)
+
+        if self.partitioned:
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                names = conn.exec_driver_sql(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "JOIN pg_class p ON p.oid = i.inhparent "
+                    "WHERE p.relname = 'crawling_observation'"
+                ).scalars().all()
+                for name in names:
+                    if not name.startswith(PARTITION_PREFIX):
+                        continue
+                    day = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+                    if day < cutoff:
+                        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {name}")
+                        print(f"[OBSERVATION] Partisi {name} dihapus (retensi {self.retention_days} hari)")
+                conn.exec_driver_sql(
+                    f"DELETE FROM {DEFAULT_PARTITION} WHERE ts < %(cutoff)s",
+                    {"cutoff": _day_start(cutoff)}
+                )
+            return
+
+        for day, path in self._segment_files():
+            if day >= cutoff:
+                continue
+            with self._segment_lock:
+                engine = self._segment_engines.pop(day, None)
+            if engine is not None:
+                engine.dispose()
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+            print(f"[OBSERVATION] Segmen {os.path.basename(path)} dihapus (retensi {self.retention_days} hari)")
+
+    # ---------- segmen SQLite ----------
+
+    def _segment_path(self, day: date) -> str:
+        return os.path.join(self.segment_dir, f"crawling_observation_{day:%Y%m%d}.db")
+
+    def _segment_files(self):
+        try:
+            names = os.listdir(self.segment_dir)
+        except FileNotFoundError:
+            return []
+        files = []
+        for name in names:
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                day = datetime.strptime(match.group(1), "%Y%m%d").date()
+                files.append((day, os.path.join(self.segment_dir, name)))
+        return sorted(files)
+
+    def _segment_engine(self, day: date, create: bool = True):
+        with self._segment_lock:
+            engine = self._segment_engines.get(day)
+            if engine is not None:
+                return engine
+            path = self._segment_path(day)
+            if not create and not os.path.exists(path):
+                return None
+            os.makedirs(self.segment_dir, exist_ok=True)
+            engine = create_engine(f"sqlite:///{path}", poolclass=NullPool, connect_args={"check_same_thread": False})
+            with engine.begin() as conn:
+                # WAL: pembaca (worker API) tidak memblok writer
+                conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+                crawling_observation_segment.create(conn, checkfirst=True)
+            self._segment_engines[day] = engine
+            return engine
+
+    # ---------- writer ----------
+
+    def _drain(self) -> List[Dict]:
+        with self._cond:
+            rows = list(self._rows)
+            self._rows.clear()
+        return rows
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                if len(self._rows) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+            if time.monotonic() - self._last_maintenance >= MAINTENANCE_INTERVAL:
+                self.run_maintenance()
+            rows = self._drain()
+            if rows:
+                self._write(rows)
+
+    def _write(self, rows: List[Dict]):
+        try:
+            if not self._schema_ready:
+                self.ensure_schema()
+            if self.partitioned:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(crawling_observation), rows)
+            else:
+                by_day: Dict[date, List[Dict]] = {}
+                for row in rows:
+                    by_day.setdefault(row["ts"].date(), []).append(row)
+                for day, day_rows in by_day.items():
+                    with self._segment_engine(day).begin() as conn:
+                        conn.execute(insert(crawling_observation_segment), day_rows)
+            self.written += len(rows)
+        except Exception as e:
+            self.failed += len(rows)
+            print(f"[OBSERVATION] Gagal menulis {len(rows)} observasi: {e}")
+
+    # ---------- query ----------
+
+    def query(self, db: Session, start: datetime, end: datetime, imsi: str = None,
+              campaign_id: int = None, ip: str = None, limit: int = None) -> List[Dict]:
+        """
+        Observasi dengan ts di [start, end), urut waktu. db dipakai di
+        Postgres (partition pruning dari filter ts); di SQLite dibaca dari
+        file segmen hari yang tercakup. Datetime naive = waktu lokal server.
+        """
+        start, end = as_local(start), as_local(end)
+
+        def _filtered(table):
+            stmt = select(table).where(table.c.ts >= start, table.c.ts < end)
+            if imsi is not None:
+                stmt = stmt.where(table.c.imsi == imsi)
+            if campaign_id is not None:
+                stmt = stmt.where(table.c.campaign_id == campaign_id)
+            if ip is not None:
+                stmt = stmt.where(table.c.ip == ip)
+            stmt = stmt.order_by(table.c.ts)
+            return stmt.limit(limit) if limit is not None else stmt
+
+        if self.partitioned:
+            rows = [dict(row) for row in db.execute(_filtered(crawling_observation)).mappings()]
+        else:
+            rows = []
+            day = start.date()
+            while day <= end.date():
+                engine = self._segment_engine(day, create=False)
+                if engine is not None:
+                    with engine.connect() as conn:
+                        rows.extend(dict(row) for row in conn.execute(_filtered(crawling_observation_segment)).mappings())
+                    if limit is not None and len(rows) >= limit:
+                        break
+                day += timedelta(days=1)
+
+        for row in rows:
+            row["ts"] = as_local(row["ts"])
+        return rows[:limit] if limit is not None else rows
+
+
+observation_store = ObservationStore()
@@ -0,0 +1,290 @@
+"""
+Rollup RSRP / ulRssi per (campaign, imsi, ip) untuk trend DF.
+
+Setiap OneUeInfoIndi meng-update bucket 1s / 10s / 1min di memori
+(min, max, sum, jumlah sampel). Bucket yang sudah berakhir (+ ROLLUP_GRACE
+untuk sampel telat) di-flush thread background ke tabel signal_rollup.
+get_trend membaca tabel (index campaign, imsi, resolusi, bucket) lalu
+menambahkan bucket yang masih terbuka di proses ini.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.config.utils import ROLLUP_FLUSH_INTERVAL, ROLLUP_GRACE, ROLLUP_RESOLUTIONS, ROLLUP_RETENTION
+from app.db.database import background_engine
+from app.db.models import SignalRollup
+from app.utils.timestamps import TIME_FORMAT, as_local
+
+RETENTION_INTERVAL = 3600  # detik antar purge bucket lama
+
+# Index nilai di list bucket
+_COUNT, _RSRP_MIN, _RSRP_MAX, _RSRP_SUM, _RSSI_MIN, _RSSI_MAX, _RSSI_SUM = range(7)
+
+BucketKey = Tuple[int, str, str, int, int]  # campaign_id, imsi, ip, resolution, bucket epoch
+
+
+def _insert_ignore(engine):
+    """INSERT ... ON CONFLICT DO NOTHING sesuai dialect"""
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(SignalRollup).on_conflict_do_nothing()
+    return sqlite.insert(SignalRollup).on_conflict_do_nothing()
+
+
+class SignalRollupEngine:
+    def __init__(self, engine=background_engine, resolutions=ROLLUP_RESOLUTIONS, grace: float = ROLLUP_GRACE):
+        self.engine = engine
+        self.resolutions = tuple(resolutions)
+        self.grace = grace
+        # Sampel untuk bucket yang berakhir lebih lama dari ini selalu dibuang,
+        # jadi penanda _flushed_until yang lebih tua boleh dihapus
+        self.late_window = grace + max(self.resolutions)
+        self._lock = threading.Lock()
+        self._open: Dict[BucketKey, list] = {}
+        # Bucket terakhir yang sudah di-flush per (campaign, imsi, ip, resolusi)
+        self._flushed_until: Dict[Tuple[int, str, str, int], int] = {}
+        self._flusher = None
+        self._last_retention = 0.0
+
+        self.samples = 0
+        self.late_dropped = 0
+        self.buckets_written = 0
+
+    def record(self, campaign_id: int, imsi: str, ip: str, rsrp, rssi, at: float = None):
+        """Tambah satu sampel ke bucket semua resolusi (dipanggil ingest)"""
+        try:
+            rsrp = int(rsrp)
+            rssi = int(rssi)
+        except (TypeError, ValueError):
+            return
+        now = time.time()
+        at = now if at is None else at
+        horizon = now - self.late_window
+
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="SignalRollupFlusher", daemon=True)
+                self._flusher.start()
+
+            self.samples += 1
+            for resolution in self.resolutions:
+                start = int(at // resolution) * resolution
+                if start + resolution < horizon or start <= self._flushed_until.get((campaign_id, imsi, ip, resolution), -1):
+                    # Bucket sudah ditulis ke DB, sampel yang terlalu telat dibuang
+                    self.late_dropped += 1
+                    continue
+                key = (campaign_id, imsi, ip, resolution, start)
+                bucket = self._open.get(key)
+                if bucket is None:
+                    self._open[key] = [1, rsrp, rsrp, rsrp, rssi, rssi, rssi]
+                    continue
+                bucket[_COUNT] += 1
+                bucket[_RSRP_SUM] += rsrp
+                bucket[_RSSI_SUM] += rssi
+                if rsrp < bucket[_RSRP_MIN]:
+                    bucket[_RSRP_MIN] = rsrp
+                elif rsrp > bucket[_RSRP_MAX]:
+                    bucket[_RSRP_MAX] = rsrp
+                if rssi < bucket[_RSSI_MIN]:
+                    bucket[_RSSI_MIN] = rssi
+                elif rssi > bucket[_RSSI_MAX]:
+                    bucket[_RSSI_MAX] = rssi
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "samples": self.samples,
+                "open_buckets": len(self._open),
+                "buckets_written": self.buckets_written,
+                "late_dropped": self.late_dropped,
+                "flushed_series": len(self._flushed_until),
+            }
+
+    # ---------- flush ----------
+
+    def flush(self, force: bool = False) -> int:
+        """Tulis bucket yang sudah berakhir (force: semua bucket, untuk shutdown / test)"""
+        now = time.time()
+        closed = []
+        with self._lock:
+            for key, bucket in list(self._open.items()):
+                campaign_id, imsi, ip, resolution, start = key
+                if not force and start + resolution + self.grace > now:
+                    continue
+                del self._open[key]
+                closed.append((key, bucket))
+        if not closed:
+            return 0
+
+        rows = [self._to_row(key, bucket) for key, bucket in closed]
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(_insert_ignore(self.engine), rows)
+        except Exception as e:
+            print(f"[ROLLUP] Gagal flush {len(rows)} bucket: {e}")
+            # Kembalikan ke _open supaya dicoba lagi di flush berikutnya
+            with self._lock:
+                for key, bucket in closed:
+                    self._restore(key, bucket)
+            return 0
+
+        with self._lock:
+            # Penanda baru dimajukan setelah INSERT berhasil
+            for key, _ in closed:
+                campaign_id, imsi, ip, resolution, start = key
+                series = (campaign_id, imsi, ip, resolution)
+                if start > self._flushed_until.get(series, -1):
+                    self._flushed_until[series] = start
+            self._prune_flushed(now)
+            self.buckets_written += len(rows)
+        return len(rows)
+
+    def _restore(self, key: BucketKey, bucket: list):
+        """Gabungkan bucket yang gagal di-flush dengan sampel yang masuk selama INSERT"""
+        current = self._open.get(key)
+        if current is None:
+            self._open[key] = bucket
+            return
+        current[_COUNT] += bucket[_COUNT]
+        current[_RSRP_SUM] += bucket[_RSRP_SUM]
+        current[_RSSI_SUM] += bucket[_RSSI_SUM]
+        current[_RSRP_MIN] = min(current[_RSRP_MIN], bucket[_RSRP_MIN])
+        current[_RSRP_MAX] = max(current[_RSRP_MAX], bucket[_RSRP_MAX])
+        current[_RSSI_MIN] = min(current[_RSSI_MIN], bucket[_RSSI_MIN])
+        current[_RSSI_MAX] = max(current[_RSSI_MAX], bucket[_RSSI_MAX])
+
+    def _prune_flushed(self, now: float):
+        """Hapus penanda series yang bucket terakhirnya sudah di luar late_window"""
+        horizon = now - self.late_window
+        stale = [
+            series for series, start in self._flushed_until.items()
+            if start + series[3] < horizon
+        ]
+        for series in stale:
+            del self._flushed_until[series]
+
+    def _to_row(self, key: BucketKey, bucket: list) -> Dict:
+        campaign_id, imsi, ip, resolution, start = key
+        count = bucket[_COUNT]
+        return {
+            "campaign_id": campaign_id,
+            "imsi": imsi,
+            "ip": ip,
+            "resolution": resolution,
+            "bucket": datetime.fromtimestamp(start).astimezone(),
+            "samples": count,
+            "rsrp_min": bucket[_RSRP_MIN],
+            "rsrp_max": bucket[_RSRP_MAX],
+            "rsrp_mean": bucket[_RSRP_SUM] / count,
+            "rssi_min": bucket[_RSSI_MIN],
+            "rssi_max": bucket[_RSSI_MAX],
+            "rssi_mean": bucket[_RSSI_SUM] / count,
+        }
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(ROLLUP_FLUSH_INTERVAL)
+            self.flush()
+            if time.monotonic() - self._last_retention >= RETENTION_INTERVAL:
+                self._last_retention = time.monotonic()
+                self.purge()
+
+    def purge(self):
+        """Hapus bucket yang lewat retensi per resolusi"""
+        now = datetime.now().astimezone()
+        try:
+            with self.engine.begin() as conn:
+                for resolution, days in ROLLUP_RETENTION.items():
+                    conn.execute(
+                        delete(SignalRollup).where(
+                            SignalRollup.resolution == resolution,
+                            SignalRollup.bucket < now - timedelta(days=days)
+                        )
+                    )
+        except Exception as e:
+            print(f"[ROLLUP] Gagal purge bucket lama: {e}")
+
+    # ---------- query ----------
+
+    def get_trend(self, db: Session, campaign_id: int, imsi: str, resolution: int,
+                  start: datetime, end: datetime = None, ip: str = None) -> List[Dict]:
+        """Series bucket [start, end) urut waktu, satu series per IP (device)"""
+        start = as_local(start)
+        end = as_local(end) if end else datetime.now().astimezone()
+
+        query = db.query(SignalRollup).filter(
+            SignalRollup.campaign_id == campaign_id,
+            SignalRollup.imsi == imsi,
+            SignalRollup.resolution == resolution,
+            SignalRollup.bucket >= start,
+            SignalRollup.bucket < end,
+        )
+        if ip is not None:
+            query = query.filter(SignalRollup.ip == ip)
+
+        points = {}
+        for row in query.all():
+            bucket = as_local(row.bucket)
+            points[(row.ip, bucket)] = {
+                "ip": row.ip,
+                "bucket": bucket,
+                "samples": row.samples,
+                "rsrp": {"min": row.rsrp_min, "max": row.rsrp_max, "mean": round(row.rsrp_mean, 2)},
+                "ulRssi": {"min": row.rssi_min, "max": row.rssi_max, "mean": round(row.rssi_mean, 2)},
+            }
+
+        # Bucket yang belum di-flush (hanya ada di proses ingest)
+        start_epoch, end_epoch = start.timestamp(), end.timestamp()
+        with self._lock:
+            open_buckets = [
+                (key, list(bucket)) for key, bucket in self._open.items()
+                if key[0] == campaign_id and key[1] == imsi and key[3] == resolution
+                and (ip is None or key[2] == ip) and start_epoch <= key[4] < end_epoch
+            ]
+        for key, bucket in open_buckets:
+            row = self._to_row(key, bucket)
+            bucket_time = row["bucket"]
+            points[(row["ip"], bucket_time)] = {
+                "ip": row["ip"],
+                "bucket": bucket_time,
+                "samples": row["samples"],
+                "rsrp": {"min": row["rsrp_min"], "max": row["rsrp_max"], "mean": round(row["rsrp_mean"], 2)},
+                "ulRssi": {"min": row["rssi_min"], "max": row["rssi_max"], "mean": round(row["rssi_mean"], 2)},
+            }
+
+        series: Dict[str, List[Dict]] = {}
+        for (point_ip, bucket_time), point in sorted(points.items(), key=lambda item: item[0][1]):
+            point["bucket"] = bucket_time.strftime(TIME_FORMAT)
+            del point["ip"]
+            series.setdefault(point_ip, []).append(point)
+        return [{"ip": point_ip, "points": data} for point_ip, data in series.items()]
+
+
+signal_rollup = SignalRollupEngine()
+
+
+def get_imsi_trend(db: Session, campaign_id: int, imsi: str, resolution: int = 10,
+                   minutes: int = 15, ip: Optional[str] = None) -> Dict:
+    if resolution not in signal_rollup.resolutions:
+        return {
+            "status": "error",
+            "message": f"Resolusi harus salah satu dari {list(signal_rollup.resolutions)} detik",
+            "data": None
+        }
+    end = datetime.now().astimezone()
+    series = signal_rollup.get_trend(db, campaign_id, imsi, resolution, end - timedelta(minutes=minutes), end, ip)
+    return {
+        "status": "success",
+        "message": "Trend signal berhasil diambil",
+        "data": {
+            "campaign_id": campaign_id,
+            "imsi": imsi,
+            "resolution": resolution,
+            "series": series
+        }
+    }
@@ -0,0 +1,134 @@
+"""
+Ringkasan kemunculan IMSI lintas campaign (tabel imsi_sighting).
+
+Satu row per IMSI: first_seen, last_seen, total laporan, daftar campaign,
+IMEI / MSISDN terakhir. Di-update incremental oleh ingest setiap
+OneUeInfoIndi dengan satu INSERT ... ON CONFLICT DO UPDATE (counter dan
+daftar campaign di-update di database, aman untuk beberapa shard ingest),
+MSISDN di-update background_msisdn_checker. Lookup banyak IMSI sekaligus
+cukup satu query IN per chunk, tanpa scan crawling.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.db.models import ImsiSighting
+from app.utils.timestamps import TIME_FORMAT, as_local
+
+LOOKUP_CHUNK = 5000  # IMSI per query IN
+
+
+# Tambah campaign baru ke daftar JSON tanpa duplikat, dievaluasi di database
+_APPEND_CAMPAIGN = {
+    "postgresql": text(
+        "CASE WHEN excluded.last_campaign_id IS NULL"
+        " OR COALESCE(imsi_sighting.campaign_ids::jsonb, '[]'::jsonb) @> jsonb_build_array(excluded.last_campaign_id)"
+        " THEN imsi_sighting.campaign_ids"
+        " ELSE (COALESCE(imsi_sighting.campaign_ids::jsonb, '[]'::jsonb)"
+        " || jsonb_build_array(excluded.last_campaign_id))::json END"
+    ),
+    "sqlite": text(
+        "CASE WHEN excluded.last_campaign_id IS NULL"
+        " OR EXISTS (SELECT 1 FROM json_each(imsi_sighting.campaign_ids) WHERE value = excluded.last_campaign_id)"
+        " THEN imsi_sighting.campaign_ids"
+        " ELSE json_insert(COALESCE(imsi_sighting.campaign_ids, '[]'), '$[#]', excluded.last_campaign_id) END"
+    ),
+}
+
+
+def _newest(dialect: str, a, b):
+    """Nilai terbesar yang tidak NULL (GREATEST di Postgres, max() skalar di SQLite)"""
+    if dialect == "postgresql":
+        return func.greatest(a, b)
+    # max() skalar SQLite menghasilkan NULL jika ada argumen NULL
+    return func.max(func.coalesce(a, b), func.coalesce(b, a))
+
+
+def _oldest(dialect: str, a, b):
+    """Nilai terkecil yang tidak NULL (LEAST di Postgres, min() skalar di SQLite)"""
+    if dialect == "postgresql":
+        return func.least(a, b)
+    return func.min(func.coalesce(a, b), func.coalesce(b, a))
+
+
+def record_sighting(
+        db: Session,
+        imsi: str,
+        campaign_id: int,
+        ip: str,
+        seen_at: datetime,
+        imei: str = None
+    ):
+    """Update ringkasan untuk satu laporan UE dengan satu upsert atomik (tanpa commit)"""
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(ImsiSighting).values(
+        imsi=imsi,
+        first_seen=seen_at,
+        last_seen=seen_at,
+        total_count=1,
+        campaign_ids=[campaign_id] if campaign_id is not None else [],
+        last_campaign_id=campaign_id,
+        last_ip=ip,
+        last_imei=imei
+    )
+    table = ImsiSighting.__table__
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[ImsiSighting.imsi],
+        set_={
+            "total_count": func.coalesce(table.c.total_count, 0) + 1,
+            # Laporan yang datang tidak berurutan (shard / replay) tidak memundurkan rentang
+            "first_seen": _oldest(dialect, table.c.first_seen, stmt.excluded.first_seen),
+            "last_seen": _newest(dialect, table.c.last_seen, stmt.excluded.last_seen),
+            "campaign_ids": _APPEND_CAMPAIGN.get(dialect, _APPEND_CAMPAIGN["sqlite"]),
+            "last_campaign_id": stmt.excluded.last_campaign_id,
+            "last_ip": stmt.excluded.last_ip,
+            "last_imei": func.coalesce(stmt.excluded.last_imei, table.c.last_imei),
+        }
+    ))
+
+
+def set_sighting_msisdn(db: Session, imsi: str, msisdn: str):
+    """Simpan MSISDN terakhir (tanpa commit)"""
+    db.query(ImsiSighting).filter(ImsiSighting.imsi == imsi).update(
+        {"last_msisdn": msisdn}, synchronize_session=False
+    )
+
+
+def _serialize(row: ImsiSighting) -> Dict:
+    return {
+        "imsi": row.imsi,
+        "first_seen": as_local(row.first_seen).strftime(TIME_FORMAT) if row.first_seen else None,
+        "last_seen": as_local(row.last_seen).strftime(TIME_FORMAT) if row.last_seen else None,
+        "total_count": row.total_count,
+        "campaign_ids": row.campaign_ids or [],
+        "last_campaign_id": row.last_campaign_id,
+        "last_ip": row.last_ip,
+        "last_imei": row.last_imei,
+        "last_msisdn": row.last_msisdn,
+    }
+
+
+def lookup_sightings(db: Session, imsis: Iterable[str]) -> Dict:
+    """Ringkasan untuk banyak IMSI sekaligus, IMSI yang belum pernah terlihat di not_seen"""
+    wanted: List[str] = list(dict.fromkeys(i.strip() for i in imsis if i and i.strip()))
+    if not wanted:
+        return {"status": "error", "message": "Daftar IMSI kosong", "data": None}
+
+    found = {}
+    for offset in range(0, len(wanted), LOOKUP_CHUNK):
+        chunk = wanted[offset:offset + LOOKUP_CHUNK]
+        for row in db.query(ImsiSighting).filter(ImsiSighting.imsi.in_(chunk)):
+            found[row.imsi] = _serialize(row)
+
+    return {
+        "status": "success",
+        "message": f"{len(found)} dari {len(wanted)} IMSI pernah terlihat",
+        "data": {
+            "sightings": [found[imsi] for imsi in wanted if imsi in found],
+            "not_seen": [imsi for imsi in wanted if imsi not in found],
+        }
+    }
@@ -1,13 +1,173 @@
-from typing import List, Dict
+from typing import Callable, Dict, List, Optional, Tuple
 import os
 import time
+import threading
 from datetime import datetime
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
+from app.config.utils import SNIFF_FLUSH_BATCH, SNIFF_FLUSH_INTERVAL
 from app.db.models import FreqOperator, Heartbeat, Crawling, Campaign, GPS, NmmCfg, Operator
+from app.service.heartbeat_service import heartbeat_time, remember_sniff_state
+from app.utils.timestamps import as_local, parse_local
+from app.ws import runtime
 
 def now_str():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+
+class SniffProgressCounter:
+    """
+    Counter jumlah hasil sniff (NmmCfg) per IP, disimpan di memory.
+    Di-update oleh insert_sniffer_nmmcfg / reset_nmmcfg sehingga progress
+    tidak perlu COUNT per device. Jika belum ter-isi (misal setelah restart),
+    counter di-prime dengan satu query GROUP BY.
+    """
+    def __init__(self):
+        self._counts: Dict[str, int] = {}
+        self._primed = False
+        self._lock = threading.Lock()
+
+    def increment(self, ip: str, n: int = 1):
+        with self._lock:
+            if self._primed:
+                self._counts[ip] = self._counts.get(ip, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._counts = {}
+            self._primed = True
+
+    def invalidate(self):
+        with self._lock:
+            self._counts = {}
+            self._primed = False
+
+    def get_counts(self, db: Session) -> Dict[str, int]:
+        with self._lock:
+            if self._primed:
+                return dict(self._counts)
+
+        rows = db.query(NmmCfg.ip, func.count(NmmCfg.id)).group_by(NmmCfg.ip).all()
+        counts = {ip: count for ip, count in rows if ip is not None}
+
+        if runtime.process_role == runtime.ROLE_API or runtime.ingest_shards > 1:
+            # Insert sniffer terjadi di proses lain (ingest / shard), counter tidak bisa di-cache
+            return counts
+
+        with self._lock:
+            self._counts = counts
+            self._primed = True
+            return dict(counts)
+
+
+sniff_counter = SniffProgressCounter()
+
+
+class SnifferResultBuffer:
+    """
+    Buffer hasil sniff (SnifferRsltIndi) per scan. Row di-flush ke nmmcfg
+    sekaligus (executemany) saat jumlahnya mencapai batch_size, saat row
+    tertua lebih lama dari max_age, atau saat scan selesai. Callback
+    on_flushed (event websocket) dijalankan setelah row-nya ditulis.
+    """
+    def __init__(self, batch_size: int = SNIFF_FLUSH_BATCH, max_age: float = SNIFF_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self._rows: List[Dict] = []
+        self._callbacks: List[Callable[[], None]] = []
+        self._first_at = None
+        self._lock = threading.Lock()
+
+    def add(self, row: Dict, on_flushed: Optional[Callable[[], None]] = None) -> bool:
+        """Tambah row, return True jika buffer sudah waktunya di-flush"""
+        with self._lock:
+            if not self._rows:
+                self._first_at = time.monotonic()
+            self._rows.append(row)
+            if on_flushed is not None:
+                self._callbacks.append(on_flushed)
+            return len(self._rows) >= self.batch_size
+
+    def is_due(self) -> bool:
+        with self._lock:
+            if not self._rows:
+                return False
+            return (
+                len(self._rows) >= self.batch_size
+                or time.monotonic() - self._first_at >= self.max_age
+            )
+
+    def drain(self) -> Tuple[List[Dict], List[Callable[[], None]]]:
+        with self._lock:
+            rows, callbacks = self._rows, self._callbacks
+            self._rows = []
+            self._callbacks = []
+            self._first_at = None
+            return rows, callbacks
+
+    def requeue(self, rows: List[Dict], callbacks: List[Callable[[], None]]):
+        """Kembalikan row yang gagal ditulis ke depan buffer (tetap due)"""
+        with self._lock:
+            self._rows = rows + self._rows
+            self._callbacks = callbacks + self._callbacks
+            self._first_at = time.monotonic() - self.max_age
+
+
+sniffer_buffer = SnifferResultBuffer()
+
+
+def flush_sniffer_results(db: Session, force: bool = True) -> int:
+    """Bulk insert row yang ada di buffer. force=False hanya flush jika sudah due."""
+    if not force and not sniffer_buffer.is_due():
+        return 0
+
+    rows, callbacks = sniffer_buffer.drain()
+    if not rows:
+        return 0
+
+    try:
+        db.execute(insert(NmmCfg), rows)
+        db.commit()
+        print(f"[OK] flush_sniffer_results: {len(rows)} rows")
+    except Exception as e:
+        db.rollback()
+        # Counter sudah dinaikkan saat buffer, sinkronkan ulang dari DB
+        sniff_counter.invalidate()
+        print("[ERROR] flush_sniffer_results:", e)
+        raise
+    _run_flushed_callbacks(callbacks)
+    return len(rows)
+
+def stage_sniffer_results(db: Session) -> int:
+    """
+    Pre-commit hook window ingest: insert row yang sudah due ke transaksi
+    window (SAVEPOINT, tanpa commit). Jika insert gagal, row dikembalikan ke
+    buffer dan window tetap di-commit.
+    """
+    if not sniffer_buffer.is_due():
+        return 0
+
+    rows, callbacks = sniffer_buffer.drain()
+    if not rows:
+        return 0
+
+    try:
+        with db.begin_nested():
+            db.execute(insert(NmmCfg), rows)
+    except Exception as e:
+        sniffer_buffer.requeue(rows, callbacks)
+        print(f"[ERROR] stage_sniffer_results: {len(rows)} rows dikembalikan ke buffer: {e}")
+        return 0
+    _run_flushed_callbacks(callbacks)
+    return len(rows)
+
+def _run_flushed_callbacks(callbacks: List[Callable[[], None]]):
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            print("[ERROR] sniffer on_flushed:", e)
+
 def insert_sniffer_nmmcfg(
     db: Session,
     ip: str = None,
@@ -19,43 +179,46 @@ def insert_sniffer_nmmcfg(
     pci: str = None,
     rsrp: str = None,
     band: int = None,
-    ch: str= None
+    ch: str= None,
+    on_flushed: Callable[[], None] = None
 ):
     """
-    Insert 1 row ke tabel nmmcfg.
-    Field yang tidak ada -> None / default.
+    Tambah 1 row nmmcfg ke buffer scan, di-flush per batch.
+    Field yang tidak ada -> None / default. on_flushed dipanggil setelah
+    row ditulis ke DB.
     """
-    try:
-        row = NmmCfg(
-            ip=ip,
-            time=now_str() if time is None else time,
-            arfcn=arfcn,
-            operator=operator,
-            dl_freq=dl_freq,
-            ul_freq=ul_freq,
-            pci=pci,
-            rsrp=rsrp,
-            band=band,
-            ch=ch
-        )
-        db.add(row)
-        db.commit()
-        db.refresh(row)
-        print("[OK] insert_sniffer_nmmcfg berhasil")
-        return row
-    except Exception as e:
-        db.rollback()
-        print("[ERROR] insert_sniffer_nmmcfg:", e)
-        raise
+    time = now_str() if time is None else time
+    row = dict(
+        ip=ip,
+        time=time,
+        # Bulk insert Core tidak lewat validator ORM, ts diisi di sini
+        ts=parse_local(time),
+        arfcn=arfcn,
+        operator=operator,
+        dl_freq=dl_freq,
+        ul_freq=ul_freq,
+        pci=pci,
+        rsrp=rsrp,
+        band=band,
+        ch=ch
+    )
+    sniff_counter.increment(ip)
+
+    if sniffer_buffer.add(row, on_flushed):
+        flush_sniffer_results(db)
 
 def reset_nmmcfg(db: Session) -> int:
+    # Hasil scan sebelumnya yang belum di-flush ikut dibuang
+    sniffer_buffer.drain()
     try:
         deleted = db.query(NmmCfg).delete(synchronize_session=False)
         db.commit()
+        sniff_counter.reset()
         print(f"[OK] nmmcfg reset. deleted={deleted}")
         return deleted
     except Exception as e:
         db.rollback()
+        sniff_counter.invalidate()
         print("[ERROR] reset_nmmcfg:", e)
         raise
 
@@ -79,12 +242,13 @@ def get_sniffing_progress(db: Session) -> Dict:
     
     progress = completed * base_progress_per_device
     bonus_per_data = base_progress_per_device / 10
+    sniff_counts = sniff_counter.get_counts(db)
     
     for hb in heartbeats:
         if hb.sniff_scan == -1:
             continue
         
-        sniff_count = db.query(NmmCfg).filter(NmmCfg.ip == hb.source_ip).count()
+        sniff_count = sniff_counts.get(hb.source_ip, 0)
         bonus = min(sniff_count * bonus_per_data, base_progress_per_device * 0.9)
         progress += bonus
     
@@ -97,12 +261,10 @@ def get_sniffing_progress(db: Session) -> Dict:
     
     latest_timestamp = None
     if heartbeats:
-        try:
-            timestamps = [float(hb.timestamp) for hb in heartbeats if hb.timestamp]
-            if timestamps:
-                latest_timestamp = max(timestamps)
-        except (ValueError, TypeError):
-            pass
+        timestamps = [heartbeat_time(hb) for hb in heartbeats]
+        timestamps = [ts.timestamp() for ts in timestamps if ts is not None]
+        if timestamps:
+            latest_timestamp = max(timestamps)
     
     elapsed_minutes = 0
     if latest_timestamp:
@@ -113,10 +275,12 @@ def get_sniffing_progress(db: Session) -> Dict:
         status = 'scanning'
     elif completed == total or elapsed_minutes >= 5:
         status = 'completed'
-        for hb in heartbeats:
-            if hb.sniff_scan != -1:
-                hb.sniff_scan = -1
+        changed = [hb for hb in heartbeats if hb.sniff_scan != -1]
+        for hb in changed:
+            hb.sniff_scan = -1
         db.commit()
+        for hb in changed:
+            remember_sniff_state(hb.source_ip, hb.sniff_status, hb.sniff_scan)
     else:
         status = 'idle'
     
@@ -130,24 +294,14 @@ def get_sniffing_progress(db: Session) -> Dict:
         'completed_devices': completed
     }
 
-def reset_nmmcfg(db: Session) -> int:
-    try:
-        deleted = db.query(NmmCfg).delete(synchronize_session=False)
-        db.commit()
-        print(f"[OK] nmmcfg reset. deleted={deleted}")
-        return deleted
-    except Exception as e:
-        db.rollback()
-        print("[ERROR] reset_nmmcfg:", e)
-        raise
-
 def get_heartbeat_sniff_status(db: Session) -> List[Dict]:
     heartbeats = db.query(Heartbeat).filter(Heartbeat.sniff_status == 1).all()
+    sniff_counts = sniff_counter.get_counts(db)
     result = []
     
     for hb in heartbeats:
-        # Count sniff results (NmmCfg) untuk IP ini
-        sniff_count = db.query(NmmCfg).filter(NmmCfg.ip == hb.source_ip).count()
+        # Jumlah sniff results (NmmCfg) untuk IP ini, dari counter in-memory
+        sniff_count = sniff_counts.get(hb.source_ip, 0)
         
         # Determine status label
         if hb.sniff_scan == -1:
@@ -181,6 +335,7 @@ def get_nmmcfg_data(db: Session) -> List[Dict]:
     if not active_ips:
         return []
     
+    flush_sniffer_results(db)
     nmmcfgs = db.query(NmmCfg).filter(NmmCfg.ip.in_(active_ips)).all()
     result = []
     
@@ -201,6 +356,18 @@ def get_nmmcfg_data(db: Session) -> List[Dict]:
     return result
 
 
+def get_sniffer_results_between(db: Session, start: datetime, end: datetime, ip: str = None) -> List[NmmCfg]:
+    """
+    Hasil sniff dengan ts di [start, end), lewat index ts.
+    Datetime naive dianggap waktu lokal server.
+    """
+    flush_sniffer_results(db)
+    query = db.query(NmmCfg).filter(NmmCfg.ts >= as_local(start), NmmCfg.ts < as_local(end))
+    if ip is not None:
+        query = query.filter(NmmCfg.ip == ip)
+    return query.order_by(NmmCfg.ts).all()
+
+
 def get_sniffing_data_snapshot(db: Session) -> Dict:
     return {
         'loading': get_sniffing_progress(db),
@@ -1,25 +1,77 @@
+import csv
+import io
+import threading
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.utils import TARGET_IMPORT_CHUNK
+from app.service.campaign_target_service import apply_target_changes, get_active_imsis, get_running_campaign_ids, set_active_imsis
 from app.db.models import Target
-from typing import Dict, Any
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence
 import openpyxl
-from io import BytesIO
 from app.utils.logger import setup_logger
 from app.service.log_service import add_log
+from app.ws.relay import forward_to_ingest, forward_to_shards
 
 logger = setup_logger("[TARGET SERVICE]")
 
-async def stop_exeption_ip(db: Session, target_imsi: str):
+MAX_IMPORT_ERRORS = 1000  # pesan error per baris yang dikembalikan import
+
+
+class TargetImsiCache:
+    """
+    Cache IMSI target di memory untuk lookup per event crawling.
+    Di-load sekali dari DB dan di-invalidate setiap ada perubahan target.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._targets: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def invalidate(self):
+        with self._lock:
+            self._targets = None
+        # Lookup per event crawling dilakukan di proses ingest (dan shard)
+        forward_to_ingest("target_cache_invalidate")
+        forward_to_shards("target_cache_invalidate")
+
+    def _load(self, db: Session) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            if self._targets is not None:
+                return self._targets
+
+        rows = db.query(Target.imsi, Target.name, Target.alert_status, Target.target_status).all()
+        targets = {
+            row.imsi: {
+                "name": row.name,
+                "alert_status": row.alert_status,
+                "target_status": row.target_status
+            }
+            for row in rows
+        }
+
+        with self._lock:
+            self._targets = targets
+        return targets
+
+    def get(self, db: Session, imsi: str) -> Optional[Dict[str, Any]]:
+        return self._load(db).get(imsi)
+
+
+target_cache = TargetImsiCache()
+
+async def stop_exeption_ip(db: AsyncSession, target_imsi: str):
     from app.db.models import Operator
-    from sqlalchemy import func
     
     target_mcc = target_imsi[:3]
     target_mnc = target_imsi[3:5]
     
-    matching_operators = db.query(Operator).filter(
-        func.concat(Operator.mcc, Operator.mnc) == f"{target_mcc}{target_mnc}",
+    matching_operators = (await db.execute(select(Operator).filter(
+        Operator.mcc.concat(Operator.mnc) == f"{target_mcc}{target_mnc}",
         Operator.ip.isnot(None)
-    ).all()
+    ))).scalars().all()
     
     if not matching_operators:
         print(f"[Target Service] No matching operators found for MCC+MNC: {target_mcc}{target_mnc}")
@@ -33,6 +85,73 @@ async def stop_exeption_ip(db: Session, target_imsi: str):
     logger.info(f"[Target Service] StopCell - Add Target {len(matching_ips)} exception channels")
 
 
+def _target_snapshot(target: Target) -> Dict[str, Any]:
+    return {
+        "name": target.name,
+        "imsi": target.imsi,
+        "alert_status": target.alert_status,
+        "target_status": target.target_status
+    }
+
+
+async def propagate_target_delta(db: AsyncSession, campaign_id: int, added: List[Target] = (), removed: List[str] = ()):
+    """
+    Terapkan perubahan target ke daftar IMSI campaign yang sedang berjalan:
+    hanya IMSI yang ditambah (target Active) / dihapus yang diubah di
+    campaign_target, lalu black/white list dikirim ulang hanya ke channel
+    yang PLMN-nya cocok dengan IMSI yang berubah (atau PLMN-nya belum diketahui).
+    Snapshot nama / alert target di-update terpisah oleh apply_target_changes.
+    """
+    from app.db.models import Campaign
+    from app.service.utils_service import get_channel_plmns, get_exception_ips
+    from app.service.command_service import handle_set_blacklist, handle_set_whitelist
+
+    campaign = await db.get(Campaign, campaign_id)
+    if not campaign or campaign.status != "started":
+        return
+
+    current = await db.run_sync(get_active_imsis, campaign_id)
+    current_set = set(current)
+    removed_set = set(removed) & current_set
+    added_imsis = [t.imsi for t in added if t.target_status == 'Active' and t.imsi not in current_set]
+    changed_imsis = set(added_imsis) | removed_set
+    if not changed_imsis:
+        return
+
+    active = [i for i in current if i not in removed_set] + added_imsis
+    await db.run_sync(set_active_imsis, campaign, active)
+    await db.commit()
+
+    mode = campaign.mode.lower() if campaign.mode else ""
+    if mode not in ["whitelist", "blacklist"]:
+        return
+
+    channels = await db.run_sync(get_exception_ips)
+    plmns = await db.run_sync(get_channel_plmns)
+
+    def affected(ips: List[str]) -> List[str]:
+        return [
+            ip for ip in ips
+            if not plmns.get(ip) or any(imsi.startswith(p) for p in plmns[ip] for imsi in changed_imsis)
+        ]
+
+    exception_ips = affected(channels.get('exception_ips', []))
+    other_ips = affected(channels.get('other_ips', []))
+    all_imsis_str = " ".join(active)
+
+    if mode == "whitelist":
+        if exception_ips:
+            await handle_set_blacklist(exception_ips, all_imsis_str)
+        if other_ips:
+            await handle_set_whitelist(other_ips, all_imsis_str)
+    else:
+        if other_ips:
+            await handle_set_blacklist(other_ips, all_imsis_str)
+        if exception_ips:
+            await handle_set_whitelist(exception_ips, all_imsis_str)
+    logger.info(f"[Target Service] Campaign {campaign_id} target delta: {len(changed_imsis)} IMSI, {len(exception_ips) + len(other_ips)} channels updated")
+
+
 def list_targets(db: Session, target_status: str = None) -> Dict[str, Any]:
     try:
         query = db.query(Target).order_by(Target.created_at.desc())
@@ -73,9 +192,9 @@ def list_targets(db: Session, target_status: str = None) -> Dict[str, Any]:
         }
 
 
-async def create_target(db: Session, name: str, imsi: str, alert_status: str = None, target_status: str = None, campaign_id: int = None) -> Dict[str, Any]:
+async def create_target(db: AsyncSession, name: str, imsi: str, alert_status: str = None, target_status: str = None, campaign_id: int = None) -> Dict[str, Any]:
     try:
-        existing_target = db.query(Target).filter(Target.imsi == imsi).first()
+        existing_target = (await db.execute(select(Target.id).filter(Target.imsi == imsi))).first()
         if existing_target:
             return {
                 "status": "error",
@@ -90,57 +209,25 @@ async def create_target(db: Session, name: str, imsi: str, alert_status: str = N
         )
         
         db.add(new_target)
-        db.commit()
-        db.refresh(new_target)
+        # Snapshot target di campaign yang sedang berjalan, satu transaksi dengan insert
+        await db.run_sync(apply_target_changes, [_target_snapshot(new_target)])
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Unique index target.imsi: request lain menambah IMSI yang sama
+            await db.rollback()
+            return {
+                "status": "error",
+                "message": f"Target with IMSI {imsi} already exists"
+            }
+        await db.refresh(new_target)
+        target_cache.invalidate()
         
         await stop_exeption_ip(db, imsi)        
         if campaign_id:
-            from app.db.models import Campaign
-            from app.service.utils_service import get_exception_ips
-            from app.service.command_service import handle_set_blacklist, handle_set_whitelist
-            import asyncio
-            
-            campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-            if campaign and campaign.status == "started":
-                all_targets = db.query(Target).all()
-                target_info_list = []
-                for target in all_targets:
-                    target_info_list.append({
-                        "name": target.name,
-                        "imsi": target.imsi,
-                        "alert_status": target.alert_status,
-                        "target_status": target.target_status
-                    })
-                campaign.target_info = target_info_list
-                
-                active_targets = db.query(Target).filter(Target.target_status == 'Active').all()
-                active_imsis = [t.imsi for t in active_targets]
-                campaign.imsi = ",".join(active_imsis)
-                db.commit()
-                
-                channels = get_exception_ips(db)
-                exception_ips = channels.get('exception_ips', [])
-                other_ips = channels.get('other_ips', [])
-                
-                all_imsis_str = campaign.imsi.replace(',', ' ')
-                mode = campaign.mode.lower() if campaign.mode else ""
-                
-                async def execute_commands():
-                    if mode == "whitelist":
-                        if exception_ips:
-                            await handle_set_blacklist(exception_ips, all_imsis_str)
-                        if other_ips:
-                            await handle_set_whitelist(other_ips, all_imsis_str)
-                    elif mode == "blacklist":
-                        if other_ips:
-                            await handle_set_blacklist(other_ips, all_imsis_str)
-                        if exception_ips:
-                            await handle_set_whitelist(exception_ips, all_imsis_str)
-                
-                if mode in ["whitelist", "blacklist"]:
-                    await execute_commands()
+            await propagate_target_delta(db, campaign_id, added=[new_target])
         
-        add_log(db, f"Target '{name}' created", "info", "User")
+        await db.run_sync(add_log, f"Target '{name}' created", "info", "User")
         return {
             "status": "success",
             "message": "Target created successfully",
@@ -155,16 +242,16 @@ async def create_target(db: Session, name: str, imsi: str, alert_status: str = N
             }
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {
             "status": "error",
             "message": f"Error creating target: {str(e)}"
         }
 
 
-def update_target(db: Session, target_id: int, name: str = None, imsi: str = None, alert_status: str = None, target_status: str = None) -> Dict[str, Any]:
+async def update_target(db: AsyncSession, target_id: int, name: str = None, imsi: str = None, alert_status: str = None, target_status: str = None) -> Dict[str, Any]:
     try:
-        target = db.query(Target).filter(Target.id == target_id).first()
+        target = await db.get(Target, target_id)
         
         if not target:
             return {
@@ -174,13 +261,16 @@ def update_target(db: Session, target_id: int, name: str = None, imsi: str = Non
         
         # Check if new IMSI already exists (if IMSI is being updated)
         if imsi and imsi != target.imsi:
-            existing_target = db.query(Target).filter(Target.imsi == imsi).first()
+            existing_target = (await db.execute(select(Target.id).filter(Target.imsi == imsi))).first()
             if existing_target:
                 return {
                     "status": "error",
                     "message": f"Target with IMSI {imsi} already exists"
                 }
         
+        old_imsi = target.imsi
+        old_status = target.target_status
+        
         # Update fields if provided
         if name is not None:
             target.name = name
@@ -194,10 +284,25 @@ def update_target(db: Session, target_id: int, name: str = None, imsi: str = Non
         # Update timestamp
         target.updated_at = func.now()
         
-        db.commit()
-        db.refresh(target)
+        await db.run_sync(
+            apply_target_changes,
+            [_target_snapshot(target)],
+            removed=[old_imsi] if old_imsi != target.imsi else []
+        )
+        await db.commit()
+        await db.refresh(target)
+        target_cache.invalidate()
+        
+        # IMSI lama / target yang jadi Inactive dikeluarkan dari black/white list
+        # device campaign yang berjalan, IMSI baru / target yang jadi Active ditambahkan
+        if old_imsi != target.imsi or old_status != target.target_status:
+            removed = [old_imsi] if old_imsi != target.imsi else []
+            if target.target_status != 'Active':
+                removed.append(target.imsi)
+            for campaign_id in await db.run_sync(get_running_campaign_ids):
+                await propagate_target_delta(db, campaign_id, added=[target], removed=removed)
         
-        add_log(db, f"Target '{target.name}' updated", "info", "User")
+        await db.run_sync(add_log, f"Target '{target.name}' updated", "info", "User")
         return {
             "status": "success",
             "message": "Target updated successfully",
@@ -212,91 +317,157 @@ def update_target(db: Session, target_id: int, name: str = None, imsi: str = Non
             }
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {
             "status": "error",
             "message": f"Error updating target: {str(e)}"
         }
 
 
-def import_targets_from_xlsx(db: Session, file_content: bytes) -> Dict[str, Any]:
+def _read_rows(fileobj: BinaryIO, filename: str) -> Iterator[Sequence[Any]]:
+    """Baris file import satu per satu (XLSX read-only / CSV), tanpa load seluruh file"""
+    if filename.lower().endswith(".csv"):
+        text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        try:
+            sample = text.read(4096)
+            text.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            yield from csv.reader(text, dialect)
+        finally:
+            # Jangan ikut menutup file upload
+            text.detach()
+        return
+
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _cell_str(row: Sequence[Any], idx: Optional[int]) -> Optional[str]:
+    if idx is None or idx >= len(row) or row[idx] is None:
+        return None
+    value = row[idx]
+    # IMSI di XLSX sering tersimpan sebagai angka
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def _insert_ignore_targets(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(Target).on_conflict_do_nothing()
+    return sqlite.insert(Target).on_conflict_do_nothing()
+
+
+def iter_import_targets(db: Session, fileobj: BinaryIO, filename: str, chunk_size: int = TARGET_IMPORT_CHUNK) -> Iterator[Dict[str, Any]]:
     """
-    Import targets from XLSX file
+    Import target dari XLSX / CSV secara streaming.
     Expected columns: name, imsi, alert_status (optional), target_status (optional)
+
+    Per chunk: cek IMSI yang sudah ada dengan satu query IN, bulk insert
+    sisanya (ON CONFLICT DO NOTHING), commit, lalu yield progress
+    {"status": "progress", ...}. Item terakhir adalah hasil akhir.
     """
     imported = 0
     failed = 0
-    errors = []
-    
+    processed = 0
+    errors: List[str] = []
+
+    def add_error(message: str):
+        if len(errors) < MAX_IMPORT_ERRORS:
+            errors.append(message)
+
+    def flush(batch: List[Dict[str, Any]]):
+        nonlocal imported, failed
+        imsis = [item["imsi"] for item in batch]
+        existing = set(db.scalars(select(Target.imsi).where(Target.imsi.in_(imsis))))
+        new_rows = []
+        row_nums = {}
+        for item in batch:
+            row_num = item.pop("row_num")
+            if item["imsi"] in existing:
+                add_error(f"Row {row_num}: IMSI {item['imsi']} already exists")
+                failed += 1
+            else:
+                row_nums[item["imsi"]] = row_num
+                new_rows.append(item)
+        if new_rows:
+            # RETURNING hanya berisi row yang benar-benar di-insert, IMSI yang
+            # masuk lebih dulu dari request lain dilewati ON CONFLICT
+            inserted = set(db.scalars(_insert_ignore_targets(db).returning(Target.imsi), new_rows))
+            for item in new_rows:
+                if item["imsi"] not in inserted:
+                    add_error(f"Row {row_nums[item['imsi']]}: IMSI {item['imsi']} already exists")
+                    failed += 1
+            new_rows = [item for item in new_rows if item["imsi"] in inserted]
+            apply_target_changes(db, new_rows)
+        db.commit()
+        imported += len(new_rows)
+
     try:
-        # Load workbook from bytes
-        workbook = openpyxl.load_workbook(BytesIO(file_content))
-        sheet = workbook.active
-        
-        # Get header row (assuming first row is header)
-        headers = []
-        for cell in sheet[1]:
-            headers.append(cell.value.lower() if cell.value else "")
-        
-        # Validate required columns
+        rows = _read_rows(fileobj, filename)
+        header = next(rows, None) or ()
+        headers = [str(cell).strip().lower() if cell is not None else "" for cell in header]
+
         if "name" not in headers or "imsi" not in headers:
-            return {
+            yield {
                 "status": "error",
-                "message": "XLSX file must contain 'name' and 'imsi' columns",
+                "message": "File must contain 'name' and 'imsi' columns",
                 "imported": 0,
                 "failed": 0,
                 "errors": ["Missing required columns: name and/or imsi"]
             }
-        
-        # Get column indices
+            return
+
         name_idx = headers.index("name")
         imsi_idx = headers.index("imsi")
         alert_status_idx = headers.index("alert_status") if "alert_status" in headers else None
         target_status_idx = headers.index("target_status") if "target_status" in headers else None
-        
-        # Process each row (skip header)
-        for row_num, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-            try:
-                name = row[name_idx]
-                imsi = row[imsi_idx]
-                
-                # Skip empty rows
-                if not name or not imsi:
-                    continue
-                
-                # Convert to string
-                name = str(name).strip()
-                imsi = str(imsi).strip()
-                
-                alert_status = str(row[alert_status_idx]).strip() if alert_status_idx is not None and row[alert_status_idx] else None
-                target_status = str(row[target_status_idx]).strip() if target_status_idx is not None and row[target_status_idx] else None
-                
-                # Check if IMSI already exists
-                existing_target = db.query(Target).filter(Target.imsi == imsi).first()
-                if existing_target:
-                    errors.append(f"Row {row_num}: IMSI {imsi} already exists")
-                    failed += 1
-                    continue
-                
-                # Create new target
-                new_target = Target(
-                    name=name,
-                    imsi=imsi,
-                    alert_status=alert_status,
-                    target_status=target_status
-                )
-                
-                db.add(new_target)
-                imported += 1
-                
-            except Exception as e:
-                errors.append(f"Row {row_num}: {str(e)}")
+
+        seen = set()
+        batch: List[Dict[str, Any]] = []
+        for row_num, row in enumerate(rows, start=2):
+            processed += 1
+            name = _cell_str(row, name_idx)
+            imsi = _cell_str(row, imsi_idx)
+
+            # Skip empty rows
+            if not name or not imsi:
+                continue
+
+            if imsi in seen:
+                add_error(f"Row {row_num}: IMSI {imsi} duplicated in file")
                 failed += 1
-        
-        # Commit all changes
-        db.commit()
-        add_log(db, f"Imported {imported} targets from XLSX", "info", "User")
-        return {
+                continue
+            seen.add(imsi)
+
+            batch.append({
+                "row_num": row_num,
+                "name": name,
+                "imsi": imsi,
+                "alert_status": _cell_str(row, alert_status_idx),
+                "target_status": _cell_str(row, target_status_idx)
+            })
+            if len(batch) >= chunk_size:
+                flush(batch)
+                batch = []
+                logger.info(f"[TargetImport] {filename}: {processed} rows, {imported} imported, {failed} failed")
+                yield {"status": "progress", "rows": processed, "imported": imported, "failed": failed}
+
+        if batch:
+            flush(batch)
+
+        if failed > len(errors):
+            errors.append(f"... {failed - len(errors)} more errors")
+        target_cache.invalidate()
+        add_log(db, f"Imported {imported} targets from {filename}", "info", "User")
+        yield {
             "status": "success",
             "message": f"Import completed: {imported} imported, {failed} failed",
             "imported": imported,
@@ -305,21 +476,31 @@ def import_targets_from_xlsx(db: Session, file_content: bytes) -> Dict[str, Any]
         }
     except Exception as e:
         db.rollback()
-        return {
+        if imported:
+            # Chunk sebelumnya sudah di-commit
+            target_cache.invalidate()
+        yield {
             "status": "error",
-            "message": f"Error importing XLSX: {str(e)}",
-            "imported": 0,
-            "failed": 0,
-            "errors": [str(e)]
+            "message": f"Error importing file after {imported} imported rows: {str(e)}",
+            "imported": imported,
+            "failed": failed,
+            "errors": errors + [str(e)]
         }
 
 
-def delete_target(db: Session, target_id: int) -> Dict[str, Any]:
+def import_targets_from_file(db: Session, fileobj: BinaryIO, filename: str) -> Dict[str, Any]:
+    result = None
+    for result in iter_import_targets(db, fileobj, filename):
+        pass
+    return result
+
+
+async def delete_target(db: AsyncSession, target_id: int) -> Dict[str, Any]:
     """
     Delete a target by ID
     """
     try:
-        target = db.query(Target).filter(Target.id == target_id).first()
+        target = await db.get(Target, target_id)
         
         if not target:
             return {
@@ -338,17 +519,23 @@ def delete_target(db: Session, target_id: int) -> Dict[str, Any]:
             "updated_at": target.updated_at.isoformat() if target.updated_at else ""
         }
         
-        db.delete(target)
-        db.commit()
+        await db.delete(target)
+        await db.run_sync(apply_target_changes, removed=[target_data["imsi"]])
+        await db.commit()
+        target_cache.invalidate()
         
-        add_log(db, f"Target '{target.name}' deleted", "info", "User")
+        # IMSI yang dihapus dikeluarkan dari black/white list device campaign yang berjalan
+        for campaign_id in await db.run_sync(get_running_campaign_ids):
+            await propagate_target_delta(db, campaign_id, removed=[target_data["imsi"]])
+        
+        await db.run_sync(add_log, f"Target '{target_data['name']}' deleted", "info", "User")
         return {
             "status": "success",
             "message": "Target deleted successfully",
             "data": target_data
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {
             "status": "error",
             "message": f"Error deleting target: {str(e)}"
@@ -7,12 +7,24 @@ from typing import Dict, Optional, List
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
-from app.db.database import SessionLocal
-from app.db.models import Campaign, Target, Heartbeat, Operator
+from app.db.database import BackgroundSessionLocal
+from app.db.models import Campaign, Heartbeat, Operator
+from app.service.campaign_target_service import get_active_imsis
 from app.service.utils_service import get_send_command_instance, provider_mapping
 from app.service.wb_status_service import update_wb_status
 from app.utils.logger import setup_logger
 from app.service.log_service import add_log
+from app.ws.relay import forward_to_ingest
+
+
+def _set_wb_status(status: bool):
+    # Session ditutup supaya koneksi kembali ke pool
+    db = BackgroundSessionLocal()
+    try:
+        update_wb_status(db, status)
+    finally:
+        db.close()
+
 
 class TimerOps:
     def __init__(self):
@@ -62,29 +74,12 @@ class TimerOps:
             return 0
     
     def get_active_target_imsis(self, db: Session, campaign_id: int) -> List[str]:
-        campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-        if not campaign or not campaign.imsi:
+        # Snapshot target campaign sudah di-update incremental oleh perubahan target
+        imsis = get_active_imsis(db, campaign_id)
+        if not imsis:
             self.logger.warning(f"[Timer] No campaign found or no IMSI data for campaign {campaign_id}")
             return []
         
-        imsis = [imsi.strip() for imsi in campaign.imsi.split(',') if imsi.strip()]
-        
-        all_targets = db.query(Target).all()
-        
-        target_info_list = []
-        for target in all_targets:
-            target_info_list.append({
-                "name": target.name,
-                "imsi": target.imsi,
-                "alert_status": target.alert_status,
-                "target_status": target.target_status
-            })
-        
-        if target_info_list:
-            campaign.target_info = target_info_list
-            db.commit()
-            self.logger.info(f"[Timer] Updated target_info for campaign {campaign_id} with {len(target_info_list)} targets (ALL DB targets)")
-        
         self.logger.debug(f"[Timer] Retrieved {len(imsis)} IMSI(s) from campaign {campaign_id}: {imsis}")
         return imsis
     
@@ -195,7 +190,7 @@ class TimerOps:
     
     async def _simple_timer_cycle(self, campaign_id: int, mode: str, duration_seconds: int, initial_elapsed: float = 0):
         """Simple timer for 'all' and 'df' modes - just countdown and auto-stop"""
-        db = SessionLocal()
+        db = BackgroundSessionLocal()
         try:
             # Adjust start time if resuming
             start_time = time.time() - initial_elapsed
@@ -239,7 +234,7 @@ class TimerOps:
     
     async def _timer_cycle(self, campaign_id: int, mode: str, duration_seconds: int, initial_elapsed: float = 0):
         """Timer cycle for whitelist/blacklist modes with cycling logic"""
-        db = SessionLocal()
+        db = BackgroundSessionLocal()
         try:
             start_time = time.time() - initial_elapsed
             self.is_running[campaign_id] = True
@@ -379,6 +374,10 @@ class TimerOps:
     
     def start_timer(self, campaign_id: int, mode: str, duration: str, initial_elapsed: float = 0):
         """Start timer for campaign based on mode"""
+        # Mode multi-worker: timer hanya berjalan di proses ingest
+        if forward_to_ingest("timer_start", campaign_id=campaign_id, mode=mode, duration=duration, initial_elapsed=initial_elapsed):
+            return
+
         self.stop_timer(campaign_id)
         
         # Parse duration
@@ -398,11 +397,14 @@ class TimerOps:
         
         task = asyncio.create_task(coro)
         self.active_timers[campaign_id] = task
-        update_wb_status(SessionLocal(), True)
+        _set_wb_status(True)
         self.logger.info(f"[Timer] Started timer for campaign {campaign_id}, mode: {mode}, duration: {duration} (initial elapsed: {initial_elapsed}s)")
     
     def stop_timer(self, campaign_id: int):
         """Stop timer for a campaign"""
+        if forward_to_ingest("timer_stop", campaign_id=campaign_id):
+            return
+
         if campaign_id in self.is_running:
             self.is_running[campaign_id] = False
         
@@ -446,7 +448,7 @@ class TimerOps:
 
     def stop_all_timers(self):
         """Stop all active timers"""
-        update_wb_status(SessionLocal(), False)
+        _set_wb_status(False)
         for campaign_id in list(self.active_timers.keys()):
             self.stop_timer(campaign_id)
 
@@ -1,10 +1,9 @@
 """
 Service layer - Business logic dan helper functions
 """
-from typing import List, Dict
+from typing import List, Dict, Set
 import os
 from sqlalchemy.orm import Session
-from app.db.database import SessionLocal
 from app.db.models import FreqOperator, Heartbeat, Crawling, GPS, Operator
 import xml.etree.ElementTree as ET
 
@@ -49,6 +48,26 @@ def get_exception_ips(db: Session) -> dict:
         'other_ips': other_ips
     }
 
+def get_channel_plmns(db: Session) -> Dict[str, Set[str]]:
+    """
+    PLMN (MCC+MNC) yang dilayani tiap IP: dari Operator.ip, atau mcc/mnc
+    heartbeat (bisa lebih dari satu, dipisah koma). Set kosong = belum diketahui.
+    """
+    plmns: Dict[str, Set[str]] = {}
+    for ip, mcc, mnc in db.query(Operator.ip, Operator.mcc, Operator.mnc).filter(Operator.ip.isnot(None)):
+        if mcc and mnc:
+            plmns.setdefault(ip, set()).add(f"{mcc}{mnc}")
+
+    for ip, mcc, mnc in db.query(Heartbeat.source_ip, Heartbeat.mcc, Heartbeat.mnc):
+        entry = plmns.setdefault(ip, set())
+        if entry or not (mcc and mnc):
+            continue
+        for c_mcc, c_mnc in zip(mcc.split(','), mnc.split(',')):
+            if c_mcc.strip() and c_mnc.strip():
+                entry.add(c_mcc.strip() + c_mnc.strip())
+    return plmns
+
+
 def validate_token(token: str) -> bool:
     """Validasi token"""
     from app.config.utils import token_bbu
@@ -199,91 +218,90 @@ def provider_mapping(imsi: str) -> str:
 def parse_xml(xml_path, mode):
     if os.path.isfile(xml_path) and os.path.getsize(xml_path) > 0:
         tree = ET.parse(xml_path)
-        root = tree.getroot()
+        return parse_xml_root(tree.getroot(), mode)
 
-        if mode == "GSM-WB":
-            mccgsm_values = []
-            mncgsm_values = []
-            arfcngsm_values = []
+    else:
+        print(f"File XML kosong: {xml_path}. Tidak ada eksekusi yang dilakukan.")
+        return None
 
-            for itemgms in root.findall('.//item'):
-                mccgsm = itemgms.find('mcc').text
-                mccgsm_values.append(mccgsm)
 
-                mncgsm = itemgms.find('mnc').text.strip()
-                mncgsm_values.append(mncgsm.zfill(2))
+def parse_xml_root(root, mode):
+    """Ambil mcc/mnc/frequency/band dari root CellPara yang sudah di-parse"""
+    if mode == "GSM-WB":
+        mccgsm_values = []
+        mncgsm_values = []
+        arfcngsm_values = []
 
-                arfcngsm = itemgms.find("./arfcnList/arfcn").text
-                arfcngsm_values.append(arfcngsm)
+        for itemgms in root.findall('.//item'):
+            mccgsm = itemgms.find('mcc').text
+            mccgsm_values.append(mccgsm)
 
-            output_mcc = ','.join(mccgsm_values)
-            output_mnc = ','.join(mncgsm_values)
-            output_arfcn = ','.join(arfcngsm_values)
+            mncgsm = itemgms.find('mnc').text.strip()
+            mncgsm_values.append(mncgsm.zfill(2))
 
-            return {"mcc": output_mcc, "mnc": output_mnc, "frequency": output_arfcn, "band": 0}
-        
-        elif mode == "GSM":
-            mcc_gsm = root.find('.//mcc').text.strip()
-            mnc_gsm = root.find('.//mnc').text.strip()
-            arfcn_gsm = root.find('.//arfcn').text.strip()
+            arfcngsm = itemgms.find("./arfcnList/arfcn").text
+            arfcngsm_values.append(arfcngsm)
 
-            return {"mcc": mcc_gsm, "mnc": mnc_gsm, "frequency": arfcn_gsm, "band": 0}
-        
-        elif mode == "WCDMA":
-            mcc_node = root.find(".//sib/mcc")
-            mnc_node = root.find(".//sib/mnc")
+        output_mcc = ','.join(mccgsm_values)
+        output_mnc = ','.join(mncgsm_values)
+        output_arfcn = ','.join(arfcngsm_values)
 
-            def digits_to_str(node_text: str) -> str:
-                return "".join(node_text.split())
+        return {"mcc": output_mcc, "mnc": output_mnc, "frequency": output_arfcn, "band": 0}
+    
+    elif mode == "GSM":
+        mcc_gsm = root.find('.//mcc').text.strip()
+        mnc_gsm = root.find('.//mnc').text.strip()
+        arfcn_gsm = root.find('.//arfcn').text.strip()
 
-            mcc_wcdma = digits_to_str(mcc_node.text.strip()) if mcc_node is not None and mcc_node.text else ""
-            mnc_wcdma_raw = digits_to_str(mnc_node.text.strip()) if mnc_node is not None and mnc_node.text else ""
+        return {"mcc": mcc_gsm, "mnc": mnc_gsm, "frequency": arfcn_gsm, "band": 0}
+    
+    elif mode == "WCDMA":
+        mcc_node = root.find(".//sib/mcc")
+        mnc_node = root.find(".//sib/mnc")
 
-            mnc_wcdma = mnc_wcdma_raw.zfill(2) if mnc_wcdma_raw else ""
+        def digits_to_str(node_text: str) -> str:
+            return "".join(node_text.split())
 
-            urfcn_node = root.find(".//urfcn")
+        mcc_wcdma = digits_to_str(mcc_node.text.strip()) if mcc_node is not None and mcc_node.text else ""
+        mnc_wcdma_raw = digits_to_str(mnc_node.text.strip()) if mnc_node is not None and mnc_node.text else ""
 
-            frequency = None
-            frequency = urfcn_node.text.strip()
-            return {
-                "mcc": mcc_wcdma,
-                "mnc": mnc_wcdma,
-                "frequency": frequency,
-                "band": 0
-            }
+        mnc_wcdma = mnc_wcdma_raw.zfill(2) if mnc_wcdma_raw else ""
 
-        else:
-            mcc = root.find('.//mcc').text.strip()
-            mnc = root.find('.//mnc').text.strip()
-            # Format MNC to ensure two digits
-            mnc = mnc.zfill(2)
-            band = root.find('.//band').text.strip()
+        urfcn_node = root.find(".//urfcn")
+
+        frequency = None
+        frequency = urfcn_node.text.strip()
+        return {
+            "mcc": mcc_wcdma,
+            "mnc": mnc_wcdma,
+            "frequency": frequency,
+            "band": 0
+        }
 
-            urfcn = root.find('.//urfcn')
-            arfcn = root.find('.//arfcn')
-            erfcn = root.find('.//erfcn')
+    else:
+        mcc = root.find('.//mcc').text.strip()
+        mnc = root.find('.//mnc').text.strip()
+        # Format MNC to ensure two digits
+        mnc = mnc.zfill(2)
+        band = root.find('.//band').text.strip()
 
-            frequency = (erfcn.text.strip() if erfcn is not None else
-                         arfcn.text.strip() if arfcn is not None else
-                         urfcn.text.strip() if urfcn is not None else None)
+        urfcn = root.find('.//urfcn')
+        arfcn = root.find('.//arfcn')
+        erfcn = root.find('.//erfcn')
 
-            return {"mcc": mcc, "mnc": mnc, "frequency": frequency, "band": band}
+        frequency = (erfcn.text.strip() if erfcn is not None else
+                     arfcn.text.strip() if arfcn is not None else
+                     urfcn.text.strip() if urfcn is not None else None)
 
-    else:
-        print(f"File XML kosong: {xml_path}. Tidak ada eksekusi yang dilakukan.")
-        return None
-    
-def get_frequency(ip):
-    db = SessionLocal()
-    try:
-        heartbeat_data = db.query(Heartbeat).filter(Heartbeat.source_ip == ip).first()
-        if heartbeat_data:
-            return {
-                "arfcn": heartbeat_data.arfcn, 
-                "ul_freq": heartbeat_data.ul_freq, 
-                "dl_freq": heartbeat_data.dl_freq,
-                "mode": heartbeat_data.mode
-            }
-        return None
-    finally:
-        db.close()
+        return {"mcc": mcc, "mnc": mnc, "frequency": frequency, "band": band}
+
+def get_frequency(db: Session, ip):
+    heartbeat_data = db.query(Heartbeat).filter(Heartbeat.source_ip == ip).first()
+    if heartbeat_data:
+        return {
+            "arfcn": heartbeat_data.arfcn, 
+            "ul_freq": heartbeat_data.ul_freq, 
+            "dl_freq": heartbeat_data.dl_freq,
+            "mode": heartbeat_data.mode
+        }
+    return None
@@ -0,0 +1,198 @@
+"""
+Store konfigurasi XML per device (GetCellParaRsp / GetAppCfgExtRsp).
+
+Response di-parse sekali saat datagram diterima, disimpan di memori dengan
+nomor versi per (xml_type, ip), dan menandai waiter yang menunggu response
+baru. File di app/xml_file tetap ditulis (thread writer terpisah) supaya
+config tidak hilang saat restart dan bisa dibaca proses lain (worker API /
+shard ingest) yang tidak menerima datagram-nya sendiri.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+from app.service.utils_service import build_xml_path, parse_xml_root
+from app.ws import runtime
+
+
+class XmlConfigEntry:
+    __slots__ = ("xml_type", "ip", "version", "raw", "root", "received_at", "disk_mtime_ns", "_fields")
+
+    def __init__(self, xml_type: str, ip: str, version: int, raw: bytes, root: ET.Element, received_at: float):
+        self.xml_type = xml_type
+        self.ip = ip
+        self.version = version
+        self.raw = raw
+        self.root = root
+        self.received_at = received_at
+        self.disk_mtime_ns = None
+        self._fields: Dict[str, Optional[Dict]] = {}
+
+    def fields(self, mode: str) -> Optional[Dict]:
+        """mcc/mnc/frequency/band sesuai mode device (di-cache per mode)"""
+        if mode not in self._fields:
+            try:
+                self._fields[mode] = parse_xml_root(self.root, mode)
+            except Exception as e:
+                print(f"[XML CONFIG] Gagal parse field {self.xml_type} {self.ip} mode {mode}: {e}")
+                self._fields[mode] = None
+        return self._fields[mode]
+
+    @property
+    def xml(self) -> str:
+        return self.raw.decode("utf-8", errors="replace")
+
+
+class XmlConfigStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], XmlConfigEntry] = {}
+        self._versions: Dict[Tuple[str, str], int] = {}
+        self._waiters: Dict[Tuple[str, str], List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._persist_queue: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+        self._persist_pending = set()
+        self._writer = None
+
+    def _shared(self) -> bool:
+        """Response bisa diterima proses lain: cek file di disk saat get()"""
+        return runtime.process_role != runtime.ROLE_SINGLE or runtime.ingest_shards > 1
+
+    def update(self, xml_type: str, ip: str, raw, persist: bool = True) -> Optional[XmlConfigEntry]:
+        """Simpan response baru (bytes/memoryview XML), return entry atau None jika XML rusak"""
+        raw = bytes(raw)
+        try:
+            root = ET.fromstring(raw)
+        except ET.ParseError as e:
+            print(f"[XML CONFIG] XML {xml_type} dari {ip} tidak valid: {e}")
+            return None
+
+        key = (xml_type, ip)
+        with self._lock:
+            version = self._versions.get(key, 0) + 1
+            self._versions[key] = version
+            entry = XmlConfigEntry(xml_type, ip, version, raw, root, time.time())
+            self._entries[key] = entry
+            waiters = self._waiters.pop(key, [])
+
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future, entry)
+
+        if persist:
+            self._schedule_persist(key)
+        return entry
+
+    def get(self, xml_type: str, ip: str) -> Optional[XmlConfigEntry]:
+        key = (xml_type, ip)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and not self._shared():
+            return entry
+        return self._load_from_disk(key, entry)
+
+    def version(self, xml_type: str, ip: str) -> int:
+        entry = self.get(xml_type, ip)
+        return entry.version if entry else 0
+
+    async def wait_for(self, xml_type: str, ip: str, after_version: int, timeout: float) -> Optional[XmlConfigEntry]:
+        """Tunggu response dengan versi > after_version, None jika timeout"""
+        key = (xml_type, ip)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while True:
+            entry = self.get(xml_type, ip)
+            if entry is not None and entry.version > after_version:
+                return entry
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+
+            future = loop.create_future()
+            with self._lock:
+                self._waiters.setdefault(key, []).append((loop, future))
+            # Di mode multi proses response masuk lewat file, cek ulang berkala
+            wait = min(remaining, 0.2) if self._shared() else remaining
+            try:
+                await asyncio.wait_for(asyncio.shield(future), wait)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    waiters = self._waiters.get(key)
+                    if waiters and (loop, future) in waiters:
+                        waiters.remove((loop, future))
+                        if not waiters:
+                            del self._waiters[key]
+
+    def _load_from_disk(self, key: Tuple[str, str], entry: Optional[XmlConfigEntry]) -> Optional[XmlConfigEntry]:
+        xml_type, ip = key
+        path = build_xml_path(xml_type, ip)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return entry
+        # File milik sendiri, atau lebih lama dari entry yang belum selesai ditulis
+        if entry is not None and (entry.disk_mtime_ns == mtime_ns or mtime_ns <= entry.received_at * 1e9):
+            return entry
+
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+        except OSError:
+            return entry
+        if not raw.strip():
+            return entry
+
+        loaded = self.update(xml_type, ip, raw, persist=False)
+        if loaded is None:
+            return entry
+        loaded.disk_mtime_ns = mtime_ns
+        return loaded
+
+    def _schedule_persist(self, key: Tuple[str, str]):
+        with self._lock:
+            if key in self._persist_pending:
+                # Writer belum jalan untuk key ini, cukup tulis versi terbaru sekali
+                return
+            self._persist_pending.add(key)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._persist_loop, name="XmlConfigWriter", daemon=True)
+                self._writer.start()
+        self._persist_queue.put(key)
+
+    def _persist_loop(self):
+        while True:
+            key = self._persist_queue.get()
+            with self._lock:
+                self._persist_pending.discard(key)
+                entry = self._entries.get(key)
+            if entry is None:
+                continue
+            try:
+                self._write(entry)
+            except OSError as e:
+                print(f"[XML CONFIG] Gagal simpan {entry.xml_type} {entry.ip}: {e}")
+
+    def _write(self, entry: XmlConfigEntry):
+        path = build_xml_path(entry.xml_type, entry.ip)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(entry.raw)
+        # Rename atomik: pembaca di proses lain tidak pernah melihat file setengah jadi
+        os.replace(tmp_path, path)
+        entry.disk_mtime_ns = os.stat(path).st_mtime_ns
+        print("File XML telah dibuat di:", os.path.abspath(path))
+
+
+def _resolve(future: asyncio.Future, entry: XmlConfigEntry):
+    if not future.done():
+        future.set_result(entry)
+
+
+xml_config_store = XmlConfigStore()
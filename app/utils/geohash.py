@@ -0,0 +1,87 @@
+"""
+Geohash (base32) untuk index spasial di b-tree biasa.
+
+Titik yang berdekatan punya prefix geohash yang sama, jadi area query bisa
+diubah menjadi beberapa range scan prefix (geohash >= p AND geohash < p~)
+lalu difilter jarak sebenarnya.
+"""
+import math
+from typing import List, Optional, Tuple
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 9  # ~4.8 m x 4.8 m
+# Karakter setelah 'z' (ASCII), batas atas range scan prefix
+PREFIX_END = "{"
+
+
+def encode(lat: float, lon: float, precision: int = PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(tinggi lat, lebar lon) satu cell dalam derajat"""
+    total = 5 * precision
+    lon_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def cover_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float, max_cells: int = 16) -> List[str]:
+    """
+    Prefix geohash yang menutupi bbox, dengan presisi setinggi mungkin
+    selama jumlah cell <= max_cells.
+    """
+    for precision in range(PRECISION, 0, -1):
+        lat_h, lon_w = cell_size(precision)
+        rows = int(math.floor(max_lat / lat_h) - math.floor(min_lat / lat_h)) + 1
+        cols = int(math.floor(max_lon / lon_w) - math.floor(min_lon / lon_w)) + 1
+        if rows * cols > max_cells and precision > 1:
+            continue
+        cells = set()
+        for i in range(rows):
+            lat = min(min_lat + i * lat_h, max_lat)
+            for j in range(cols):
+                lon = min(min_lon + j * lon_w, max_lon)
+                cells.add(encode(lat, lon, precision))
+        # Sudut atas/kanan bisa jatuh di cell berikutnya karena pembulatan
+        cells.add(encode(max_lat, max_lon, precision))
+        cells.add(encode(max_lat, min_lon, precision))
+        cells.add(encode(min_lat, max_lon, precision))
+        return sorted(cells)
+    return [""]
+
+
+def bbox_around(lat: float, lon: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """bbox (min_lat, min_lon, max_lat, max_lon) yang memuat lingkaran radius_m"""
+    dlat = radius_m / 110540.0
+    dlon = radius_m / (111320.0 * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+def to_float(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import Optional
+
+# Format timestamp string yang dipakai BBU ingest, API dan websocket
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_local(value) -> Optional[datetime]:
+    """String TIME_FORMAT (waktu lokal server) -> datetime aware, None jika tidak valid"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return as_local(value)
+    try:
+        return datetime.strptime(value, TIME_FORMAT).astimezone()
+    except (TypeError, ValueError):
+        return None
+
+
+def as_local(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Normalisasi datetime dari DB ke waktu lokal aware. SQLite mengembalikan
+    naive (disimpan sebagai waktu lokal), Postgres aware (timestamptz).
+    """
+    if value is None:
+        return None
+    return value.astimezone()
@@ -0,0 +1,82 @@
+"""
+Encoding frame WebSocket.
+Event di-serialize sekali per encoding (bukan per client) lalu frame yang
+sama dikirim ke semua subscriber. JSON memakai orjson jika tersedia,
+msgpack (binary) opsional lewat query parameter ?encoding=msgpack.
+"""
+import json
+from typing import Any, Dict
+from fastapi import WebSocket
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - fallback ke stdlib json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack opsional
+    msgpack = None
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+
+def available_encodings() -> list:
+    encodings = [ENCODING_JSON]
+    if msgpack is not None:
+        encodings.append(ENCODING_MSGPACK)
+    return encodings
+
+
+def resolve_encoding(encoding: str | None) -> str:
+    """Validasi encoding dari query parameter, default json"""
+    encoding = (encoding or ENCODING_JSON).lower()
+    if encoding not in available_encodings():
+        raise ValueError(
+            f"Encoding '{encoding}' tidak didukung. Encoding yang tersedia: {', '.join(available_encodings())}"
+        )
+    return encoding
+
+
+def encode_json(data: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, default=str)
+
+
+def decode_json(payload) -> Any:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def _encode_msgpack(data: Any) -> bytes:
+    return msgpack.packb(data, default=str, use_bin_type=True)
+
+
+class Frame:
+    """Satu event yang sudah/akan di-serialize, di-cache per encoding"""
+    __slots__ = ("data", "_encoded")
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self._encoded: Dict[str, Any] = {}
+
+    def encode(self, encoding: str = ENCODING_JSON):
+        payload = self._encoded.get(encoding)
+        if payload is None:
+            if encoding == ENCODING_MSGPACK:
+                payload = _encode_msgpack(self.data)
+            else:
+                payload = encode_json(self.data)
+            self._encoded[encoding] = payload
+        return payload
+
+
+async def send_frame(websocket: WebSocket, frame: Frame, encoding: str = ENCODING_JSON):
+    payload = frame.encode(encoding)
+    if encoding == ENCODING_MSGPACK:
+        await websocket.send_bytes(payload)
+    else:
+        await websocket.send_text(payload)
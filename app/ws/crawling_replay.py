@@ -0,0 +1,142 @@
+"""
+Ring buffer event crawling untuk replay saat reconnect /ws/data_imsi.
+Setiap event crawling diberi sequence number yang naik terus (global),
+lalu disimpan di buffer terbatas per campaign. Client yang reconnect
+dengan ?since=<seq>&boot=<boot> hanya menerima event yang terlewat; jika
+event yang dibutuhkan sudah keluar dari buffer, client dikirimi snapshot.
+
+Seq mulai lagi dari 1 setiap proses ingest start, jadi setiap frame juga
+membawa boot id acak per proses. Resume dengan boot yang berbeda (server
+restart) selalu dijawab snapshot.
+"""
+import secrets
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.config.utils import CRAWLING_REPLAY_BUFFER, CRAWLING_REPLAY_CAMPAIGNS
+from app.ws.codec import Frame
+from app.ws.events import event_bus
+
+
+class CrawlingReplayBuffer:
+    def __init__(self, maxlen: int = CRAWLING_REPLAY_BUFFER, max_campaigns: int = CRAWLING_REPLAY_CAMPAIGNS):
+        self.maxlen = maxlen
+        self.max_campaigns = max_campaigns
+        self.boot_id = secrets.token_hex(8)
+        self._seq = 0
+        self._buffers: "OrderedDict[int, Deque[Tuple[int, Frame]]]" = OrderedDict()
+        # Seq terakhir yang sudah keluar dari buffer (per campaign & global)
+        self._evicted_upto: Dict[int, int] = {}
+        self._global_evicted_upto = 0
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def _reset(self, boot_id: str):
+        """Proses ingest restart: seq lama tidak berlaku lagi"""
+        self.boot_id = boot_id
+        self._seq = 0
+        self._buffers.clear()
+        self._evicted_upto.clear()
+        self._global_evicted_upto = 0
+
+    def record(self, data: Dict) -> Frame:
+        """Beri seq ke event crawling dan simpan di buffer campaign-nya"""
+        seq = data.get("seq")
+        if seq is None:
+            self._seq += 1
+            seq = self._seq
+            frame = Frame({**data, "seq": seq, "boot": self.boot_id})
+        else:
+            # Seq sudah diberikan proses ingest (mode multi-worker)
+            boot_id = data.get("boot")
+            if boot_id and boot_id != self.boot_id:
+                self._reset(boot_id)
+            self._seq = max(self._seq, seq)
+            frame = Frame(data)
+        campaign_id = data.get("campaign_id")
+
+        buffer = self._buffers.get(campaign_id)
+        if buffer is None:
+            buffer = deque()
+            self._buffers[campaign_id] = buffer
+            self._drop_old_campaigns()
+        else:
+            self._buffers.move_to_end(campaign_id)
+
+        if len(buffer) >= self.maxlen:
+            evicted_seq, _ = buffer.popleft()
+            self._evicted_upto[campaign_id] = evicted_seq
+            self._global_evicted_upto = max(self._global_evicted_upto, evicted_seq)
+        buffer.append((seq, frame))
+        return frame
+
+    def _drop_old_campaigns(self):
+        while len(self._buffers) > self.max_campaigns:
+            campaign_id, buffer = self._buffers.popitem(last=False)
+            if buffer:
+                self._global_evicted_upto = max(self._global_evicted_upto, buffer[-1][0])
+            self._evicted_upto.pop(campaign_id, None)
+
+    def since(
+            self,
+            since: int,
+            campaign_id: Optional[int] = None,
+            boot_id: Optional[str] = None
+        ) -> Optional[List[Frame]]:
+        """
+        Event dengan seq > since (urut). Return None jika boot id tidak
+        sama (server restart), seq tidak dikenal, atau ada event yang sudah
+        keluar dari buffer, sehingga client perlu snapshot.
+        """
+        if boot_id != self.boot_id or since > self._seq:
+            return None
+
+        if campaign_id is None:
+            if since < self._global_evicted_upto:
+                return None
+            frames = [
+                (seq, frame)
+                for buffer in self._buffers.values()
+                for seq, frame in buffer
+                if seq > since
+            ]
+            frames.sort(key=lambda item: item[0])
+            return [frame for _, frame in frames]
+
+        buffer = self._buffers.get(campaign_id)
+        if buffer is None:
+            return None if since < self._global_evicted_upto else []
+        if since < self._evicted_upto.get(campaign_id, 0):
+            return None
+        return [frame for seq, frame in buffer if seq > since]
+
+    def build_snapshot(self, campaign_id: Optional[int], seq: int) -> Dict:
+        """Snapshot campaign detail untuk client yang gap-nya melebihi buffer"""
+        if campaign_id is None:
+            # Tanpa filter campaign, client diminta reload sendiri
+            return {"type": "crawling_reset", "seq": seq, "boot": self.boot_id}
+
+        from app.db.database import SessionLocal
+        from app.service.campaign_service import get_campaign_detail
+
+        db = SessionLocal()
+        try:
+            result = get_campaign_detail(db, campaign_id)
+        finally:
+            db.close()
+        return {
+            "type": "crawling_snapshot",
+            "seq": seq,
+            "boot": self.boot_id,
+            "campaign_id": campaign_id,
+            "data": result.get("data")
+        }
+
+    async def publish(self, data: Dict):
+        """Simpan ke buffer lalu broadcast (dijalankan di event loop utama)"""
+        await event_bus.send_crawling(self.record(data))
+
+
+crawling_replay = CrawlingReplayBuffer()
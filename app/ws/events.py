@@ -3,16 +3,32 @@ Event bus untuk WebSocket real-time streaming
 Menerima data dari controller dan broadcast ke websocket clients
 """
 import asyncio
-from typing import Dict, List, Callable, Set
+from typing import Any, Dict, List, Callable, Optional, Set, Tuple, Union
 from fastapi import WebSocketDisconnect
 
+from app.ws.codec import Frame
+from app.ws.filters import CrawlingFilter, event_index_keys
+
 class EventBus:
     def __init__(self):
         """Initialize event bus dengan subscription management"""
         self.heartbeat_subscribers: Set[tuple] = set()  # Set of (id, callback)
-        self.crawling_subscribers: Set[tuple] = set()
+        # Crawling subscriber di-index berdasarkan key filter (campaign_id/ip/ch/provider)
+        self.crawling_subscribers: Dict[int, Tuple[Callable, Optional[CrawlingFilter]]] = {}
+        self._crawling_index: Dict[Tuple[str, Any], Set[int]] = {}
+        self._crawling_wildcard: Set[int] = set()
         self.sniffing_subscribers: Set[tuple] = set()
         self._next_id = 0
+        # Mode multi-worker: proses ingest meneruskan setiap event ke relay
+        self.forwarder: Optional[Callable] = None
+    
+    def _forward(self, channel: str, frame: Frame):
+        if self.forwarder is None:
+            return
+        try:
+            self.forwarder(channel, frame)
+        except Exception as e:
+            print(f"[ERROR] relay forward error: {e}")
     
     def _get_next_id(self) -> int:
         """Get unique ID untuk subscriber"""
@@ -29,15 +45,53 @@ class EventBus:
         """Unsubscribe dari heartbeat events"""
         self.heartbeat_subscribers = {(sid, cb) for sid, cb in self.heartbeat_subscribers if sid != sub_id}
     
-    def subscribe_crawling(self, callback: Callable) -> int:
-        """Subscribe untuk menerima crawling data, return subscriber ID"""
+    def subscribe_crawling(self, callback: Callable, crawling_filter: CrawlingFilter = None) -> int:
+        """Subscribe untuk menerima crawling data (opsional dengan filter), return subscriber ID"""
         sub_id = self._get_next_id()
-        self.crawling_subscribers.add((sub_id, callback))
+        self.crawling_subscribers[sub_id] = (callback, crawling_filter)
+
+        index_key = crawling_filter.index_key() if crawling_filter else None
+        if index_key is None:
+            self._crawling_wildcard.add(sub_id)
+        else:
+            self._crawling_index.setdefault(index_key, set()).add(sub_id)
         return sub_id
     
     def unsubscribe_crawling(self, sub_id: int):
         """Unsubscribe dari crawling events"""
-        self.crawling_subscribers = {(sid, cb) for sid, cb in self.crawling_subscribers if sid != sub_id}
+        entry = self.crawling_subscribers.pop(sub_id, None)
+        if entry is None:
+            return
+
+        _, crawling_filter = entry
+        index_key = crawling_filter.index_key() if crawling_filter else None
+        if index_key is None:
+            self._crawling_wildcard.discard(sub_id)
+            return
+
+        bucket = self._crawling_index.get(index_key)
+        if bucket is not None:
+            bucket.discard(sub_id)
+            if not bucket:
+                del self._crawling_index[index_key]
+
+    def _match_crawling(self, data: Dict) -> List[Tuple[int, Callable]]:
+        """Subscriber yang cocok: kandidat dari index lalu cek sisa filter"""
+        candidates = set(self._crawling_wildcard)
+        for key in event_index_keys(data):
+            bucket = self._crawling_index.get(key)
+            if bucket:
+                candidates |= bucket
+
+        matched = []
+        for sub_id in sorted(candidates):
+            entry = self.crawling_subscribers.get(sub_id)
+            if entry is None:
+                continue
+            callback, crawling_filter = entry
+            if crawling_filter is None or crawling_filter.matches(data):
+                matched.append((sub_id, callback))
+        return matched
     
     def subscribe_sniffing(self, callback: Callable) -> int:
         """Subscribe untuk menerima sniffing data, return subscriber ID"""
@@ -49,12 +103,14 @@ class EventBus:
         """Unsubscribe dari sniffing events"""
         self.sniffing_subscribers = {(sid, cb) for sid, cb in self.sniffing_subscribers if sid != sub_id}
     
-    async def send_heartbeat(self, data: Dict):
-        """Broadcast heartbeat data ke semua subscribers"""
+    async def send_heartbeat(self, data: Union[Dict, Frame]):
+        """Broadcast heartbeat data ke semua subscribers (di-serialize sekali per encoding)"""
+        frame = data if isinstance(data, Frame) else Frame(data)
+        self._forward("heartbeat", frame)
         dead_subs = []
-        for sub_id, callback in self.heartbeat_subscribers:
+        for sub_id, callback in list(self.heartbeat_subscribers):
             try:
-                await callback(data)
+                await callback(frame)
             except (WebSocketDisconnect, RuntimeError) as e:
                 # Connection closed, mark for removal
                 if "close message" in str(e) or isinstance(e, WebSocketDisconnect):
@@ -66,12 +122,14 @@ class EventBus:
         for sub_id in dead_subs:
             self.unsubscribe_heartbeat(sub_id)
     
-    async def send_crawling(self, data: Dict):
-        """Broadcast crawling data ke semua subscribers"""
+    async def send_crawling(self, data: Union[Dict, Frame]):
+        """Broadcast crawling data ke semua subscribers (di-serialize sekali per encoding)"""
+        frame = data if isinstance(data, Frame) else Frame(data)
+        self._forward("crawling", frame)
         dead_subs = []
-        for sub_id, callback in self.crawling_subscribers:
+        for sub_id, callback in self._match_crawling(frame.data):
             try:
-                await callback(data)
+                await callback(frame)
             except (WebSocketDisconnect, RuntimeError) as e:
                 if "close message" in str(e) or isinstance(e, WebSocketDisconnect):
                     dead_subs.append(sub_id)
@@ -81,12 +139,14 @@ class EventBus:
         for sub_id in dead_subs:
             self.unsubscribe_crawling(sub_id)
     
-    async def send_sniffing(self, data: Dict):
-        """Broadcast sniffing data ke semua subscribers"""
+    async def send_sniffing(self, data: Union[Dict, Frame]):
+        """Broadcast sniffing data ke semua subscribers (di-serialize sekali per encoding)"""
+        frame = data if isinstance(data, Frame) else Frame(data)
+        self._forward("sniffing", frame)
         dead_subs = []
-        for sub_id, callback in self.sniffing_subscribers:
+        for sub_id, callback in list(self.sniffing_subscribers):
             try:
-                await callback(data)
+                await callback(frame)
             except (WebSocketDisconnect, RuntimeError) as e:
                 if "close message" in str(e) or isinstance(e, WebSocketDisconnect):
                     dead_subs.append(sub_id)
@@ -0,0 +1,83 @@
+"""
+Filter subscription untuk event crawling (/ws/data_imsi).
+Filter di-compile saat subscribe: satu key equality (campaign_id, ip, ch,
+provider) dipakai sebagai index routing di event bus, sisanya (imsi prefix,
+alert only, min rsrp) dievaluasi hanya untuk subscriber kandidat.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+# Urutan prioritas key index (paling selektif dulu)
+INDEX_KEYS = ("campaign_id", "ip", "ch", "provider")
+
+
+def _normalize(key: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if key == "provider":
+        return str(value).strip().lower()
+    if key == "ch":
+        value = str(value).strip().upper()
+        return value if value.startswith("CH-") else f"CH-{value}"
+    return value
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CrawlingFilter:
+    __slots__ = ("equals", "imsi_prefix", "alert_only", "min_rsrp")
+
+    def __init__(
+        self,
+        campaign_id: int = None,
+        provider: str = None,
+        ip: str = None,
+        ch: str = None,
+        imsi_prefix: str = None,
+        alert_only: bool = False,
+        min_rsrp: float = None
+    ):
+        raw = {"campaign_id": campaign_id, "ip": ip, "ch": ch, "provider": provider}
+        self.equals: Dict[str, Any] = {
+            key: _normalize(key, value) for key, value in raw.items() if value not in (None, "")
+        }
+        self.imsi_prefix = imsi_prefix or None
+        self.alert_only = bool(alert_only)
+        self.min_rsrp = min_rsrp
+
+    def index_key(self) -> Optional[Tuple[str, Any]]:
+        """Key (field, value) untuk index routing, None = wildcard"""
+        for key in INDEX_KEYS:
+            if key in self.equals:
+                return key, self.equals[key]
+        return None
+
+    def matches(self, data: Dict) -> bool:
+        for key, expected in self.equals.items():
+            if _normalize(key, data.get(key)) != expected:
+                return False
+
+        if self.imsi_prefix and not str(data.get("imsi") or "").startswith(self.imsi_prefix):
+            return False
+
+        if self.alert_only and not data.get("alert_status"):
+            return False
+
+        if self.min_rsrp is not None:
+            rsrp = _to_float(data.get("rsrp"))
+            if rsrp is None or rsrp < self.min_rsrp:
+                return False
+
+        return True
+
+
+def event_index_keys(data: Dict):
+    """Semua key index yang dimiliki satu event crawling"""
+    for key in INDEX_KEYS:
+        value = data.get(key)
+        if value is not None:
+            yield key, _normalize(key, value)
@@ -0,0 +1,108 @@
+"""
+Coalescing heartbeat per device untuk /ws/heartbeat.
+State terakhir tiap IP disimpan di memory; event heartbeat hanya dikirim
+jika ada field yang berubah (selain timestamp). Full snapshot dikirim
+periodik dan langsung ke subscriber baru saat connect.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Set
+
+from app.config.utils import HEARTBEAT_SNAPSHOT_INTERVAL
+from app.ws.codec import Frame
+from app.ws.events import event_bus
+
+# Field yang tidak dianggap perubahan state
+IGNORED_FIELDS = ("type", "timestamp")
+
+
+class HeartbeatCoalescer:
+    def __init__(self, snapshot_interval: float = HEARTBEAT_SNAPSHOT_INTERVAL):
+        self.snapshot_interval = snapshot_interval
+        self._latest: Dict[str, Dict] = {}
+        # IP yang state-nya hanya dari seed (DB), heartbeat pertamanya tetap dikirim
+        self._seeded: Set[str] = set()
+        self._snapshot_frame: Optional[Frame] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _changed_fields(previous: Optional[Dict], current: Dict) -> List[str]:
+        if previous is None:
+            return [k for k in current if k not in IGNORED_FIELDS]
+        return [
+            k for k, v in current.items()
+            if k not in IGNORED_FIELDS and previous.get(k) != v
+        ]
+
+    def knows(self, ip: str) -> bool:
+        return ip in self._latest
+
+    def seed(self, data: Dict):
+        """Isi state awal (misal dari DB) tanpa mengirim event"""
+        ip = data.get("ip")
+        if ip and ip not in self._latest:
+            self._latest[ip] = data
+            self._seeded.add(ip)
+            self._snapshot_frame = None
+
+    def apply(self, data: Dict):
+        """Simpan state yang sudah di-coalesce di proses lain (worker relay)"""
+        ip = data.get("ip")
+        if ip:
+            self._latest[ip] = {k: v for k, v in data.items() if k != "changed"}
+            self._snapshot_frame = None
+
+    def load_snapshot(self, devices: List[Dict]):
+        """Ganti seluruh state dengan full snapshot dari proses ingest"""
+        self._latest = {d["ip"]: d for d in devices if d.get("ip")}
+        self._seeded.clear()
+        self._snapshot_frame = None
+
+    async def publish(self, data: Dict) -> bool:
+        """Simpan state terbaru, kirim event hanya jika ada perubahan"""
+        ip = data.get("ip")
+        if not ip:
+            await event_bus.send_heartbeat(data)
+            return True
+
+        previous = None if ip in self._seeded else self._latest.get(ip)
+        self._seeded.discard(ip)
+        changed = self._changed_fields(previous, data)
+        self._latest[ip] = data
+        self._snapshot_frame = None
+
+        if not changed:
+            return False
+
+        await event_bus.send_heartbeat({**data, "changed": changed})
+        return True
+
+    def snapshot_frame(self) -> Frame:
+        """Frame full snapshot dari memory (di-cache sampai state berubah)"""
+        if self._snapshot_frame is None:
+            self._snapshot_frame = Frame({
+                "type": "heartbeat_snapshot",
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "devices": list(self._latest.values())
+            })
+        return self._snapshot_frame
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            if not self._latest:
+                continue
+            if not event_bus.heartbeat_subscribers and event_bus.forwarder is None:
+                continue
+            try:
+                await event_bus.send_heartbeat(self.snapshot_frame())
+            except Exception as e:
+                print(f"[ERROR] heartbeat snapshot error: {e}")
+
+    def start(self):
+        """Jalankan loop snapshot periodik (dipanggil dari event loop utama)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+
+heartbeat_coalescer = HeartbeatCoalescer()
@@ -3,6 +3,8 @@ from typing import Set
 from fastapi import WebSocket
 import asyncio
 
+from app.ws.codec import Frame, send_frame
+
 
 class ConnectionManager:
     def __init__(self):
@@ -22,9 +24,10 @@ class ConnectionManager:
         async with self._lock:
             conns = list(self.active_connections)
 
+        frame = Frame(message)
         for ws in conns:
             try:
-                await ws.send_json(message)
+                await send_frame(ws, frame)
             except Exception:
                 await self.disconnect(ws)
 
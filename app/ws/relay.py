@@ -0,0 +1,388 @@
+"""
+Relay event antar proses untuk mode multi-worker (APP_WORKERS > 1).
+
+Proses ingest (UDP receiver + background task) mem-publish event
+heartbeat/crawling/sniffing (dan response BBU untuk bbu_requests) ke semua
+worker uvicorn, dan worker mengirim
+balik pesan kontrol (command UDP, timer campaign, invalidasi cache) ke
+ingest. Transport:
+- Postgres: LISTEN/NOTIFY (payload > batas NOTIFY dipecah per chunk)
+- SQLite: broker Unix socket yang dijalankan proses ingest
+
+Setiap arah hanya punya satu publisher dan satu consumer berurutan, jadi
+urutan event (termasuk per IP) tetap terjaga.
+"""
+import abc
+import asyncio
+import os
+import queue
+import select
+import threading
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from app.ws import runtime
+from app.ws.codec import Frame, decode_json, encode_json
+from app.ws.crawling_replay import crawling_replay
+from app.ws.events import event_bus
+from app.ws.heartbeat_coalescer import heartbeat_coalescer
+
+RELAY_ROLE_ENV = "APP_PROCESS_ROLE"
+RELAY_SOCKET = os.getenv("APP_RELAY_SOCKET", "/tmp/df-relay.sock")
+
+EVENT_CHANNEL = "df_events"
+CONTROL_CHANNEL = "df_control"
+
+# Batas payload NOTIFY Postgres 8000 byte
+NOTIFY_PAYLOAD_LIMIT = 7900
+NOTIFY_CHUNK_CHARS = 1900
+CHUNK_PREFIX = "~"
+
+STREAM_LIMIT = 16 * 1024 * 1024
+MAX_CLIENT_BUFFER = 4 * 1024 * 1024
+
+
+def _event_message(channel: str, frame: Frame) -> str:
+    # Payload JSON frame dipakai ulang, tidak di-serialize lagi
+    return f'{{"c":"{channel}","d":{frame.encode()}}}'
+
+
+class EventRelay(abc.ABC):
+    def __init__(self, role: str):
+        self.role = role
+        self._control_handlers: Dict[str, Callable] = {}
+        self._inbox: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def register_control(self, op: str, handler: Callable):
+        self._control_handlers[op] = handler
+
+    # ---- ingest -> worker ----
+    @abc.abstractmethod
+    def publish(self, channel: str, frame: Frame):
+        """Dipanggil event_bus di proses ingest untuk setiap event"""
+
+    # ---- worker -> ingest ----
+    @abc.abstractmethod
+    def send_control(self, op: str, payload: Dict):
+        """Dipanggil worker API untuk mengirim pesan kontrol ke ingest"""
+
+    @abc.abstractmethod
+    async def start(self):
+        """Buka koneksi / broker dan jalankan task consumer"""
+
+    async def _dispatch(self, message: Dict):
+        if self.role == runtime.ROLE_API:
+            await dispatch_event(message.get("c"), message.get("d") or {})
+        else:
+            await self._dispatch_control(message.get("op"), message.get("d") or {})
+
+    async def _dispatch_control(self, op: str, payload: Dict):
+        handler = self._control_handlers.get(op)
+        if handler is None:
+            print(f"[RELAY] Unknown control op: {op}")
+            return
+        result = handler(**payload)
+        if asyncio.iscoroutine(result):
+            await result
+
+    async def _consume_inbox(self):
+        """Satu consumer untuk semua pesan masuk supaya urutan terjaga"""
+        while True:
+            message = await self._inbox.get()
+            try:
+                await self._dispatch(message)
+            except Exception as e:
+                print(f"[RELAY] dispatch error: {e}")
+
+
+async def dispatch_event(channel: str, data: Dict):
+    """Teruskan event dari ingest ke subscriber websocket lokal worker"""
+    if channel == "heartbeat":
+        if data.get("type") == "heartbeat_snapshot":
+            heartbeat_coalescer.load_snapshot(data.get("devices") or [])
+        else:
+            heartbeat_coalescer.apply(data)
+        await event_bus.send_heartbeat(data)
+    elif channel == "crawling":
+        await event_bus.send_crawling(crawling_replay.record(data))
+    elif channel == "sniffing":
+        await event_bus.send_sniffing(data)
+    elif channel == "bbu_response":
+        _resolve_bbu_response(data)
+
+
+class PostgresRelay(EventRelay):
+    """Relay lewat Postgres LISTEN/NOTIFY dengan koneksi psycopg2 terpisah"""
+
+    def __init__(self, role: str, engine):
+        super().__init__(role)
+        self._connect_args = engine.url.translate_connect_args(username="user", database="dbname")
+        self._connect_args.update(engine.url.query)
+        if role == runtime.ROLE_API:
+            self._publish_channel, self._listen_channel = CONTROL_CHANNEL, EVENT_CHANNEL
+        else:
+            self._publish_channel, self._listen_channel = EVENT_CHANNEL, CONTROL_CHANNEL
+        self._outbox: "queue.Queue[str]" = queue.Queue()
+        self._chunks: Dict[str, List[Optional[str]]] = {}
+
+    def _connect(self):
+        import psycopg2
+        conn = psycopg2.connect(**self._connect_args)
+        conn.autocommit = True
+        return conn
+
+    def _split(self, payload: str) -> List[str]:
+        if len(payload.encode("utf-8")) <= NOTIFY_PAYLOAD_LIMIT:
+            return [payload]
+        msg_id = uuid.uuid4().hex[:12]
+        parts = [payload[i:i + NOTIFY_CHUNK_CHARS] for i in range(0, len(payload), NOTIFY_CHUNK_CHARS)]
+        return [f"{CHUNK_PREFIX}{msg_id}:{i}:{len(parts)}:{part}" for i, part in enumerate(parts)]
+
+    def _join(self, payload: str) -> Optional[str]:
+        if not payload.startswith(CHUNK_PREFIX):
+            return payload
+        msg_id, index, total, part = payload[1:].split(":", 3)
+        parts = self._chunks.setdefault(msg_id, [None] * int(total))
+        parts[int(index)] = part
+        if any(p is None for p in parts):
+            return None
+        del self._chunks[msg_id]
+        return "".join(parts)
+
+    def publish(self, channel: str, frame: Frame):
+        self._outbox.put(_event_message(channel, frame))
+
+    def send_control(self, op: str, payload: Dict):
+        self._outbox.put(encode_json({"op": op, "d": payload}))
+
+    def _publisher(self):
+        conn = None
+        while True:
+            payload = self._outbox.get()
+            while True:
+                try:
+                    if conn is None or conn.closed:
+                        conn = self._connect()
+                    with conn.cursor() as cur:
+                        for part in self._split(payload):
+                            cur.execute("SELECT pg_notify(%s, %s)", (self._publish_channel, part))
+                    break
+                except Exception as e:
+                    print(f"[RELAY] NOTIFY error: {e}")
+                    conn = None
+                    threading.Event().wait(1)
+
+    def _listener(self, loop: asyncio.AbstractEventLoop):
+        while True:
+            try:
+                conn = self._connect()
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self._listen_channel}")
+                print(f"[RELAY] Listening on {self._listen_channel} ({self.role})")
+                if self.role == runtime.ROLE_API:
+                    on_worker_connected()
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        payload = self._join(notify.payload)
+                        if payload is not None:
+                            loop.call_soon_threadsafe(self._inbox.put_nowait, decode_json(payload))
+            except Exception as e:
+                print(f"[RELAY] LISTEN error: {e}")
+                self._chunks.clear()
+                threading.Event().wait(1)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._inbox = asyncio.Queue()
+        self._tasks.append(asyncio.create_task(self._consume_inbox()))
+        threading.Thread(target=self._publisher, name="RelayPublisher", daemon=True).start()
+        threading.Thread(target=self._listener, args=(loop,), name="RelayListener", daemon=True).start()
+
+
+class UnixSocketRelay(EventRelay):
+    """Relay lewat broker Unix socket (dipakai saat database SQLite)"""
+
+    def __init__(self, role: str, path: str = RELAY_SOCKET):
+        super().__init__(role)
+        self.path = path
+        self._clients: List[asyncio.StreamWriter] = []
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: List[bytes] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ---- ingest: broker ----
+    def publish(self, channel: str, frame: Frame):
+        if not self._clients:
+            return
+        line = (_event_message(channel, frame) + "\n").encode()
+        for writer in list(self._clients):
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                print("[RELAY] Worker terlalu lambat, koneksi ditutup")
+                self._drop_client(writer)
+                continue
+            writer.write(line)
+
+    def _drop_client(self, writer: asyncio.StreamWriter):
+        if writer in self._clients:
+            self._clients.remove(writer)
+        writer.close()
+
+    async def _handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.append(writer)
+        print(f"[RELAY] Worker connected ({len(self._clients)} worker)")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._inbox.put_nowait(decode_json(line))
+        except Exception as e:
+            print(f"[RELAY] worker connection error: {e}")
+        finally:
+            self._drop_client(writer)
+
+    # ---- worker: client ----
+    def send_control(self, op: str, payload: Dict):
+        line = (encode_json({"op": op, "d": payload}) + "\n").encode()
+        self._loop.call_soon_threadsafe(self._write_control, line)
+
+    def _write_control(self, line: bytes):
+        if self._writer is None or self._writer.is_closing():
+            # Disimpan sampai koneksi ke ingest tersambung lagi
+            self._pending.append(line)
+            return
+        self._writer.write(line)
+
+    async def _worker_connection(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=STREAM_LIMIT)
+            except OSError:
+                await asyncio.sleep(1)
+                continue
+
+            self._writer = writer
+            print(f"[RELAY] Connected to ingest broker {self.path}")
+            for line in self._pending:
+                writer.write(line)
+            self._pending.clear()
+            on_worker_connected()
+
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    message = decode_json(line)
+                    try:
+                        await self._dispatch(message)
+                    except Exception as e:
+                        print(f"[RELAY] dispatch error: {e}")
+            except Exception as e:
+                print(f"[RELAY] broker connection error: {e}")
+            finally:
+                self._writer = None
+                writer.close()
+            await asyncio.sleep(1)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        if self.role == runtime.ROLE_API:
+            self._tasks.append(asyncio.create_task(self._worker_connection()))
+            return
+
+        self._inbox = asyncio.Queue()
+        self._tasks.append(asyncio.create_task(self._consume_inbox()))
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        await asyncio.start_unix_server(self._handle_worker, path=self.path, limit=STREAM_LIMIT)
+        print(f"[RELAY] Ingest broker listening on {self.path}")
+
+
+event_relay: Optional[EventRelay] = None
+
+
+def init_relay(role: str) -> EventRelay:
+    """Buat relay sesuai database yang dipakai"""
+    global event_relay
+    from app.db.database import engine
+
+    if engine.url.get_backend_name() == "postgresql":
+        event_relay = PostgresRelay(role, engine)
+    else:
+        event_relay = UnixSocketRelay(role)
+    return event_relay
+
+
+# Mode shard ingest (SO_REUSEPORT): proses shard mengirim event (dan kontrol
+# "control") ke proses ingest utama lewat shard_link, proses utama mengirim
+# kontrol ke shard lewat shard_controls (lihat app/controller/ingest_shards.py)
+shard_link = None
+shard_index: Optional[int] = None
+shard_controls: List = []
+
+
+async def publish_ingest_event(channel: str, data: Dict):
+    """
+    Publish event hasil parsing RespUdp. Coalescing heartbeat dan seq
+    crawling hanya dikerjakan proses ingest utama.
+    """
+    if shard_link is not None:
+        shard_link.put((channel, data))
+        return
+
+    if channel == "heartbeat":
+        await heartbeat_coalescer.publish(data)
+    elif channel == "crawling":
+        await crawling_replay.publish(data)
+    elif channel == "sniffing":
+        await event_bus.send_sniffing(data)
+    elif channel == "bbu_response":
+        _resolve_bbu_response(data)
+        if event_relay is not None and event_relay.role == runtime.ROLE_INGEST:
+            event_relay.publish(channel, Frame(data))
+
+
+def _resolve_bbu_response(data: Dict):
+    from app.controller.bbu_request import bbu_requests
+
+    bbu_requests.resolve(data.get("ip"), data.get("response_type"), data.get("message"))
+
+
+def forward_to_shards(op: str, exclude_shard: Optional[int] = None, **payload: Any):
+    """Teruskan perubahan cache ke semua proses shard ingest (kecuali exclude_shard)"""
+    for index, control_queue in enumerate(shard_controls, start=1):
+        if index != exclude_shard:
+            control_queue.put((op, payload))
+
+
+def forward_to_main(op: str, **payload: Any) -> bool:
+    """
+    Di proses shard, teruskan perubahan cache ke proses ingest utama (yang
+    meneruskannya ke shard lain). Return False jika bukan proses shard.
+    """
+    if shard_link is None:
+        return False
+    shard_link.put(("control", {"op": op, "shard": shard_index, "d": payload}))
+    return True
+
+
+def forward_to_ingest(op: str, **payload: Any) -> bool:
+    """
+    Di worker API, teruskan operasi yang state-nya ada di proses ingest.
+    Return False jika proses ini sendiri yang harus menjalankannya.
+    """
+    if runtime.process_role != runtime.ROLE_API or event_relay is None:
+        return False
+    event_relay.send_control(op, payload)
+    return True
+
+
+def on_worker_connected():
+    """Minta snapshot heartbeat supaya state worker baru langsung lengkap"""
+    forward_to_ingest("heartbeat_snapshot")
@@ -3,3 +3,17 @@ import asyncio
 from typing import Optional
 
 main_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Peran proses: "single" (default, satu proses), "ingest" (UDP + background
+# task pada mode multi-worker), "api" (worker uvicorn) atau "shard"
+# (proses tambahan UDP ingest dengan SO_REUSEPORT)
+ROLE_SINGLE = "single"
+ROLE_INGEST = "ingest"
+ROLE_API = "api"
+
+ROLE_SHARD = "shard"
+
+process_role: str = ROLE_SINGLE
+
+# Jumlah proses yang bind port UDP ingest (SO_REUSEPORT)
+ingest_shards: int = 1
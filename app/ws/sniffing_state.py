@@ -0,0 +1,111 @@
+"""
+Shared producer untuk /ws/sniffing/state.
+Snapshot progress sniffing dihitung sekali (maksimal tiap interval saat ada
+perubahan) lalu frame yang sama di-broadcast ke semua subscriber.
+"""
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+from fastapi import WebSocket
+
+from app.config.utils import MAX_SNIFF_STATE_PUSH_PER_SEC
+from app.ws.codec import ENCODING_JSON, Frame, send_frame
+from app.ws.events import event_bus
+
+
+class SniffingStateBroadcaster:
+    def __init__(self, min_interval: float = 1.0 / MAX_SNIFF_STATE_PUSH_PER_SEC):
+        self.min_interval = min_interval
+        self._subscribers: Dict[int, Tuple[WebSocket, str]] = {}
+        self._next_id = 0
+        self._dirty = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._bus_sub_id: Optional[int] = None
+        self._last_frame: Optional[Frame] = None
+
+    def _build_snapshot(self) -> Dict:
+        """Hitung snapshot dengan session pendek (bukan per koneksi)"""
+        from app.db.database import SessionLocal
+        from app.service.sniffer_service import get_sniffing_progress, get_heartbeat_sniff_status
+
+        db = SessionLocal()
+        try:
+            return {
+                "type": "sniffing_state",
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "progress": get_sniffing_progress(db),
+                "heartbeat_status": get_heartbeat_sniff_status(db)
+            }
+        finally:
+            db.close()
+
+    async def _produce_frame(self) -> Frame:
+        snapshot = await asyncio.to_thread(self._build_snapshot)
+        frame = Frame(snapshot)
+        self._last_frame = frame
+        return frame
+
+    async def _on_sniffing(self, frame: Frame):
+        self._dirty.set()
+
+    async def _broadcast(self, frame: Frame):
+        dead = []
+        for sub_id, (websocket, encoding) in list(self._subscribers.items()):
+            try:
+                await send_frame(websocket, frame, encoding)
+            except Exception as e:
+                print(f"[ERROR] sniffing_state send error: {e}")
+                dead.append(sub_id)
+
+        for sub_id in dead:
+            self._subscribers.pop(sub_id, None)
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                await self._dirty.wait()
+                self._dirty.clear()
+                try:
+                    frame = await self._produce_frame()
+                    await self._broadcast(frame)
+                except Exception as e:
+                    print(f"[ERROR] sniffing_state producer error: {e}")
+                await asyncio.sleep(self.min_interval)
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+    async def subscribe(self, websocket: WebSocket, encoding: str = ENCODING_JSON) -> int:
+        """Daftarkan websocket dan kirim state awal"""
+        self._next_id += 1
+        sub_id = self._next_id
+
+        cached = self._last_frame
+        frame = cached if cached is not None else await self._produce_frame()
+        await send_frame(websocket, frame, encoding)
+        self._subscribers[sub_id] = (websocket, encoding)
+
+        if self._bus_sub_id is None:
+            self._bus_sub_id = event_bus.subscribe_sniffing(self._on_sniffing)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+        if cached is not None:
+            # State cache mungkin sudah lama, minta refresh di siklus berikutnya
+            self._dirty.set()
+        return sub_id
+
+    def unsubscribe(self, sub_id: int):
+        self._subscribers.pop(sub_id, None)
+
+        if not self._subscribers:
+            if self._bus_sub_id is not None:
+                event_bus.unsubscribe_sniffing(self._bus_sub_id)
+                self._bus_sub_id = None
+            if self._task is not None:
+                self._task.cancel()
+                self._task = None
+            self._last_frame = None
+
+
+sniffing_state_broadcaster = SniffingStateBroadcaster()
@@ -0,0 +1,139 @@
+"""
+Benchmark receive path UDP ingest saat burst.
+
+Membandingkan:
+- recvfrom     : path lama (recvfrom(BufferSize) + decode per datagram)
+- recvmsg_into : slot prealokasi, kuras antrian dengan MSG_DONTWAIT (setiap
+                 batch yang tidak penuh diakhiri satu call EAGAIN, kolom empty)
+- recvmmsg     : slot prealokasi, banyak datagram per syscall (Linux)
+
+Throughput diukur tanpa tracemalloc, peak alokasi diukur di pass terpisah.
+
+Contoh:
+    python scripts/bench_udp_ingest.py --count 50000 --batch 64
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Package app.controller ikut membuat engine DB saat di-import
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.config.utils import BufferSize  # noqa: E402
+from app.controller.udp_receiver import RecvMmsg, UdpReceiver, read_udp_drops  # noqa: E402
+
+PAYLOAD = "OneUeInfoIndi CH-01 rsrp[-85] taType[1] ulCqi[10] ulRssi[60] imsi[510101234567890] imei[35693803564380]"
+
+
+def _sender(port, count, payload):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    data = payload.encode()
+    for _ in range(count):
+        sock.sendto(data, ("127.0.0.1", port))
+    sock.close()
+
+
+class _LegacyReceiver:
+    """Path sebelum batch receive, untuk pembanding"""
+
+    def __init__(self, callback):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self.callback = callback
+        self.recv_calls = 0
+
+    def run(self):
+        while True:
+            data, addr = self.sock.recvfrom(BufferSize)
+            self.recv_calls += 1
+            self.callback(data.decode(), addr)
+
+
+def run_mode(mode, count, batch, rcvbuf, idle_timeout=2.0, trace_alloc=False):
+    received = [0]
+    last_at = [time.monotonic()]
+
+    def callback(message, addr):
+        received[0] += 1
+        last_at[0] = time.monotonic()
+
+    if mode == "recvfrom":
+        receiver = _LegacyReceiver(callback)
+        if rcvbuf:
+            receiver.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        port = receiver.port
+    else:
+        receiver = UdpReceiver("127.0.0.1", 0, callback, rcvbuf=rcvbuf, batch_size=batch)
+        if mode == "recvmsg_into":
+            receiver._recvmmsg = None
+        elif receiver._recvmmsg is None:
+            return None
+        port = receiver.sock.getsockname()[1]
+
+    drops_before = (read_udp_drops(port) or {}).get("drops", 0)
+
+    if trace_alloc:
+        tracemalloc.start()
+    threading.Thread(target=receiver.run, daemon=True).start()
+
+    started = time.monotonic()
+    sender = multiprocessing.Process(target=_sender, args=(port, count, PAYLOAD))
+    sender.start()
+    sender.join()
+
+    while received[0] < count and time.monotonic() - last_at[0] < idle_timeout:
+        time.sleep(0.05)
+    elapsed = last_at[0] - started
+    peak = 0
+    if trace_alloc:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    drops_after = (read_udp_drops(port) or {}).get("drops", 0)
+    return {
+        "mode": mode,
+        "received": received[0],
+        "recv_calls": receiver.recv_calls,
+        "empty_calls": getattr(receiver, "empty_calls", 0),
+        "datagrams_per_call": round(received[0] / max(receiver.recv_calls, 1), 2),
+        "elapsed_s": round(elapsed, 3),
+        "peak_alloc_kb": round(peak / 1024, 1),
+        "kernel_drops": drops_after - drops_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark UDP ingest receive path")
+    parser.add_argument("--count", type=int, default=50000)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--rcvbuf", type=int, default=0, help="SO_RCVBUF (0 = default kernel)")
+    args = parser.parse_args()
+
+    print(f"recvmmsg tersedia: {RecvMmsg.available()}")
+    print(
+        f"{'mode':<14}{'received':>10}{'recv_calls':>12}{'empty':>8}{'dgram/call':>12}"
+        f"{'elapsed_s':>11}{'peak_kb':>10}{'drops':>8}"
+    )
+    for mode in ("recvfrom", "recvmsg_into", "recvmmsg"):
+        result = run_mode(mode, args.count, args.batch, args.rcvbuf)
+        if result is None:
+            print(f"{mode:<14} (tidak tersedia)")
+            continue
+        # Pass kedua hanya untuk alokasi, tracemalloc memperlambat throughput
+        result["peak_alloc_kb"] = run_mode(mode, args.count, args.batch, args.rcvbuf, trace_alloc=True)["peak_alloc_kb"]
+        print(
+            f"{result['mode']:<14}{result['received']:>10}{result['recv_calls']:>12}"
+            f"{result['empty_calls']:>8}{result['datagrams_per_call']:>12}{result['elapsed_s']:>11}"
+            f"{result['peak_alloc_kb']:>10}{result['kernel_drops']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()